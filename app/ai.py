@@ -1,47 +1,535 @@
+import asyncio
+import time
+import uuid
 import httpx
+import logging
 import orjson
+from functools import lru_cache
+from typing import AsyncIterator, Callable
 from .config import settings
-from .cache import get_cached_completion, set_cached_completion
-from .prompts import SYSTEM_ORCHESTRATOR, ROLE_AYYA, ROLE_AYANA, CORRECTION_INSTRUCTIONS, PROJECT_GUIDE
+from .cache import (
+    get_cached_completion, set_cached_completion, completion_cache_key,
+    acquire_inflight_lock, release_inflight_lock, inflight_lock_exists,
+)
+from .history import to_llm_messages
+from .lesson_packs import lesson_packs
+from .metrics import registry, LLM_BUCKETS
+from .llm_pool import Endpoint, llm_pool, llm_endpoint_requests
+from .llm_scheduler import Slot, llm_scheduler
+from .llm_cascade import FAST, STRONG, cascade_stats, classify_turn, model_tier, tier_duration, tier_model, validate_reply
+from .llm_cascade import enabled as cascade_enabled
+from .prompts import SYSTEM_ORCHESTRATOR, ROLE_AYYA, ROLE_AYANA, CORRECTION_INSTRUCTIONS, PROJECT_GUIDE, SUMMARY_INSTRUCTIONS
 
-def build_auth_header() -> str:
-    api_key = settings.OPENAI_API_KEY or (settings.GROQ_API_KEY or "")
-    return f"Bearer {api_key}"
+logger = logging.getLogger(__name__)
 
-HEADERS = {
-    "Authorization": build_auth_header(),
-    "Content-Type": "application/json",
-}
+# Клиенты (по одному на эндпоинт пула) создаются при старте и переиспользуют соединения между ходами;
+# без startup пул собирается первым запросом
+async def startup_llm_client() -> None:
+    llm_pool.load()
 
-async def chat_completion(messages: list[dict]) -> dict:
+async def shutdown_llm_client() -> None:
+    await llm_pool.aclose()
+
+llm_request_duration = registry.histogram(
+    "llm_request_duration_seconds", "Время запроса к LLM (для stream — до последнего куска)",
+    ("mode", "outcome"), buckets=LLM_BUCKETS,
+)
+llm_tokens = registry.counter("llm_tokens_total", "Токены по usage из ответов LLM", ("type",))
+
+llm_hedges = registry.counter("llm_hedges_total", "Дублирующие запросы к LLM после p95 эндпоинта", ("result",))
+
+def record_usage(usage: dict | None, endpoint: Endpoint | None = None, model: str | None = None) -> None:
+    if usage:
+        prompt, completion = usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+        llm_tokens.inc("prompt", amount=prompt)
+        llm_tokens.inc("completion", amount=completion)
+        cascade_stats.record_tokens(model, usage.get("total_tokens") or prompt + completion)
+        if endpoint is not None:
+            endpoint.limits.record_tokens(usage.get("total_tokens") or 0)
+
+def _outcome(status_code: int) -> str:
+    return "ok" if status_code < 400 else "rate_limited" if status_code == 429 else "error"
+
+def _body(payload: dict, endpoint: Endpoint) -> bytes:
+    model = endpoint.model_for(payload.get("model"))
+    return orjson.dumps({**payload, "model": model} if model != payload.get("model") else payload)
+
+async def _send(slot: Slot, payload: dict) -> tuple[Endpoint, httpx.Response]:
+    """Один запрос к эндпоинту слота; задержку, ошибки и заголовки учитывает эндпоинт"""
+    endpoint = slot.endpoint
+    started = time.perf_counter()
+    outcome = "cancelled"
+    r = None
+    try:
+        r = await endpoint.client.post("/chat/completions", content=_body(payload, endpoint))
+        outcome = _outcome(r.status_code)
+        slot.observe(r.status_code, r.headers)
+        return endpoint, r
+    except httpx.HTTPError:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        endpoint.requests += 1
+        llm_endpoint_requests.inc(endpoint.name, outcome)
+        llm_request_duration.observe(elapsed, "complete", outcome)
+        if outcome == "ok" or (outcome == "cancelled" and elapsed > (endpoint.ewma or 0.0)):
+            # отменённый дубль-проигравший медленнее обычного — это тоже знание о задержке
+            endpoint.record_latency(elapsed)
+        elif outcome == "error" and (r is None or r.status_code >= 500):
+            endpoint.record_error()
+
+async def _first_good(primary: asyncio.Future, hedge: asyncio.Future) -> tuple[Endpoint, httpx.Response]:
+    """Первый успешный из двух ответов; если оба неудачны — последний"""
+    pending = {primary, hedge}
+    try:
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and task.result()[1].status_code < 400:
+                    llm_hedges.inc("won" if task is hedge else "lost")
+                    return task.result()
+            if not pending:
+                return done.pop().result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+async def _complete_once(payload: dict, flow: str | None, deadline: float) -> tuple[Endpoint, httpx.Response]:
+    """
+    Запрос через слот планировщика. Если ответа нет дольше p95 эндпоинта
+    (LLM_HEDGE_ENABLED), тот же запрос уходит на другой эндпоинт — но только
+    когда в очереди никто не ждёт; берётся первый успешный ответ, второй отменяется.
+    """
+    async with llm_scheduler.slot(flow, deadline) as slot:
+        delay = slot.endpoint.hedge_delay()
+        if delay is None:
+            return await _send(slot, payload)
+        primary = asyncio.ensure_future(_send(slot, payload))
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                return primary.result()
+            hedge_slot = llm_scheduler.try_acquire(exclude=slot.endpoint)
+            if hedge_slot is None:
+                llm_hedges.inc("skipped")
+                return await primary
+            llm_hedges.inc("sent")
+            try:
+                return await _first_good(primary, asyncio.ensure_future(_send(hedge_slot, payload)))
+            finally:
+                llm_scheduler.release(hedge_slot, None)
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+async def request_completion(payload: dict, flow: str | None = None) -> str:
+    """
+    Вызов LLM через планировщик (llm_scheduler): слот в очереди потока flow
+    и эндпоинт пула. После 429 — повтор, когда провайдер разрешит (пока не истёк
+    срок в очереди); после 5xx или сетевой ошибки — повтор на другом эндпоинте.
+    """
+    deadline = time.monotonic() + settings.LLM_QUEUE_TIMEOUT
+    failover = len(llm_scheduler.pool.endpoints) > 1
+    started = time.perf_counter()
+    try:
+        for attempt in range(settings.LLM_RATELIMIT_RETRIES + 1):
+            retry = attempt < settings.LLM_RATELIMIT_RETRIES
+            try:
+                endpoint, r = await _complete_once(payload, flow, deadline)
+            except httpx.TransportError:
+                if retry and failover:
+                    continue
+                raise
+            if not retry or not (r.status_code == 429 or (r.status_code >= 500 and failover)):
+                break
+        r.raise_for_status()
+        data = r.json()
+    except httpx.HTTPError as e:
+        raise RuntimeError(f"LLM request failed: {e}")
+    finally:
+        tier_duration.observe(time.perf_counter() - started, model_tier(payload.get("model")))
+    record_usage(data.get("usage"), endpoint, payload.get("model"))
+    return data["choices"][0]["message"]["content"]
+
+class SingleFlightStats:
+    """Сколько вызовов LLM сделано и сколько запросов дождались чужого вызова"""
+
+    def __init__(self):
+        self.upstream_calls = 0
+        self.coalesced_local = 0
+        self.coalesced_remote = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "upstream_calls": self.upstream_calls,
+            "coalesced_local": self.coalesced_local,
+            "coalesced_remote": self.coalesced_remote,
+        }
+
+singleflight_stats = SingleFlightStats()
+llm_singleflight = registry.counter(
+    "llm_singleflight_total", "Вызовы LLM и запросы, дождавшиеся чужого вызова", ("result",),
+)
+
+@registry.on_collect
+def _collect_singleflight() -> None:
+    llm_singleflight.set(singleflight_stats.upstream_calls, "upstream_call")
+    llm_singleflight.set(singleflight_stats.coalesced_local, "coalesced_local")
+    llm_singleflight.set(singleflight_stats.coalesced_remote, "coalesced_remote")
+# ключ кэша -> future с ответом LLM, который уже запрашивается в этом процессе
+_inflight: dict[str, asyncio.Future] = {}
+
+async def chat_completion(messages: list[dict], flow: str | None = None, model: str | None = None,
+                          validate: Callable[[dict], str | None] | None = None) -> dict:
+    """
+    Ответ LLM (JSON). В кэш попадает только ответ, который разобрался и прошёл
+    validate (None от validate — годится): иначе невалидный ответ закрепится на весь TTL.
+    """
     # cache first
-    cached = get_cached_completion(messages)
+    cached = await get_cached_completion(messages, model)
     if cached:
         return orjson.loads(cached)
 
+    # single-flight: одинаковые одновременные запросы ждут один вызов LLM
+    key = completion_cache_key(messages, model)
+    future = _inflight.get(key)
+    if future is not None:
+        singleflight_stats.coalesced_local += 1
+        try:
+            return orjson.loads(await asyncio.shield(future))
+        except asyncio.CancelledError:
+            if not future.cancelled():
+                raise
+            # ведущий запрос отменён (клиент ушёл) — пробуем сами
+            return await chat_completion(messages, flow, model, validate)
+
+    future = asyncio.get_running_loop().create_future()
+    _inflight[key] = future
+    try:
+        choice = await _fetch_completion(messages, key, flow, model, validate)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # ошибку получат ожидающие, без "exception was never retrieved"
+        raise
+    else:
+        future.set_result(choice)
+    finally:
+        _inflight.pop(key, None)
+    return orjson.loads(choice)
+
+async def _fetch_completion(messages: list[dict], key: str, flow: str | None = None, model: str | None = None,
+                            validate: Callable[[dict], str | None] | None = None) -> str:
+    lock_token = None
+    if settings.LLM_SINGLEFLIGHT_REDIS:
+        lock_token = uuid.uuid4().hex
+        acquired = await acquire_inflight_lock(key, lock_token, int(settings.OPENAI_TIMEOUT * 1000))
+        if acquired is False:
+            # тот же запрос уже делает другой воркер — ждём его ответ в кэше
+            cached = await _wait_for_remote(messages, key, model)
+            if cached is not None:
+                singleflight_stats.coalesced_remote += 1
+                return cached
+            acquired = await acquire_inflight_lock(key, lock_token, int(settings.OPENAI_TIMEOUT * 1000))
+        if not acquired:
+            lock_token = None
+
+    try:
+        payload = {
+            "model": model or settings.OPENAI_MODEL,
+            "messages": messages,
+            "temperature": 0.7,
+            "response_format": {"type": "json_object"},
+        }
+        singleflight_stats.upstream_calls += 1
+        choice = await request_completion(payload, flow=flow)
+        if _acceptable(choice, validate):
+            await set_cached_completion(messages, choice, model=model)
+        return choice
+    finally:
+        if lock_token:
+            await release_inflight_lock(key, lock_token)
+
+def _acceptable(choice: str, validate: Callable[[dict], str | None] | None = None) -> bool:
+    try:
+        reply = orjson.loads(choice)
+    except orjson.JSONDecodeError:
+        return False
+    return validate is None or validate(reply) is None
+
+async def _wait_for_remote(messages: list[dict], key: str, model: str | None = None) -> str | None:
+    """Ждёт, пока ведущий воркер положит ответ в кэш; None — если он снял блокировку без ответа"""
+    deadline = time.monotonic() + settings.OPENAI_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.LLM_SINGLEFLIGHT_POLL_SECONDS)
+        cached = await get_cached_completion(messages, model)
+        if cached:
+            return cached
+        if not await inflight_lock_exists(key):
+            return await get_cached_completion(messages, model)
+    return None
+
+async def stream_chat_completion(messages: list[dict], flow: str | None = None) -> AsyncIterator[str]:
+    """Отдаёт текст ответа LLM кусками по мере генерации (SSE от провайдера)"""
+    cached = await get_cached_completion(messages)
+    if cached:
+        yield cached
+        return
+
     payload = {
         "model": settings.OPENAI_MODEL,
         "messages": messages,
         "temperature": 0.7,
         "response_format": {"type": "json_object"},
+        "stream": True,
     }
+    parts: list[str] = []
+    deadline = time.monotonic() + settings.LLM_QUEUE_TIMEOUT
+    for attempt in range(settings.LLM_RATELIMIT_RETRIES + 1):
+        # слот держится до конца потока: соединение с провайдером занято всё это время
+        async with llm_scheduler.slot(flow, deadline) as slot:
+            started = time.perf_counter()
+            outcome = "cancelled"  # клиент ушёл, не дочитав ответ
+            try:
+                endpoint = slot.endpoint
+                async with endpoint.client.stream("POST", "/chat/completions", content=_body(payload, endpoint)) as r:
+                    slot.observe(r.status_code, r.headers)
+                    if r.status_code == 429 and attempt < settings.LLM_RATELIMIT_RETRIES:
+                        # ещё ничего не отдано клиенту — повторяем после паузы планировщика
+                        outcome = "rate_limited"
+                        continue
+                    r.raise_for_status()
+                    async for line in r.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            break
+                        chunk = orjson.loads(data)
+                        # usage приходит последним куском, если провайдер его отдаёт
+                        record_usage(chunk.get("usage"), endpoint, payload["model"])
+                        if not chunk.get("choices"):
+                            continue
+                        delta = chunk["choices"][0].get("delta", {}).get("content")
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                outcome = "ok"
+            except Exception as e:
+                outcome = "error"
+                if isinstance(e, httpx.HTTPError):
+                    if not isinstance(e, httpx.HTTPStatusError) or e.response.status_code >= 500:
+                        slot.endpoint.record_error()
+                    raise RuntimeError(f"LLM request failed: {e}")
+                raise
+            finally:
+                llm_request_duration.observe(time.perf_counter() - started, "stream", outcome)
+                tier_duration.observe(time.perf_counter() - started, model_tier(payload["model"]))
+        break
+    choice = "".join(parts)
+    if _acceptable(choice):
+        await set_cached_completion(messages, choice)
+
+# --- контекст: бюджет токенов и скользящий конспект ---
+
+MESSAGE_OVERHEAD_TOKENS = 4  # служебные токены роли/разделителей на каждое сообщение
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # tiktoken — необязательная зависимость; без неё считаем приблизительно.
+    # Неверный LLM_TOKENIZER — ошибка конфигурации: падаем, а не считаем молча на глаз
     try:
-        async with httpx.AsyncClient(base_url=settings.OPENAI_BASE_URL, timeout=settings.OPENAI_TIMEOUT) as client:
-            r = await client.post("/chat/completions", headers=HEADERS, content=orjson.dumps(payload))
-            r.raise_for_status()
-            data = r.json()
-    except httpx.HTTPError as e:
-        raise RuntimeError(f"LLM request failed: {e}")
-    choice = data["choices"][0]["message"]["content"]
-    set_cached_completion(messages, choice)
-    return orjson.loads(choice)
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed: token counts are approximate (1 per non-ASCII char)")
+        return None
+    return tiktoken.get_encoding(settings.LLM_TOKENIZER)
 
-async def orchestrate_turn(dialog: list[dict]) -> dict:
-    system = {
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # оценка сверху: кириллица — до токена на символ, латиница — ~4 символа на токен
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return (ascii_chars + 3) // 4 + len(text) - ascii_chars
+
+def count_message_tokens(messages: list[dict]) -> int:
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+def system_message() -> dict:
+    return {
         "role": "system",
         "content": (
             SYSTEM_ORCHESTRATOR + "\n" + ROLE_AYYA + "\n" + ROLE_AYANA + "\n" + CORRECTION_INSTRUCTIONS + "\n" + PROJECT_GUIDE
         ),
     }
-    messages = [system] + dialog
-    return await chat_completion(messages) 
\ No newline at end of file
+
+def summary_message(summary: str) -> dict:
+    return {"role": "system", "content": f"Конспект начала урока: {summary}"}
+
+def fit_context(entries: list[dict], summary: str | None = None, budget: int | None = None) -> tuple[list[dict], list[dict]]:
+    """
+    Делит историю на (folded, kept): kept помещается в бюджет вместе с системным
+    промптом и конспектом, folded нужно свернуть в конспект.
+
+    Сворачиваем с запасом (до LLM_CONTEXT_FOLD_RATIO бюджета), чтобы конспект
+    обновлялся раз в несколько ходов, а не на каждом.
+    """
+    budget = budget or settings.LLM_CONTEXT_TOKEN_BUDGET
+    fixed = count_message_tokens([system_message()])
+    fixed += settings.LLM_SUMMARY_MAX_TOKENS + MESSAGE_OVERHEAD_TOKENS if summary is not None else 0
+    available = budget - fixed
+    sizes = [count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in to_llm_messages(entries)]
+    if sum(sizes) <= available:
+        return [], entries
+
+    target = available * settings.LLM_CONTEXT_FOLD_RATIO - settings.LLM_SUMMARY_MAX_TOKENS
+    used = 0
+    keep = 0
+    for size in reversed(sizes):
+        # последнюю реплику ребёнка оставляем всегда
+        if keep and used + size > target:
+            break
+        used += size
+        keep += 1
+    return entries[:len(entries) - keep], entries[len(entries) - keep:]
+
+async def summarize_dialog(summary: str | None, folded: list[dict], flow: str | None = None) -> str:
+    """Дописывает свёрнутые реплики в конспект (ответ кэшируется как обычный completion)"""
+    dialog = [{"role": e["role"], "say": e["content"]} for e in folded]
+    messages = [
+        {"role": "system", "content": SUMMARY_INSTRUCTIONS.format(max_tokens=settings.LLM_SUMMARY_MAX_TOKENS)},
+        {"role": "user", "content": orjson.dumps({"summary": summary or "", "dialog": dialog}).decode()},
+    ]
+    result = await chat_completion(messages, flow)
+    return str(result.get("summary") or summary or "")
+
+def build_orchestrator_messages(dialog: list[dict], summary: str | None = None) -> list[dict]:
+    messages = [system_message()]
+    if summary:
+        messages.append(summary_message(summary))
+    return messages + dialog
+
+# --- каскад моделей: простые ходы — быстрой модели (app/llm_cascade.py) ---
+
+def _turn_tier(dialog: list[dict]) -> str:
+    if not cascade_enabled():
+        return STRONG
+    tier, reason = classify_turn(dialog)
+    cascade_stats.route(tier, reason)
+    return tier
+
+async def _fast_reply(messages: list[dict], flow: str | None) -> dict | None:
+    """Ответ быстрой модели; None — не прошёл проверку, ход отдаётся основной модели"""
+    try:
+        reply = await chat_completion(messages, flow, model=tier_model(FAST), validate=validate_reply)
+        problem = validate_reply(reply)
+    except orjson.JSONDecodeError:
+        problem = "invalid_json"
+    except RuntimeError:
+        problem = "error"  # провайдер быстрой модели не ответил — основная всё равно нужна
+    if problem is None:
+        return reply
+    cascade_stats.escalate(problem)
+    return None
+
+async def _remember_escalated(messages: list[dict], choice: str) -> None:
+    """
+    Ответ основной модели после эскалации кладётся и под ключ быстрой: повтор
+    того же хода берёт его из кэша, а не спрашивает быструю модель и не эскалирует снова.
+    """
+    if _acceptable(choice, validate_reply):
+        await set_cached_completion(messages, choice, model=tier_model(FAST))
+
+async def route_completion(dialog: list[dict], summary: str | None = None, flow: str | None = None) -> tuple[dict, str]:
+    """Ответ оркестратора и кто его дал: "fast", "strong" или "escalated" (быструю модель не приняли)"""
+    messages = build_orchestrator_messages(dialog, summary)
+    if _turn_tier(dialog) == FAST:
+        reply = await _fast_reply(messages, flow)
+        if reply is not None:
+            return reply, FAST
+        reply = await chat_completion(messages, flow)
+        await _remember_escalated(messages, orjson.dumps(reply).decode())
+        return reply, "escalated"
+    return await chat_completion(messages, flow), STRONG
+
+async def _stream_completion(dialog: list[dict], summary: str | None, flow: str | None) -> AsyncIterator[str]:
+    """Быстрая модель отвечает целиком (ответ сначала проверяется), основная — кусками по мере генерации"""
+    messages = build_orchestrator_messages(dialog, summary)
+    if _turn_tier(dialog) == FAST:
+        reply = await _fast_reply(messages, flow)
+        if reply is not None:
+            yield orjson.dumps(reply).decode()
+            return
+        parts: list[str] = []
+        async for chunk in stream_chat_completion(messages, flow):
+            parts.append(chunk)
+            yield chunk
+        await _remember_escalated(messages, "".join(parts))
+        return
+    async for chunk in stream_chat_completion(messages, flow):
+        yield chunk
+
+def _semantic_question(dialog: list[dict], summary: str | None) -> str | None:
+    """Реплика ребёнка для семантического кэша; None — ответ зависит от хода урока"""
+    if not settings.SEMANTIC_CACHE_ENABLED or summary or not dialog or dialog[-1]["role"] != "user":
+        return None
+    if sum(m["role"] == "user" for m in dialog) > settings.SEMANTIC_CACHE_MAX_TURNS:
+        return None
+    return dialog[-1]["content"]
+
+def _store_semantic(cache, topic: str | None, vector, reply) -> None:
+    # только ответ, который пройдёт в TurnReply: испорченный отдавался бы на любой пересказ вопроса
+    if validate_reply(reply) is None:
+        cache.store(topic, vector, reply)
+
+def _semantic_cache():
+    # numpy и индекс загружаются, только если кэш включён
+    from .semantic_cache import semantic_cache
+    return semantic_cache
+
+async def orchestrate_turn(dialog: list[dict], summary: str | None = None, flow: str | None = None,
+                           topic: str | None = None) -> dict:
+    # начало урока по сценарию заранее сгенерированного пакета — без LLM
+    packed = lesson_packs.lookup(dialog, summary)
+    if packed is not None:
+        return packed
+    question = _semantic_question(dialog, summary)
+    if question is None:
+        return (await route_completion(dialog, summary, flow))[0]
+    cache = _semantic_cache()
+    vector = await cache.embed(question)
+    reply = cache.lookup(topic, vector)
+    if reply is None:
+        reply, _ = await route_completion(dialog, summary, flow)
+        _store_semantic(cache, topic, vector, reply)
+    return reply
+
+async def orchestrate_turn_stream(dialog: list[dict], summary: str | None = None, flow: str | None = None,
+                                  topic: str | None = None) -> AsyncIterator[str]:
+    packed = lesson_packs.lookup(dialog, summary)
+    if packed is not None:
+        yield orjson.dumps(packed).decode()
+        return
+    question = _semantic_question(dialog, summary)
+    if question is None:
+        async for chunk in _stream_completion(dialog, summary, flow):
+            yield chunk
+        return
+    cache = _semantic_cache()
+    vector = await cache.embed(question)
+    reply = cache.lookup(topic, vector)
+    if reply is not None:
+        yield orjson.dumps(reply).decode()
+        return
+    parts: list[str] = []
+    async for chunk in _stream_completion(dialog, summary, flow):
+        parts.append(chunk)
+        yield chunk
+    try:
+        _store_semantic(cache, topic, vector, orjson.loads("".join(parts)))
+    except orjson.JSONDecodeError:
+        pass  # не JSON — нечего переиспользовать
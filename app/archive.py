@@ -0,0 +1,292 @@
+"""
+Помесячные партиции messages и архив старых месяцев.
+
+Фоновая задача (и CLI: python -m app.archive):
+  1. держит созданными партиции на текущий и MESSAGES_PARTITIONS_AHEAD следующих месяцев;
+  2. месяцы старше MESSAGES_RETENTION_MONTHS отсоединяет (DETACH CONCURRENTLY),
+     выгружает в ARCHIVE_DIR/messages_pYYYYMM.jsonl.gz и удаляет из базы.
+     Только при ARCHIVE_ENABLED (по умолчанию выключено): ARCHIVE_DIR должен быть
+     постоянным общим хранилищем, иначе удалённые из базы месяцы теряются.
+
+Формат архива: gzip JSONL, один gzip-member на сессию (члены склеены — это
+обычный .gz), рядом messages_pYYYYMM.index.json с {session_id: [offset, length]}.
+Поэтому историю одной сессии можно прочитать, не распаковывая весь месяц.
+Чтение — load_archived_messages(); load_history подключает его сам.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+import orjson
+from sqlalchemy import select, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from .config import settings
+from .db import engine as app_engine
+from .models import ChatSession, MessageArchive
+
+logger = logging.getLogger(__name__)
+
+PARTITION_RE = re.compile(r"^messages_p(\d{4})(\d{2})$")
+# общий ключ pg_advisory_lock: обслуживанием партиций занимается один воркер
+ADVISORY_LOCK_ID = 0x6D736773
+
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + dt.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: datetime) -> str:
+    return f"messages_p{month:%Y%m}"
+
+
+def partition_month(name: str) -> datetime | None:
+    m = PARTITION_RE.match(name)
+    return datetime(int(m.group(1)), int(m.group(2)), 1) if m else None
+
+
+# --- партиции ---
+
+async def ensure_partitions(engine: AsyncEngine, start: datetime | None = None, months: int | None = None) -> list[str]:
+    """Создаёт недостающие месячные партиции начиная с `start` (по умолчанию — текущий месяц)"""
+    month = month_start(start or datetime.utcnow())
+    months = months if months is not None else settings.MESSAGES_PARTITIONS_AHEAD + 1
+    created = []
+    async with engine.begin() as conn:
+        for _ in range(months):
+            name = partition_name(month)
+            exists = (await conn.execute(text("SELECT to_regclass(:name)"), {"name": name})).scalar()
+            if exists is None:
+                upper = add_months(month, 1)
+                await conn.execute(text(
+                    f"CREATE TABLE {name} PARTITION OF messages "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                ))
+                created.append(name)
+            month = add_months(month, 1)
+    return created
+
+
+async def _attached_partitions(conn) -> dict[str, bool]:
+    """Партиции messages -> висит ли незавершённый DETACH CONCURRENTLY"""
+    q = await conn.execute(text(
+        "SELECT c.relname, i.inhdetachpending FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'messages'::regclass"
+    ))
+    return {r[0]: r[1] for r in q}
+
+
+async def _detached_partitions(conn) -> list[str]:
+    # отсоединённые, но ещё не выгруженные (например, прошлый запуск упал посреди выгрузки)
+    q = await conn.execute(text(
+        "SELECT relname FROM pg_class WHERE relkind = 'r' AND NOT relispartition "
+        "AND relname ~ '^messages_p[0-9]{6}$'"
+    ))
+    return [r[0] for r in q]
+
+
+# --- выгрузка ---
+
+def _archive_paths(name: str) -> tuple[str, str]:
+    base = os.path.join(settings.ARCHIVE_DIR, name)
+    return base + ".jsonl.gz", base + ".index.json"
+
+
+def _write_archive(name: str, sessions: list[tuple[int, bytes]]) -> tuple[str, int]:
+    """Пишет по gzip-member на сессию и индекс смещений; файлы появляются атомарно (rename)"""
+    os.makedirs(settings.ARCHIVE_DIR, exist_ok=True)
+    path, index_path = _archive_paths(name)
+    index: dict[str, list[int]] = {}
+    rows = 0
+    with open(path + ".tmp", "wb") as f:
+        for session_id, payload in sessions:
+            blob = gzip.compress(payload)
+            index[str(session_id)] = [f.tell(), len(blob)]
+            f.write(blob)
+            rows += payload.count(b"\n")
+        f.flush()
+        os.fsync(f.fileno())
+    with open(index_path + ".tmp", "wb") as f:
+        f.write(orjson.dumps({"rows": rows, "sessions": index}))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+    os.replace(index_path + ".tmp", index_path)
+    return path, rows
+
+
+async def _export_partition(engine: AsyncEngine, name: str) -> tuple[str, int]:
+    sessions: list[tuple[int, bytes]] = []
+    current_id, lines = None, []
+    async with engine.connect() as conn:
+        result = await conn.stream(text(
+            f"SELECT id, session_id, role, content, meta, created_at FROM {name} ORDER BY session_id, id"
+        ).columns(meta=JSONB))
+        async for row in result:
+            if row.session_id != current_id:
+                if lines:
+                    sessions.append((current_id, b"".join(lines)))
+                current_id, lines = row.session_id, []
+            lines.append(orjson.dumps(dict(row._mapping)) + b"\n")
+        if lines:
+            sessions.append((current_id, b"".join(lines)))
+    # сжатие и fsync — в потоке, чтобы не держать event loop
+    return await asyncio.to_thread(_write_archive, name, sessions)
+
+
+async def archive_partition(engine: AsyncEngine, name: str, detach: str | None = "CONCURRENTLY") -> int:
+    """
+    Отсоединяет партицию, выгружает её в файл, записывает в message_archives и удаляет таблицу.
+    detach: "CONCURRENTLY", "FINALIZE" (дожать прерванный DETACH) или None (уже отсоединена).
+    """
+    month = partition_month(name)
+    if detach:
+        # CONCURRENTLY не блокирует запись в messages, но не работает внутри транзакции
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name} {detach}"))
+    path, rows = await _export_partition(engine, name)
+    async with engine.begin() as conn:
+        count = (await conn.execute(text(f"SELECT count(*) FROM {name}"))).scalar()
+        if count != rows:
+            raise RuntimeError(f"archive {path}: {rows} rows written, {count} in {name}")
+        await conn.execute(MessageArchive.__table__.insert().values(
+            partition=name, range_from=month, range_to=add_months(month, 1),
+            path=path, rows=rows, archived_at=datetime.utcnow(),
+        ))
+        await conn.execute(text(f"DROP TABLE {name}"))
+    logger.info(f"Archived {name}: {rows} messages -> {path}")
+    return rows
+
+
+async def archive_old_partitions(engine: AsyncEngine, keep_months: int | None = None, now: datetime | None = None) -> list[str]:
+    """Архивирует все месяцы, целиком лежащие раньше чем `keep_months` месяцев назад"""
+    keep_months = keep_months if keep_months is not None else settings.MESSAGES_RETENTION_MONTHS
+    cutoff = add_months(month_start(now or datetime.utcnow()), -keep_months)
+    async with engine.connect() as conn:
+        attached = await _attached_partitions(conn)
+        detached = await _detached_partitions(conn)
+    archived = []
+    candidates = [(n, None) for n in detached]
+    candidates += [(n, "FINALIZE" if pending else "CONCURRENTLY") for n, pending in sorted(attached.items())]
+    for name, detach in candidates:
+        month = partition_month(name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        await archive_partition(engine, name, detach=detach)
+        archived.append(name)
+    return archived
+
+
+async def run_maintenance(engine: AsyncEngine | None = None) -> None:
+    """Один проход обслуживания; если им уже занят другой воркер — пропускаем"""
+    engine = engine or app_engine
+    async with engine.connect() as lock_conn:
+        locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})).scalar()
+        await lock_conn.commit()
+        if not locked:
+            return
+        try:
+            created = await ensure_partitions(engine)
+            if created:
+                logger.info(f"Created message partitions: {', '.join(created)}")
+            if settings.ARCHIVE_ENABLED:
+                await archive_old_partitions(engine)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            await lock_conn.commit()
+
+
+_task: asyncio.Task | None = None
+
+
+async def _maintenance_loop() -> None:
+    # первый проход — не в момент старта: холодный процесс сначала отвечает на запросы
+    await asyncio.sleep(settings.ARCHIVE_STARTUP_DELAY_SECONDS)
+    while True:
+        try:
+            await run_maintenance()
+        except Exception as e:
+            logger.error(f"Message partition maintenance failed: {e}")
+        await asyncio.sleep(settings.ARCHIVE_INTERVAL_SECONDS)
+
+
+async def start_archiver() -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(_maintenance_loop(), name="message-archiver")
+
+
+async def stop_archiver() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+# --- чтение ---
+
+@lru_cache(maxsize=64)
+def _load_index(index_path: str, mtime: float) -> dict:
+    with open(index_path, "rb") as f:
+        return orjson.loads(f.read())["sessions"]
+
+
+def _read_session(paths: list[str], session_id: int, after_id: int) -> list[dict]:
+    messages = []
+    for path in paths:
+        index_path = path[: -len(".jsonl.gz")] + ".index.json"
+        try:
+            index = _load_index(index_path, os.path.getmtime(index_path))
+        except FileNotFoundError:
+            logger.error(f"Archive index missing: {index_path}")
+            continue
+        span = index.get(str(session_id))
+        if span is None:
+            continue
+        with open(path, "rb") as f:
+            f.seek(span[0])
+            blob = f.read(span[1])
+        for line in gzip.decompress(blob).splitlines():
+            row = orjson.loads(line)
+            if row["id"] > after_id:
+                messages.append(row)
+    messages.sort(key=lambda r: r["id"])
+    return messages
+
+
+async def load_archived_messages(db: AsyncSession, session_id: int, after_id: int = 0, since: datetime | None = None) -> list[dict]:
+    """
+    Сообщения сессии из архивных месяцев (id > after_id), в хронологическом порядке.
+    since — пропустить месяцы, целиком лежащие раньше (для постраничного чтения).
+    Поля как в таблице: id, session_id, role, content, meta, created_at (ISO-строка).
+    """
+    session_created = select(ChatSession.created_at).where(ChatSession.id == session_id).scalar_subquery()
+    q = select(MessageArchive.path).where(MessageArchive.range_to > session_created)
+    if since is not None:
+        q = q.where(MessageArchive.range_to > since)
+    q = await db.execute(q.order_by(MessageArchive.range_from))
+    paths = list(q.scalars())
+    if not paths:
+        return []
+    return await asyncio.to_thread(_read_session, paths, session_id, after_id)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_maintenance())
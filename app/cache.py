@@ -1,22 +1,39 @@
-import redis
+import redis.asyncio as aioredis
 from .config import settings
+from .metrics import registry
 import json
+import time
+import hashlib
+import orjson
+from collections import OrderedDict
 from typing import Optional, Any
 from datetime import timedelta
 
-# Подключение к Redis
-redis_client = redis.Redis(
+# Асинхронный пул соединений к Redis: запросы не блокируют event loop,
+# при исчерпании пула корутина ждёт свободное соединение (до REDIS_POOL_TIMEOUT)
+redis_pool = aioredis.BlockingConnectionPool(
     host=settings.REDIS_HOST,
     port=settings.REDIS_PORT,
     db=settings.REDIS_DB,
-    decode_responses=True
+    decode_responses=True,
+    max_connections=settings.REDIS_MAX_CONNECTIONS,
+    timeout=settings.REDIS_POOL_TIMEOUT,
+    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
 )
+redis_client = aioredis.Redis(connection_pool=redis_pool)
+
+
+async def close_redis() -> None:
+    """Закрывает пул соединений при остановке приложения"""
+    await redis_client.aclose()
+    await redis_pool.disconnect()
 
 class TokenCache:
     """Класс для работы с временными токенами в кэше"""
     
     @staticmethod
-    def store_verification_token(email: str, token: str, expires_in: int = 45) -> bool:
+    async def store_verification_token(email: str, token: str, expires_in: int = 45) -> bool:
         """
         Сохраняет токен подтверждения в кэш
         
@@ -37,7 +54,7 @@ class TokenCache:
             }
             
             # Сохраняем токен с временем жизни
-            redis_client.setex(
+            await redis_client.setex(
                 key,
                 expires_in,
                 json.dumps(data)
@@ -49,7 +66,7 @@ class TokenCache:
             return False
     
     @staticmethod
-    def get_verification_token(email: str) -> Optional[str]:
+    async def get_verification_token(email: str) -> Optional[str]:
         """
         Получает токен подтверждения из кэша
         
@@ -61,7 +78,7 @@ class TokenCache:
         """
         try:
             key = f"verification_token:{email}"
-            data = redis_client.get(key)
+            data = await redis_client.get(key)
             
             if data:
                 token_data = json.loads(data)
@@ -73,7 +90,7 @@ class TokenCache:
             return None
     
     @staticmethod
-    def delete_verification_token(email: str) -> bool:
+    async def delete_verification_token(email: str) -> bool:
         """
         Удаляет токен подтверждения из кэша
         
@@ -85,14 +102,14 @@ class TokenCache:
         """
         try:
             key = f"verification_token:{email}"
-            redis_client.delete(key)
+            await redis_client.delete(key)
             return True
         except Exception as e:
             print(f"Error deleting verification token: {e}")
             return False
     
     @staticmethod
-    def store_password_reset_token(email: str, token: str, expires_in: int = 45) -> bool:
+    async def store_password_reset_token(email: str, token: str, expires_in: int = 45) -> bool:
         """
         Сохраняет токен для сброса пароля в кэш
         
@@ -112,7 +129,7 @@ class TokenCache:
                 "created_at": str(timedelta(seconds=0))
             }
             
-            redis_client.setex(
+            await redis_client.setex(
                 key,
                 expires_in,
                 json.dumps(data)
@@ -124,7 +141,7 @@ class TokenCache:
             return False
     
     @staticmethod
-    def get_password_reset_token(email: str) -> Optional[str]:
+    async def get_password_reset_token(email: str) -> Optional[str]:
         """
         Получает токен для сброса пароля из кэша
         
@@ -136,7 +153,7 @@ class TokenCache:
         """
         try:
             key = f"password_reset_token:{email}"
-            data = redis_client.get(key)
+            data = await redis_client.get(key)
             
             if data:
                 token_data = json.loads(data)
@@ -148,7 +165,7 @@ class TokenCache:
             return None
     
     @staticmethod
-    def delete_password_reset_token(email: str) -> bool:
+    async def delete_password_reset_token(email: str) -> bool:
         """
         Удаляет токен для сброса пароля из кэша
         
@@ -160,37 +177,206 @@ class TokenCache:
         """
         try:
             key = f"password_reset_token:{email}"
-            redis_client.delete(key)
+            await redis_client.delete(key)
             return True
         except Exception as e:
             print(f"Error deleting password reset token: {e}")
             return False
 
 
-def set_cached_completion(key: str, value: Any, expires_in: int = 300) -> bool:
+class CacheStats:
+    """Счётчики попаданий/промахов/вытеснений одного уровня кэша"""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.errors = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "errors": self.errors,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class LRUCache:
     """
-    Сохраняет результат в кэш
+    Ограниченный in-process LRU с TTL на каждую запись.
+
+    Просроченные записи удаляются при обращении, а при переполнении
+    вытесняется самая давно использованная запись.
     """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self.stats.misses += 1
+            return None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def delete(self, key: str) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def completion_cache_key(messages: list[dict], model: Optional[str] = None) -> str:
+    """
+    Стабильный компактный ключ кэша: канонический orjson (ключи отсортированы)
+    диалога и модели, хешированный blake2b до 128 бит.
+    """
+    canonical = orjson.dumps(
+        {"model": model or settings.OPENAI_MODEL, "messages": messages},
+        option=orjson.OPT_SORT_KEYS,
+    )
+    return "completion:" + hashlib.blake2b(canonical, digest_size=16).hexdigest()
+
+
+# Двухуровневый кэш ответов LLM: локальный LRU перед Redis
+local_completions = LRUCache(settings.COMPLETION_LRU_MAX_ENTRIES, settings.COMPLETION_CACHE_TTL_SECONDS)
+redis_completion_stats = CacheStats()
+
+
+async def set_cached_completion(messages: list[dict], value: str, expires_in: Optional[int] = None, model: Optional[str] = None) -> bool:
+    """
+    Сохраняет ответ LLM (JSON-строку) в оба уровня кэша
+    """
+    expires_in = expires_in or settings.COMPLETION_CACHE_TTL_SECONDS
+    key = completion_cache_key(messages, model)
+    local_completions.set(key, value, expires_in)
     try:
-        redis_client.setex(f"completion:{key}", expires_in, json.dumps(value))
+        await redis_client.setex(key, expires_in, value)
         return True
     except Exception as e:
+        redis_completion_stats.errors += 1
         print(f"Error setting cache: {e}")
         return False
 
 
-def get_cached_completion(key: str) -> Optional[Any]:
+async def get_cached_completion(messages: list[dict], model: Optional[str] = None) -> Optional[str]:
     """
-    Получает результат из кэша
+    Получает ответ LLM из кэша: сначала локальный LRU, затем Redis
     """
+    key = completion_cache_key(messages, model)
+    value = local_completions.get(key)
+    if value is not None:
+        return value
     try:
-        data = redis_client.get(f"completion:{key}")
-        if data:
-            return json.loads(data)
-        return None
+        # значение и оставшийся TTL одним round trip, чтобы локальная копия не пережила Redis
+        async with redis_client.pipeline(transaction=False) as pipe:
+            data, pttl = await pipe.get(key).pttl(key).execute()
     except Exception as e:
+        redis_completion_stats.errors += 1
         print(f"Error getting cache: {e}")
         return None
+    if not data:
+        redis_completion_stats.misses += 1
+        return None
+    redis_completion_stats.hits += 1
+    if pttl and pttl > 0:
+        local_completions.set(key, data, pttl / 1000)
+    return data
+
+
+async def completion_cache_stats() -> dict:
+    """Счётчики обоих уровней кэша; вытеснения Redis берутся из INFO stats"""
+    redis_stats = redis_completion_stats.as_dict()
+    try:
+        info = await redis_client.info("stats")
+        redis_stats["evictions"] = info.get("evicted_keys", 0)
+        redis_stats["expired"] = info.get("expired_keys", 0)
+    except Exception as e:
+        print(f"Error getting redis stats: {e}")
+    return {
+        "local": {**local_completions.stats.as_dict(), "size": len(local_completions), "max_entries": local_completions.max_entries},
+        "redis": redis_stats,
+    }
+
+
+completion_cache_requests = registry.counter(
+    "completion_cache_requests_total", "Обращения к кэшу ответов LLM по уровням", ("level", "result"),
+)
+completion_cache_entries = registry.gauge("completion_cache_local_entries", "Записей в локальном LRU ответов LLM")
+
+
+@registry.on_collect
+def _collect_completion_cache() -> None:
+    for level, stats in (("local", local_completions.stats), ("redis", redis_completion_stats)):
+        completion_cache_requests.set(stats.hits, level, "hit")
+        completion_cache_requests.set(stats.misses, level, "miss")
+        completion_cache_requests.set(stats.errors, level, "error")
+    completion_cache_entries.set(len(local_completions))
+
+# Межпроцессная блокировка «запрос к LLM уже в полёте» (single-flight между воркерами)
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+async def acquire_inflight_lock(key: str, token: str, ttl_ms: int) -> Optional[bool]:
+    """
+    SET NX PX на inflight:<key>. True — мы ведущий, False — запрос уже делает
+    другой воркер, None — Redis недоступен (работаем без межпроцессной дедупликации).
+    """
+    try:
+        return bool(await redis_client.set(f"inflight:{key}", token, nx=True, px=ttl_ms))
+    except Exception as e:
+        print(f"Error acquiring inflight lock: {e}")
+        return None
+
+
+async def inflight_lock_exists(key: str) -> bool:
+    try:
+        return bool(await redis_client.exists(f"inflight:{key}"))
+    except Exception as e:
+        print(f"Error checking inflight lock: {e}")
+        return False
+
+
+async def release_inflight_lock(key: str, token: str) -> None:
+    """Снимает блокировку, только если она всё ещё наша (не перехвачена после TTL)"""
+    try:
+        await redis_client.eval(_RELEASE_LOCK_SCRIPT, 1, f"inflight:{key}", token)
+    except Exception as e:
+        print(f"Error releasing inflight lock: {e}")
 
 # Создаем глобальный экземпляр кэша токенов
 token_cache = TokenCache() 
\ No newline at end of file
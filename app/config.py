@@ -7,22 +7,125 @@ class Settings(BaseSettings):
     APP_DEBUG: bool = True
     APP_CORS_ORIGINS: str = "*"
 
+    # GET /health/ready: параллельные пробы зависимостей с коротким таймаутом
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 1.0
+    HEALTH_READY_CACHE_SECONDS: float = 2.0  # результат переиспользуется между пробами
+    HEALTH_READY_CHECK_LLM: bool = False  # проверять и эндпоинт LLM (GET /models)
+
+    # GET /metrics (формат Prometheus)
+    METRICS_ENABLED: bool = True
+    METRICS_DIR: str = ""  # общий каталог снимков воркеров; пусто — метрики только этого процесса
+    METRICS_FLUSH_SECONDS: float = 5.0
+    METRICS_STALE_SECONDS: float = 30.0  # gauge воркера, не писавшего снимок дольше, не учитываются
+
     OPENAI_API_KEY: str = ""
     GROQ_API_KEY: str | None = None
     OPENAI_BASE_URL: str = "https://api.groq.com/openai/v1"
     OPENAI_MODEL: str = "llama-3.1-8b-instant"
     OPENAI_TIMEOUT: int = 60
 
+    # HTTP-клиенты к LLM: по одному на эндпоинт пула (создаются при старте приложения)
+    LLM_MAX_CONNECTIONS: int = 100
+    LLM_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    LLM_KEEPALIVE_EXPIRY: float = 30.0
+    LLM_CONNECT_TIMEOUT: float = 5.0
+    LLM_HTTP2: bool = True
+
+    # Планировщик вызовов LLM (на процесс): лимит одновременных вызовов и справедливая очередь по детям
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_QUEUE_MAX: int = 500  # больше запросов в очереди — сразу 503
+    LLM_QUEUE_TIMEOUT: float = 15.0  # срок запроса в очереди; не успевает по оценке — 503 сразу
+    LLM_RATELIMIT_RETRIES: int = 2  # повторов после 429 (после паузы по retry-after) или 5xx (на другом эндпоинте)
+    LLM_RATELIMIT_DEFAULT_PAUSE: float = 1.0  # пауза после 429 без retry-after, сек
+
+    # Пул эндпоинтов LLM (несколько ключей/провайдеров); пусто — один из OPENAI_*
+    LLM_ENDPOINTS: str = ""  # JSON: [{"name": ..., "base_url": ..., "api_key": ..., "model": ..., "fast_model": ...}]
+    LLM_ENDPOINTS_FILE: str = ""  # тот же JSON в файле; перечитывается при изменении (смена ключей без перезапуска)
+    LLM_ENDPOINTS_RELOAD_SECONDS: float = 5.0
+    LLM_ENDPOINT_COOLDOWN_SECONDS: float = 2.0  # эндпоинт после 5xx/сетевой ошибки не выбирается
+    LLM_ENDPOINT_IDLE_RESET_SECONDS: float = 30.0  # без запросов дольше — задержка эндпоинта снова неизвестна
+    LLM_HEDGE_ENABLED: bool = False  # дублировать запрос на другой эндпоинт после p95 задержки
+    LLM_HEDGE_QUANTILE: float = 0.95
+    LLM_HEDGE_MIN_SAMPLES: int = 20
+
     DB_HOST: str = "localhost"
     DB_PORT: int = 5432
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "postgres"
     DB_NAME: str = "aitutor"
 
+    # Пул соединений asyncpg
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 10.0  # сколько ждать свободное соединение, сек
+    DB_POOL_RECYCLE: int = 1800  # пересоздавать соединения старше N секунд
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 500  # 0 — если перед Postgres стоит pgbouncer (transaction mode)
+    DB_COMMAND_TIMEOUT: float = 30.0
+    DB_CONNECT_TIMEOUT: float = 10.0
+
+    # Помесячные партиции messages и архив старых месяцев (gzip JSONL на локальном диске)
+    MESSAGES_PARTITIONS_AHEAD: int = 3  # сколько будущих месяцев держать созданными
+    MESSAGES_RETENTION_MONTHS: int = 6  # месяцы старше этого уходят в архив
+    # выключено по умолчанию: архивированная партиция удаляется из базы, поэтому ARCHIVE_DIR
+    # должен быть постоянным общим хранилищем (persistent disk / общий том), а не диском контейнера
+    ARCHIVE_ENABLED: bool = False
+    ARCHIVE_DIR: str = "archive"
+    ARCHIVE_INTERVAL_SECONDS: int = 86400
+    ARCHIVE_STARTUP_DELAY_SECONDS: int = 60
+
     REDIS_HOST: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_DB: int = 0
     REDIS_TTL_SECONDS: int = 600
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 2.0
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+
+    # Кэш ответов LLM: in-process LRU + Redis
+    COMPLETION_CACHE_TTL_SECONDS: int = 300
+    COMPLETION_LRU_MAX_ENTRIES: int = 1024
+
+    # Семантический кэш ответов (перефразированные вопросы; numpy, индекс в памяти воркера)
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_THRESHOLD: float = 0.93  # косинус, выше которого ответ переиспользуется
+    SEMANTIC_CACHE_MAX_TURNS: int = 1  # только ходы, где реплик ребёнка не больше (ответ не зависит от урока)
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 20000  # на тему; дальше вытесняется давно не использованный
+    SEMANTIC_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    SEMANTIC_CACHE_MODEL: str = ""  # sentence-transformers, например paraphrase-multilingual-MiniLM-L12-v2; пусто — хэши n-грамм
+    SEMANTIC_CACHE_DIM: int = 256  # размерность хэш-эмбеддинга
+    SEMANTIC_CACHE_IVF_LISTS: int = 128  # IVF-индекс (k-means) с 16 записей на список; 0 — всегда полный перебор
+    SEMANTIC_CACHE_IVF_PROBE: int = 8
+
+    # Каскад моделей: простые ходы — быстрой модели, остальные и невалидные ответы — OPENAI_MODEL (app/llm_cascade.py)
+    LLM_CASCADE_ENABLED: bool = False
+    LLM_FAST_MODEL: str = ""  # например llama-3.1-8b-instant при OPENAI_MODEL=llama-3.3-70b-versatile; пусто — каскад выключен
+    LLM_CASCADE_FAST_MAX_CHARS: int = 80  # реплика ребёнка длиннее — основной модели
+    LLM_FAST_COST_PER_MTOKENS: float = 0.0  # $ за 1M токенов — для метрик стоимости по уровням
+    LLM_STRONG_COST_PER_MTOKENS: float = 0.0
+
+    # Заранее сгенерированные первые ходы урока по темам (app/lesson_packs.py)
+    LESSON_PACKS_ENABLED: bool = True
+    LESSON_PACK_OPENING: str = "Давай изучим тему: {topic}"  # первая реплика, которую клиент шлёт при выборе темы
+    LESSON_PACK_FOLLOWUPS: str = "Да!|Не знаю|Расскажи ещё"  # частые ответы ребёнка на ходах 2..K, через |
+    LESSON_PACK_TURNS: int = 3  # K — сколько первых ходов генерировать
+    LESSON_PACK_CONCURRENCY: int = 4  # темы, генерируемые одновременно
+    LESSON_PACK_TOPICS: str = ""  # темы через запятую: фоновая задача догенерирует недостающие пакеты
+    LESSON_PACKS_REFRESH_SECONDS: int = 300
+
+    # Single-flight: одинаковые одновременные запросы к LLM ждут один вызов
+    LLM_SINGLEFLIGHT_REDIS: bool = False  # дедупликация и между воркерами (через Redis-блокировку)
+    LLM_SINGLEFLIGHT_POLL_SECONDS: float = 0.05
+
+    # История диалога на сервере: сколько последних сообщений подаётся в контекст
+    HISTORY_WINDOW: int = 40
+    HISTORY_CACHE_TTL_SECONDS: int = 3600
+
+    # Бюджет контекста LLM: старые реплики сворачиваются в конспект сессии
+    LLM_CONTEXT_TOKEN_BUDGET: int = 4000
+    LLM_CONTEXT_FOLD_RATIO: float = 0.6  # после сворачивания диалог занимает эту долю бюджета
+    LLM_SUMMARY_MAX_TOKENS: int = 300
+    LLM_TOKENIZER: str = "cl100k_base"  # используется, если установлен tiktoken; неизвестное имя — ошибка
 
     FIREBASE_ENABLED: bool = False
     FIREBASE_PROJECT_ID: str | None = None
@@ -32,11 +135,31 @@ class Settings(BaseSettings):
     GOOGLE_REDIRECT_URI: str | None = None
     GOOGLE_CLIENT_SECRET: str | None = None
     GOOGLE_REFRESH_TOKEN: str | None = None
+    # Исходящие HTTP-запросы (Google OAuth, userinfo, JWKS, токен Gmail): клиент на хост
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_MAX_KEEPALIVE_PER_HOST: int = 10
+    HTTP_KEEPALIVE_EXPIRY: float = 60.0
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_RETRIES: int = 2  # повторы после первой попытки
+    HTTP_RETRY_BACKOFF: float = 0.2  # база экспоненциальной задержки (full jitter), сек
+    HTTP_RETRY_BACKOFF_MAX: float = 2.0
+    GOOGLE_TOKEN_URL: str = "https://oauth2.googleapis.com/token"
+    GOOGLE_USERINFO_URL: str = "https://www.googleapis.com/oauth2/v3/userinfo"
+    # Ключи для проверки Google ID token: кэш по Cache-Control, обновление в фоне
+    GOOGLE_JWKS_URL: str = "https://www.googleapis.com/oauth2/v3/certs"
+    GOOGLE_JWKS_DEFAULT_TTL_SECONDS: int = 3600  # если в ответе нет max-age
+    GOOGLE_JWKS_MIN_REFRESH_SECONDS: int = 60  # внеочередные обновления (неизвестный kid, ошибки) не чаще
+    GOOGLE_JWKS_TIMEOUT: float = 5.0
+    GOOGLE_CLOCK_SKEW_SECONDS: int = 10
 
     # JWT Security
     JWT_SECRET: str = "dev-secret-change-me"
     JWT_ALG: str = "HS256"
     JWT_EXPIRE_HOURS: int = 24
+    # Проверенные токены и их пользователи кэшируются в процессе (на воркер)
+    AUTH_CACHE_TTL_SECONDS: int = 300  # но не дольше exp токена
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
 
     # Email settings
     SMTP_HOST: str = "smtp.gmail.com"
@@ -44,6 +167,10 @@ class Settings(BaseSettings):
     SMTP_USER: str = ""
     SMTP_PASSWORD: str = ""
     SMTP_TLS: bool = True
+    EMAIL_WORKERS: int = 2  # = число одновременно открытых SMTP-соединений
+    EMAIL_QUEUE_MAXSIZE: int = 1000
+    EMAIL_SMTP_TIMEOUT: float = 30.0
+    EMAIL_SMTP_IDLE_SECONDS: float = 60.0  # после простоя соединение закрывается
     
     # Verification token settings
     VERIFICATION_TOKEN_LENGTH: int = 7
@@ -51,6 +178,11 @@ class Settings(BaseSettings):
 
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
 
+    # bcrypt: стоимость и пул потоков для хеширования паролей
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 2
+    BCRYPT_MAX_PENDING: int = 32  # больше задач в очереди — 429
+
     class Config:
         env_file = ".env"
 
@@ -1,17 +1,128 @@
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from greenlet import getcurrent
 from typing import AsyncGenerator
 from sqlalchemy.orm import declarative_base
+import time
 from .config import settings
+from .metrics import registry
+
+db_pool_wait = registry.histogram(
+    "db_pool_wait_seconds", "Ожидание свободного соединения из пула Postgres",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+db_pool_connect = registry.histogram(
+    "db_pool_connect_seconds", "Установка нового соединения пулом Postgres",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+db_pool_connections = registry.gauge("db_pool_connections", "Соединения пула Postgres", ("state",))
+db_pool_timeouts = registry.counter("db_pool_timeouts_total", "Не дождались соединения за DB_POOL_TIMEOUT")
 
 DATABASE_URL = (
     f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}"
     f"@{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
 )
 
-engine = create_async_engine(DATABASE_URL, echo=False, future=True)
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Пул соединений, который считает время ожидания свободного соединения.
+
+    Установка нового соединения (overflow) в ожидание не входит — она идёт
+    в db_pool_connect_seconds. Таймаутом считается только TimeoutError пула;
+    прочие ошибки (Postgres недоступен) пробрасываются без учёта.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.timeouts = 0
+        # время подключения внутри текущего _do_get; выдачи идут в разных гринлетах
+        self._connecting: dict = {}
+
+    def _create_connection(self):
+        started = time.perf_counter()
+        try:
+            return super()._create_connection()
+        finally:
+            elapsed = time.perf_counter() - started
+            db_pool_connect.observe(elapsed)
+            self._connecting[getcurrent()] = elapsed
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            self._observe_wait(time.perf_counter() - started)
+            raise
+        finally:
+            connected = self._connecting.pop(getcurrent(), 0.0)
+        self._observe_wait(time.perf_counter() - started - connected)
+        return conn
+
+    def _observe_wait(self, waited: float) -> None:
+        db_pool_wait.observe(waited)
+        self.waits += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+
+    def recreate(self):
+        # pre-ping/invalidate пересоздаёт пул — переносим счётчики
+        new_pool = super().recreate()
+        new_pool.waits, new_pool.wait_total = self.waits, self.wait_total
+        new_pool.wait_max, new_pool.timeouts = self.wait_max, self.timeouts
+        return new_pool
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size(),
+            "checked_in": self.checkedin(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "max_overflow": self._max_overflow,
+            "waits": self.waits,
+            "wait_avg_ms": round(self.wait_total / self.waits * 1000, 3) if self.waits else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "timeouts": self.timeouts,
+        }
+
+
+engine = create_async_engine(
+    DATABASE_URL,
+    echo=False,
+    future=True,
+    poolclass=TimedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        # кэш prepared statements asyncpg и адаптера SQLAlchemy (0 — для pgbouncer в transaction mode)
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT,
+        "timeout": settings.DB_CONNECT_TIMEOUT,
+    },
+)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 Base = declarative_base()
 
+def pool_stats() -> dict:
+    return engine.pool.stats()
+
+@registry.on_collect
+def _collect_pool() -> None:
+    stats = pool_stats()
+    db_pool_connections.set(stats["checked_out"], "checked_out")
+    db_pool_connections.set(stats["checked_in"], "checked_in")
+    db_pool_connections.set(stats["overflow"], "overflow")
+    db_pool_timeouts.set(stats["timeouts"])
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     """Генератор сессии базы данных"""
     async with SessionLocal() as session:
@@ -1,39 +1,99 @@
-from fastapi import Header, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from .cache import LRUCache
 from .config import settings
+from .db import get_db
+from .models import User
+from dataclasses import dataclass
+import hashlib
 import jwt
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 
-async def get_current_user_uid(authorization: str | None = Header(default=None)) -> str:
+@dataclass(frozen=True)
+class CurrentUser:
+    """Пользователь запроса. Лежит в кэше процесса, поэтому не ORM-объект"""
+    id: int
+    uid: str | None
+    username: str
+    email: str
+
+# Подпись токена проверяется один раз: дальше claims берутся из кэша по хешу токена
+# (запись живёт не дольше exp). Пользователь по claims — из своего кэша, без запроса в базу.
+local_claims = LRUCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+local_users = LRUCache(settings.AUTH_CACHE_MAX_ENTRIES, settings.AUTH_CACHE_TTL_SECONDS)
+
+def _token_key(token: str) -> str:
+    return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+def _bearer_token(authorization: str | None) -> str:
     # Expect Authorization: Bearer <token>
     if not authorization:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing Authorization header")
-    try:
-        scheme, token = authorization.split(" ", 1)
-        if scheme.lower() != "bearer":
-            raise ValueError("Invalid scheme")
-    except Exception:
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
         raise HTTPException(status_code=401, detail="Invalid Authorization header format")
+    return token
 
-    # For MVP: trust token is a signed JWT with claim 'uid' OR just a raw uid in dev
+def decode_token(token: str) -> dict:
+    """Claims токена: user_id (обычный вход) и/или uid (Google, dev)"""
+    key = _token_key(token)
+    claims = local_claims.get(key)
+    if claims is not None:
+        return claims
     try:
-        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
-        uid = payload.get("uid")
-        if not uid:
-            raise ValueError("uid missing")
-        return uid
-    except Exception:
+        claims = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALG])
+    except jwt.PyJWTError:
         # dev fallback: allow raw uid token if DEBUG
-        if settings.APP_DEBUG and token:
-            return token
-        raise HTTPException(status_code=401, detail="Invalid token") 
-    
-async def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
+        if not settings.APP_DEBUG:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        claims = {"uid": token}
+    if claims.get("type") == "refresh" or (not claims.get("user_id") and not claims.get("uid")):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    exp = claims.get("exp")
+    local_claims.set(key, claims, exp - time.time() if exp else None)
+    return claims
+
+async def get_current_user(
+    authorization: str | None = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+) -> CurrentUser:
+    """
+    Единая зависимость авторизации.
+
+    На повторных запросах с тем же токеном не проверяет подпись и не ходит в базу:
+    сессия из get_db берёт соединение только при первом запросе.
+    """
+    claims = decode_token(_bearer_token(authorization))
+    user_id, uid = claims.get("user_id"), claims.get("uid")
+    key = f"id:{user_id}" if user_id else f"uid:{uid}"
+    user = local_users.get(key)
+    if user is None:
+        q = select(User.id, User.uid, User.username, User.email)
+        q = q.where(User.id == user_id) if user_id else q.where(User.uid == uid)
+        row = (await db.execute(q)).one_or_none()
+        # соединение сразу обратно в пул: обработчик может долго ждать LLM
+        await db.close()
+        if row is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        user = CurrentUser(*row)
+        local_users.set(key, user)
+    return user
+
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=15)
+        expire = datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return jwt.encode(to_encode, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+
+def access_token_for(user: User, expires_delta: Optional[timedelta] = None) -> str:
+    """Токен приложения: get_current_user находит пользователя по user_id"""
+    return create_access_token(
+        {"user_id": user.id, "uid": user.uid, "username": user.username, "email": user.email},
+        expires_delta,
+    )
@@ -1,18 +1,36 @@
-import smtplib
+from __future__ import annotations
+
+import asyncio
 import random
 import string
-import requests
+import time
 import base64
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime
+from typing import TYPE_CHECKING
 from .config import settings
 from .cache import redis_client
+from .http_clients import http_clients
+from .metrics import registry
 import logging
 
+if TYPE_CHECKING:
+    import smtplib
+
 logger = logging.getLogger(__name__)
 
 class EmailService:
+    """
+    Отправка писем через фоновую очередь.
+
+    Обработчики только кладут письмо в очередь (enqueue) и сразу отвечают клиенту.
+    Несколько asyncio-воркеров разбирают очередь; у каждого своё долгоживущее
+    SMTP-соединение (STARTTLS + XOAUTH2), а access_token Gmail переиспользуется
+    до истечения срока.
+
+    smtplib и email.mime импортируются воркером при первом письме, а воркеры
+    запускаются первым письмом: процесс, который писем не шлёт, их не грузит.
+    """
+
     def __init__(self):
         self.smtp_host = settings.SMTP_HOST
         self.smtp_port = settings.SMTP_PORT
@@ -20,53 +38,172 @@ class EmailService:
         self.client_id = settings.GOOGLE_CLIENT_ID
         self.client_secret = settings.GOOGLE_CLIENT_SECRET
         self.refresh_token = settings.GOOGLE_REFRESH_TOKEN
+        self._access_token: str | None = None
+        self._access_token_expires_at = 0.0
+        self._token_lock: asyncio.Lock | None = None
+        self._queue: asyncio.Queue | None = None
+        self._workers: list[asyncio.Task] = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.connections_opened = 0
+
+    # --- жизненный цикл ---
+
+    async def start(self) -> None:
+        # при старте приложения не вызывается: воркеры (и smtplib) поднимаются первым письмом
+        self._ensure_started()
+
+    def _ensure_started(self) -> None:
+        # вызывается из работающего event loop: при старте приложения или лениво при первом письме
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=settings.EMAIL_QUEUE_MAXSIZE)
+        self._token_lock = asyncio.Lock()
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"email-worker-{i}")
+            for i in range(settings.EMAIL_WORKERS)
+        ]
 
-    def _get_access_token(self) -> str:
-        """Получает новый access_token через refresh_token"""
-        token_url = "https://oauth2.googleapis.com/token"
-        data = {
-            "client_id": self.client_id,
-            "client_secret": self.client_secret,
-            "refresh_token": self.refresh_token,
-            "grant_type": "refresh_token",
-        }
-        resp = requests.post(token_url, data=data)
-        resp.raise_for_status()
-        return resp.json()["access_token"]
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дожидается отправки очереди (не дольше timeout) и останавливает воркеров"""
+        if self._queue is not None and self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Email queue not drained: %s left", self._queue.qsize())
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    # --- OAuth ---
+
+    async def _get_access_token(self) -> str:
+        """access_token через refresh_token; кэшируется до истечения (с запасом в минуту)"""
+        async with self._token_lock:
+            if self._access_token and time.monotonic() < self._access_token_expires_at:
+                return self._access_token
+            data = {
+                "client_id": self.client_id,
+                "client_secret": self.client_secret,
+                "refresh_token": self.refresh_token,
+                "grant_type": "refresh_token",
+            }
+            # обмен refresh_token можно повторять: общий клиент повторит и после 5xx/обрыва
+            resp = await http_clients.request("POST", settings.GOOGLE_TOKEN_URL, data=data, idempotent=True)
+            resp.raise_for_status()
+            payload = resp.json()
+            self._access_token = payload["access_token"]
+            self._access_token_expires_at = time.monotonic() + int(payload.get("expires_in", 3600)) - 60
+            return self._access_token
 
     def generate_token(self) -> str:
         """Генерирует 7-значный токен"""
         return ''.join(random.choices(string.digits, k=settings.VERIFICATION_TOKEN_LENGTH))
 
-    def _send_email(self, to_email: str, subject: str, html_body: str) -> bool:
-        """Отправка письма через Gmail XOAUTH2"""
-        try:
-            # Собираем письмо
-            msg = MIMEMultipart()
-            msg["From"] = self.smtp_user
-            msg["To"] = to_email
-            msg["Subject"] = subject
-            msg.attach(MIMEText(html_body, "html"))
-
-            # Получаем свежий access_token
-            access_token = self._get_access_token()
+    # --- SMTP ---
 
+    def _connect(self, access_token: str | None) -> smtplib.SMTP:
+        """Открывает и авторизует SMTP-соединение (блокирующий вызов, выполняется в потоке)"""
+        import smtplib
+        server = smtplib.SMTP(self.smtp_host, self.smtp_port, timeout=settings.EMAIL_SMTP_TIMEOUT)
+        server.ehlo()
+        if settings.SMTP_TLS:
+            server.starttls()
+            server.ehlo()
+        if access_token:
             # Формируем XOAUTH2 строку
             auth_string = f"user={self.smtp_user}\1auth=Bearer {access_token}\1\1"
             auth_bytes = base64.b64encode(auth_string.encode("utf-8"))
+            code, resp = server.docmd("AUTH", "XOAUTH2 " + auth_bytes.decode("utf-8"))
+            if code != 235:
+                server.close()
+                raise smtplib.SMTPAuthenticationError(code, resp)
+        elif settings.SMTP_PASSWORD:
+            server.login(self.smtp_user, settings.SMTP_PASSWORD)
+        self.connections_opened += 1
+        return server
 
-            # SMTP подключение
-            server = smtplib.SMTP(self.smtp_host, self.smtp_port)
-            server.ehlo()
-            server.starttls()
-            server.docmd("AUTH", "XOAUTH2 " + auth_bytes.decode("utf-8"))
+    def _build_message(self, to_email: str, subject: str, html_body: str) -> str:
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+        msg = MIMEMultipart()
+        msg["From"] = self.smtp_user
+        msg["To"] = to_email
+        msg["Subject"] = subject
+        msg.attach(MIMEText(html_body, "html"))
+        return msg.as_string()
 
-            # Отправляем письмо
-            server.sendmail(self.smtp_user, to_email, msg.as_string())
+    @staticmethod
+    def _close(server: smtplib.SMTP | None) -> None:
+        if server is None:
+            return
+        try:
             server.quit()
+        except Exception:
+            server.close()
+
+    async def _worker(self, index: int) -> None:
+        import smtplib
+        server: smtplib.SMTP | None = None
+        try:
+            while True:
+                try:
+                    to_email, subject, html_body = await asyncio.wait_for(
+                        self._queue.get(), timeout=settings.EMAIL_SMTP_IDLE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # долго нет писем — отпускаем соединение, сервер всё равно его закроет
+                    await asyncio.to_thread(self._close, server)
+                    server = None
+                    continue
+                try:
+                    message = self._build_message(to_email, subject, html_body)
+                    # одна повторная попытка: соединение могло закрыться на стороне сервера
+                    for attempt in range(2):
+                        try:
+                            if server is None:
+                                token = await self._get_access_token() if self.refresh_token else None
+                                server = await asyncio.to_thread(self._connect, token)
+                            await asyncio.to_thread(server.sendmail, self.smtp_user, to_email, message)
+                            break
+                        except (smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError, OSError):
+                            await asyncio.to_thread(self._close, server)
+                            server = None
+                            if attempt:
+                                raise
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error(f"Failed to send email: {e}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            await asyncio.to_thread(self._close, server)
+
+    def _send_email(self, to_email: str, subject: str, html_body: str) -> bool:
+        """
+        Ставит письмо в очередь отправки.
+
+        Returns:
+            True если письмо принято в очередь, False если очередь переполнена
+        """
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((to_email, subject, html_body))
             return True
-        except Exception as e:
-            print(f"Failed to send email: {e}")
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.error("Email queue is full, dropping email to %s", to_email)
             return False
 
     def send_verification_email(self, email: str, token: str) -> bool:
@@ -109,3 +246,13 @@ class EmailService:
 
 # Глобальный экземпляр
 email_service = EmailService()
+
+email_queue_depth = registry.gauge("email_queue_depth", "Писем в очереди отправки")
+emails = registry.counter("emails_total", "Письма по результату", ("result",))
+
+@registry.on_collect
+def _collect_email() -> None:
+    email_queue_depth.set(email_service.queue_depth())
+    emails.set(email_service.sent, "sent")
+    emails.set(email_service.failed, "failed")
+    emails.set(email_service.dropped, "dropped")
@@ -0,0 +1,160 @@
+"""
+Проверка Google ID token без блокирующих запросов.
+
+Ключи Google (JWKS) скачиваются общим клиентом (app/http_clients.py) и живут в памяти
+столько, сколько разрешает Cache-Control ответа; фоновая задача обновляет их
+заранее, поэтому вход через Google обычно не ходит в сеть вовсе.
+Подпись проверяется локально (google.auth.jwt.decode по PEM из JWK).
+google.auth и rsa импортируются при первой проверке: старт процесса их не ждёт.
+"""
+
+import asyncio
+import base64
+import logging
+import re
+import time
+
+import httpx
+
+from .config import settings
+from .http_clients import http_clients
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_ISSUERS = {"accounts.google.com", "https://accounts.google.com"}
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+def _b64_int(value: str) -> int:
+    return int.from_bytes(base64.urlsafe_b64decode(value + "=" * (-len(value) % 4)), "big")
+
+
+def jwk_to_pem(jwk: dict) -> bytes:
+    """RSA-ключ из JWK в PEM (PKCS#1) — формат, который понимает google.auth.crypt"""
+    import rsa
+    return rsa.PublicKey(_b64_int(jwk["n"]), _b64_int(jwk["e"])).save_pkcs1()
+
+
+def cache_ttl(headers: httpx.Headers) -> float:
+    """Сколько секунд можно держать ответ: max-age минус Age, иначе GOOGLE_JWKS_DEFAULT_TTL_SECONDS"""
+    cache_control = headers.get("cache-control", "")
+    m = MAX_AGE_RE.search(cache_control)
+    if m is None or "no-store" in cache_control or "no-cache" in cache_control:
+        return float(settings.GOOGLE_JWKS_DEFAULT_TTL_SECONDS)
+    try:
+        age = int(headers.get("age", 0))
+    except ValueError:
+        age = 0
+    return float(max(int(m.group(1)) - age, 0))
+
+
+class GoogleKeys:
+    """
+    Кэш открытых ключей Google по kid.
+
+    Обновление одно на процесс (asyncio.Lock); неизвестный kid (ротация ключей)
+    вызывает внеочередное обновление не чаще GOOGLE_JWKS_MIN_REFRESH_SECONDS.
+    Если Google недоступен, используются прежние ключи.
+    """
+
+    def __init__(self, url: str | None = None):
+        self.url = url
+        self.certs: dict[str, bytes] = {}
+        self.expires_at = 0.0
+        self.fetched_at = 0.0
+        self.fetches = 0
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    def fresh(self) -> bool:
+        return bool(self.certs) and time.monotonic() < self.expires_at
+
+    async def refresh(self, force: bool = False) -> None:
+        started = time.monotonic()
+        async with self._lock:
+            # пока ждали блокировку, ключи мог обновить другой запрос
+            if self.fetched_at >= started or (not force and self.fresh()):
+                return
+            if force and self.fetched_at and started - self.fetched_at < settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS:
+                return
+            resp = await http_clients.request("GET", self.url or settings.GOOGLE_JWKS_URL, timeout=settings.GOOGLE_JWKS_TIMEOUT)
+            resp.raise_for_status()
+            certs = {k["kid"]: jwk_to_pem(k) for k in resp.json()["keys"] if k.get("kty") == "RSA"}
+            self.certs = certs
+            self.fetched_at = time.monotonic()
+            self.expires_at = self.fetched_at + cache_ttl(resp.headers)
+            self.fetches += 1
+
+    async def certs_for(self, kid: str | None) -> dict[str, bytes]:
+        if not self.fresh():
+            try:
+                await self.refresh()
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                if not self.certs:
+                    raise ValueError(f"Не удалось получить ключи Google: {e}")
+                logger.warning(f"Google JWKS refresh failed, using previous keys: {e}")
+        if kid not in self.certs:
+            try:
+                await self.refresh(force=True)
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                logger.warning(f"Google JWKS refresh failed: {e}")
+        return self.certs
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            try:
+                await self.refresh(force=True)
+                # обновляем, когда прошло 80% срока жизни ключей
+                delay = max((self.expires_at - time.monotonic()) * 0.8, settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS)
+            except Exception as e:
+                logger.error(f"Google JWKS refresh failed: {e}")
+                delay = settings.GOOGLE_JWKS_MIN_REFRESH_SECONDS
+            await asyncio.sleep(delay)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(), name="google-jwks-refresh")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def clear(self) -> None:
+        self.certs = {}
+        self.expires_at = self.fetched_at = 0.0
+
+
+google_keys = GoogleKeys()
+
+
+async def verify_google_id_token(token: str, audience: str | None = None) -> dict:
+    """Claims проверенного Google ID token; ValueError, если токен не годится"""
+    from google.auth import jwt as google_jwt
+    kid = google_jwt.decode_header(token).get("kid")
+    certs = await google_keys.certs_for(kid)
+    if kid not in certs:
+        raise ValueError("Неизвестный ключ подписи Google")
+    idinfo = google_jwt.decode(
+        token,
+        certs={kid: certs[kid]},
+        audience=audience or settings.GOOGLE_CLIENT_ID,
+        clock_skew_in_seconds=settings.GOOGLE_CLOCK_SKEW_SECONDS,
+    )
+    if idinfo.get("iss") not in GOOGLE_ISSUERS:
+        raise ValueError("Неверный издатель токена")
+    return idinfo
+
+
+async def start_google_keys() -> None:
+    # ключи прогреваются в фоне: старт приложения не ждёт Google
+    if settings.GOOGLE_CLIENT_ID:
+        await google_keys.start()
+
+
+async def stop_google_keys() -> None:
+    await google_keys.stop()
@@ -0,0 +1,148 @@
+import orjson
+from typing import Iterable
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from .config import settings
+from .cache import redis_client
+from .models import ChatSession, Message
+from .archive import load_archived_messages
+
+# Роли персонажей хранятся в базе как есть, а в LLM уходят как ответы ассистента
+ASSISTANT_ROLES = {"ayya", "ayana"}
+
+
+def _history_key(session_id: int) -> str:
+    return f"history:{session_id}"
+
+
+def history_entry(message) -> dict:
+    """Message или строка RETURNING с полями id, role, content"""
+    return {"id": message.id, "role": message.role, "content": message.content}
+
+
+def history_query(session_id: int, after_id: int, limit: int):
+    """Хвост истории сессии, новые сверху (индекс ix_messages_session_id_created_at)"""
+    return (
+        select(Message.id, Message.role, Message.content)
+        .where(Message.session_id == session_id, Message.id > after_id)
+        .order_by(Message.created_at.desc(), Message.id.desc())
+        .limit(limit)
+    )
+
+
+async def load_history(db: AsyncSession, session_id: int, after_id: int | None = None, limit: int | None = None) -> list[dict]:
+    """
+    Последние `limit` сообщений сессии в хронологическом порядке
+    (только с id > after_id, т.е. ещё не свёрнутые в конспект).
+
+    Сначала читает список history:{session_id} из Redis, при промахе — Postgres
+    (и архив старых месяцев, если в базе не хватило сообщений), после чего
+    заполняет кэш, чтобы следующие ходы обходились без запроса к базе.
+    """
+    limit = limit or settings.HISTORY_WINDOW
+    after_id = after_id or 0
+    key = _history_key(session_id)
+    try:
+        cached = await redis_client.lrange(key, -limit, -1)
+        if cached:
+            return [h for h in map(orjson.loads, cached) if h["id"] > after_id]
+    except Exception as e:
+        print(f"Error getting history cache: {e}")
+
+    q = await db.execute(history_query(session_id, after_id, limit))
+    history = [{"id": r.id, "role": r.role, "content": r.content} for r in reversed(q.all())]
+    if len(history) < limit:
+        # начало старой сессии могло уйти в архив вместе со своим месяцем
+        archived = await load_archived_messages(db, session_id, after_id)
+        if archived:
+            older = [{"id": r["id"], "role": r["role"], "content": r["content"]} for r in archived]
+            history = older[-(limit - len(history)):] + history
+    if history:
+        try:
+            async with redis_client.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.rpush(key, *(orjson.dumps(h) for h in history))
+                pipe.expire(key, settings.HISTORY_CACHE_TTL_SECONDS)
+                await pipe.execute()
+        except Exception as e:
+            print(f"Error setting history cache: {e}")
+    return history
+
+
+async def append_history(session_id: int, entries: Iterable[dict]) -> None:
+    """
+    Дописывает новые сообщения в кэш истории.
+
+    RPUSHX пишет только в существующий список: если кэш уже истёк, следующий
+    load_history целиком перечитает историю из базы, а не получит её хвост.
+    """
+    entries = [orjson.dumps(e) for e in entries]
+    if not entries:
+        return
+    key = _history_key(session_id)
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpushx(key, *entries)
+            pipe.ltrim(key, -settings.HISTORY_WINDOW, -1)
+            pipe.expire(key, settings.HISTORY_CACHE_TTL_SECONDS)
+            await pipe.execute()
+    except Exception as e:
+        print(f"Error appending history cache: {e}")
+
+
+def _summary_key(session_id: int) -> str:
+    return f"summary:{session_id}"
+
+
+async def load_summary(db: AsyncSession, session_id: int) -> tuple[str | None, int | None]:
+    """Конспект сессии и id последнего свёрнутого сообщения (Redis, затем Postgres)"""
+    key = _summary_key(session_id)
+    try:
+        cached = await redis_client.get(key)
+        if cached:
+            data = orjson.loads(cached)
+            return data["summary"], data["upto_id"]
+    except Exception as e:
+        print(f"Error getting summary cache: {e}")
+
+    q = await db.execute(
+        select(ChatSession.summary, ChatSession.summary_upto_id).where(ChatSession.id == session_id)
+    )
+    row = q.one_or_none()
+    if row is None:
+        return None, None
+    await _cache_summary(session_id, row.summary, row.summary_upto_id)
+    return row.summary, row.summary_upto_id
+
+
+async def save_summary(db: AsyncSession, session_id: int, summary: str, upto_id: int) -> None:
+    """Обновляет конспект в транзакции вызывающего (commit — на его стороне)"""
+    await db.execute(
+        update(ChatSession)
+        .where(ChatSession.id == session_id)
+        .values(summary=summary, summary_upto_id=upto_id)
+    )
+    await _cache_summary(session_id, summary, upto_id)
+
+
+async def _cache_summary(session_id: int, summary: str | None, upto_id: int | None) -> None:
+    try:
+        await redis_client.setex(
+            _summary_key(session_id),
+            settings.HISTORY_CACHE_TTL_SECONDS,
+            orjson.dumps({"summary": summary, "upto_id": upto_id}),
+        )
+    except Exception as e:
+        print(f"Error setting summary cache: {e}")
+
+
+def to_llm_messages(history: Iterable[dict]) -> list[dict]:
+    """Приводит историю к формату chat/completions: реплики Айи/Аяны — ответы ассистента"""
+    messages = []
+    for h in history:
+        if h["role"] in ASSISTANT_ROLES:
+            content = orjson.dumps({"role": h["role"], "say": h["content"]}).decode()
+            messages.append({"role": "assistant", "content": content})
+        else:
+            messages.append({"role": h["role"], "content": h["content"]})
+    return messages
@@ -0,0 +1,181 @@
+"""
+Общие исходящие HTTP-клиенты: Google OAuth (обмен кода, userinfo, JWKS) и
+токен Gmail для SMTP.
+
+Один httpx.AsyncClient на хост: keep-alive соединение переиспользуется между
+запросами, лимиты соединений и таймауты — свои у каждого хоста (HostPolicy).
+request() повторяет неудачные попытки с экспоненциальной задержкой и full jitter:
+  - ошибка соединения (запрос не ушёл) — повторяется всегда;
+  - таймаут чтения, обрыв, 429/502/503/504 — только для идемпотентных запросов.
+Счётчики по хостам (запросы, новые соединения, повторы) — stats(), GET /health/http-clients.
+"""
+
+import asyncio
+import logging
+import random
+from dataclasses import dataclass, replace
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {429, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# запрос точно не дошёл до сервера — повторять безопасно
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+RETRYABLE_ERRORS = NOT_SENT_ERRORS + (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError, httpx.WriteError)
+
+
+@dataclass(frozen=True)
+class HostPolicy:
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_expiry: float
+    timeout: float
+    connect_timeout: float
+    retries: int
+    backoff: float
+    backoff_max: float
+
+
+def default_policy() -> HostPolicy:
+    return HostPolicy(
+        max_connections=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+        timeout=settings.HTTP_TIMEOUT,
+        connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+        retries=settings.HTTP_RETRIES,
+        backoff=settings.HTTP_RETRY_BACKOFF,
+        backoff_max=settings.HTTP_RETRY_BACKOFF_MAX,
+    )
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.retries = 0
+        self.failures = 0
+
+    def as_dict(self) -> dict:
+        reused = max(self.requests - self.connections_opened, 0)
+        return {
+            "requests": self.requests,
+            "connections_opened": self.connections_opened,
+            "reused": reused,
+            "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+            "retries": self.retries,
+            "failures": self.failures,
+        }
+
+
+class HTTPClients:
+    """Реестр клиентов по хосту (scheme://host:port)"""
+
+    def __init__(self):
+        self._clients: dict[str, httpx.AsyncClient] = {}
+        self._policies: dict[str, HostPolicy] = {}
+        self._stats: dict[str, HostStats] = {}
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parts = urlsplit(url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def configure(self, host: str, **overrides) -> None:
+        """Свои лимиты/таймауты/повторы для хоста (host — URL или origin); действует на новый клиент"""
+        origin = self.origin(host)
+        self._policies[origin] = replace(self._policies.get(origin, default_policy()), **overrides)
+
+    def policy(self, origin: str) -> HostPolicy:
+        return self._policies.get(origin) or default_policy()
+
+    def stats_for(self, origin: str) -> HostStats:
+        return self._stats.setdefault(origin, HostStats())
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        origin = self.origin(url)
+        client = self._clients.get(origin)
+        if client is None or client.is_closed:
+            policy = self.policy(origin)
+            client = httpx.AsyncClient(
+                base_url=origin,
+                timeout=httpx.Timeout(policy.timeout, connect=policy.connect_timeout),
+                limits=httpx.Limits(
+                    max_connections=policy.max_connections,
+                    max_keepalive_connections=policy.max_keepalive_connections,
+                    keepalive_expiry=policy.keepalive_expiry,
+                ),
+            )
+            self._clients[origin] = client
+        return client
+
+    async def request(self, method: str, url: str, idempotent: bool | None = None, **kwargs) -> httpx.Response:
+        """
+        Запрос через общий клиент хоста с повторами.
+
+        idempotent — можно ли повторить запрос, который мог дойти до сервера
+        (по умолчанию — по методу: GET, HEAD, ... да; POST нет).
+        Ответ с 4xx/5xx возвращается как есть, после исчерпания повторов — тоже.
+        """
+        origin = self.origin(url)
+        client = self.get(url)
+        policy = self.policy(origin)
+        stats = self.stats_for(origin)
+        if idempotent is None:
+            idempotent = method.upper() in IDEMPOTENT_METHODS
+
+        async def trace(event: str, info: dict) -> None:
+            if event == "connection.connect_tcp.started":
+                stats.connections_opened += 1
+
+        extensions = {**kwargs.pop("extensions", {}), "trace": trace}
+        for attempt in range(policy.retries + 1):
+            stats.requests += 1
+            last = attempt == policy.retries
+            try:
+                resp = await client.request(method, url, extensions=extensions, **kwargs)
+            except RETRYABLE_ERRORS as e:
+                if last or not (idempotent or isinstance(e, NOT_SENT_ERRORS)):
+                    stats.failures += 1
+                    raise
+                delay = self._backoff(policy, attempt)
+                logger.warning(f"{method} {url} failed ({e!r}), retry in {delay:.2f} s")
+            except httpx.HTTPError:
+                stats.failures += 1
+                raise
+            else:
+                if last or not idempotent or resp.status_code not in RETRY_STATUSES:
+                    return resp
+                delay = self._backoff(policy, attempt, resp.headers.get("retry-after"))
+                await resp.aclose()
+                logger.warning(f"{method} {url} -> {resp.status_code}, retry in {delay:.2f} s")
+            stats.retries += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _backoff(policy: HostPolicy, attempt: int, retry_after: str | None = None) -> float:
+        # full jitter: равномерно от 0 до base * 2^attempt (не больше backoff_max)
+        delay = random.uniform(0, min(policy.backoff_max, policy.backoff * 2 ** attempt))
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), policy.backoff_max))
+        return delay
+
+    def stats(self) -> dict:
+        return {origin: s.as_dict() for origin, s in self._stats.items()}
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+
+http_clients = HTTPClients()
+
+
+async def close_http_clients() -> None:
+    await http_clients.aclose()
@@ -0,0 +1,160 @@
+import orjson
+from typing import Any
+
+_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+class TurnStreamParser:
+    """
+    Инкрементальный разбор JSON-ответа оркестратора по мере прихода токенов.
+
+    Поле `say` отдаётся кусками сразу по мере декодирования, остальные поля
+    верхнего уровня (`role`, `animations`, `next_task`) — целиком, как только
+    их значение закончилось.
+
+    feed() возвращает список событий:
+        ("say", "кусок текста")
+        ("field", "role", "ayya")
+    """
+
+    STREAMED_FIELD = "say"
+
+    def __init__(self):
+        self.fields: dict[str, Any] = {}
+        self._state = "start"
+        self._key: list[str] = []
+        self._key_escape = False
+        self._raw: list[str] = []
+        self._depth = 0
+        self._in_str = False
+        self._str_escape = False
+        self._say: list[str] = []
+        self._say_escape: str | None = None
+        self._high_surrogate: str | None = None
+
+    @property
+    def done(self) -> bool:
+        return self._state == "end"
+
+    def feed(self, chunk: str) -> list[tuple]:
+        events: list[tuple] = []
+        say_delta: list[str] = []
+        for ch in chunk:
+            self._step(ch, events, say_delta)
+        if say_delta:
+            # отдаём текст до событий о полях, завершённых в этом же куске
+            events.insert(0, ("say", "".join(say_delta)))
+        return events
+
+    def _step(self, ch: str, events: list, say_delta: list) -> None:
+        state = self._state
+        if state == "start":
+            if ch == "{":
+                self._state = "key_or_end"
+        elif state in ("key_or_end", "key_start"):
+            if ch == '"':
+                self._key = []
+                self._state = "key"
+            elif ch == "}" and state == "key_or_end":
+                self._state = "end"
+        elif state == "key":
+            if self._key_escape:
+                self._key.append(ch)
+                self._key_escape = False
+            elif ch == "\\":
+                self._key.append(ch)
+                self._key_escape = True
+            elif ch == '"':
+                self._state = "colon"
+            else:
+                self._key.append(ch)
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+        elif state == "value":
+            if ch.isspace():
+                return
+            if ch == '"' and self._current_key() == self.STREAMED_FIELD:
+                self._say = []
+                self._state = "say"
+                return
+            self._raw = []
+            self._depth = 0
+            self._in_str = False
+            self._str_escape = False
+            self._state = "raw"
+            self._step_raw(ch, events)
+        elif state == "say":
+            self._step_say(ch, events, say_delta)
+        elif state == "raw":
+            self._step_raw(ch, events)
+        elif state == "comma":
+            if ch == ",":
+                self._state = "key_start"
+            elif ch == "}":
+                self._state = "end"
+
+    def _current_key(self) -> str:
+        return orjson.loads('"' + "".join(self._key) + '"')
+
+    def _finish_value(self, value: Any, events: list) -> None:
+        key = self._current_key()
+        self.fields[key] = value
+        if key != self.STREAMED_FIELD or not isinstance(value, str):
+            events.append(("field", key, value))
+        self._state = "comma"
+
+    def _step_say(self, ch: str, events: list, say_delta: list) -> None:
+        if self._say_escape is not None:
+            self._say_escape += ch
+            if self._say_escape.startswith("\\u") and len(self._say_escape) < 6:
+                return
+            if self._say_escape.startswith("\\u"):
+                text = chr(int(self._say_escape[2:], 16))
+            else:
+                text = _ESCAPES.get(ch, ch)
+            self._emit_say(text, say_delta)
+            self._say_escape = None
+        elif ch == "\\":
+            self._say_escape = "\\"
+        elif ch == '"':
+            self._finish_value("".join(self._say), events)
+        else:
+            self._emit_say(ch, say_delta)
+
+    def _emit_say(self, text: str, say_delta: list) -> None:
+        # суррогатные пары (😀) склеиваем перед отдачей клиенту
+        if self._high_surrogate is not None:
+            text = (self._high_surrogate + text).encode("utf-16", "surrogatepass").decode("utf-16")
+            self._high_surrogate = None
+        elif len(text) == 1 and "\ud800" <= text <= "\udbff":
+            self._high_surrogate = text
+            return
+        self._say.append(text)
+        say_delta.append(text)
+
+    def _step_raw(self, ch: str, events: list) -> None:
+        if self._in_str:
+            self._raw.append(ch)
+            if self._str_escape:
+                self._str_escape = False
+            elif ch == "\\":
+                self._str_escape = True
+            elif ch == '"':
+                self._in_str = False
+                if self._depth == 0:
+                    self._finish_value(orjson.loads("".join(self._raw)), events)
+            return
+        if self._depth == 0 and ch in ",}":
+            # скаляр (число, true/false/null) закончился на разделителе
+            self._finish_value(orjson.loads("".join(self._raw).strip()), events)
+            self._step(ch, events, [])
+            return
+        self._raw.append(ch)
+        if ch == '"':
+            self._in_str = True
+        elif ch in "[{":
+            self._depth += 1
+        elif ch in "]}":
+            self._depth -= 1
+            if self._depth == 0:
+                self._finish_value(orjson.loads("".join(self._raw)), events)
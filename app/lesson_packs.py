@@ -0,0 +1,328 @@
+"""
+Заранее сгенерированные первые ходы урока по темам («пакеты уроков»).
+
+Начало урока по теме почти одинаково у всех детей: клиент присылает
+LESSON_PACK_OPENING («Давай изучим тему: …»), дальше ребёнок чаще всего
+отвечает одной из коротких реплик. Пакет — ответы orchestrate_turn на
+LESSON_PACK_TURNS первых ходов по сценарию [LESSON_PACK_OPENING, *LESSON_PACK_FOLLOWUPS],
+сгенерированные заранее (CLI или фоновая задача по LESSON_PACK_TOPICS,
+не больше LESSON_PACK_CONCURRENCY тем одновременно).
+
+- Пакеты лежат в таблице lesson_packs: тема, версия (растёт в пределах темы),
+  prompt_hash и ходы. prompt_hash — хэш промптов app/prompts.py и модели:
+  после их изменения старые пакеты просто перестают подходить (prune удаляет их).
+- Воркер держит в памяти последнюю версию каждой темы с текущим prompt_hash и
+  перечитывает таблицу раз в LESSON_PACKS_REFRESH_SECONDS.
+- orchestrate_turn отдаёт ответ из пакета без вызова LLM, если диалог совпадает
+  со сценарием пакета (без учёта регистра, пунктуации и пробелов).
+
+CLI:
+  python -m app.lesson_packs generate --topics topics.txt [--turns 3] [--concurrency 4]
+  python -m app.lesson_packs list
+  python -m app.lesson_packs prune
+"""
+
+import argparse
+import asyncio
+import hashlib
+import logging
+import re
+import time
+
+import orjson
+from sqlalchemy import delete, func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from . import prompts
+from .config import settings
+from .db import engine as app_engine
+from .metrics import registry
+from .models import LessonPack
+
+logger = logging.getLogger(__name__)
+
+# генерацию пакетов по LESSON_PACK_TOPICS ведёт один воркер
+ADVISORY_LOCK_ID = 0x6C70636B
+# одна очередь планировщика LLM на всю генерацию: уроки детей не ждут за ней
+GENERATION_FLOW = "lesson-packs"
+WORD_RE = re.compile(r"\w+")
+
+lesson_pack_requests = registry.counter("lesson_pack_requests_total", "Поиск хода в пакетах уроков", ("result",))
+
+
+def prompt_hash() -> str:
+    """Хэш промптов app/prompts.py и модели: пакеты с другим хэшем не отдаются"""
+    texts = {name: value for name, value in vars(prompts).items() if name.isupper() and isinstance(value, str)}
+    texts["model"] = settings.OPENAI_MODEL
+    return hashlib.sha256(orjson.dumps(texts, option=orjson.OPT_SORT_KEYS)).hexdigest()[:16]
+
+
+def _normalize(text: str) -> str:
+    return " ".join(WORD_RE.findall(text.lower().replace("ё", "е")))
+
+
+def pack_script(topic: str, turns: int | None = None) -> list[str]:
+    """Реплики ребёнка для первых `turns` ходов урока по теме"""
+    turns = turns or settings.LESSON_PACK_TURNS
+    followups = [f.strip() for f in settings.LESSON_PACK_FOLLOWUPS.split("|") if f.strip()]
+    return [settings.LESSON_PACK_OPENING.format(topic=topic), *followups][:turns]
+
+
+def dialog_key(dialog: list[dict]) -> str:
+    """Ключ диалога (сообщения chat/completions): у ответов ассистента учитывается только реплика"""
+    parts = []
+    for m in dialog:
+        content = m["content"]
+        if m["role"] == "assistant":
+            try:
+                content = orjson.loads(content).get("say") or ""
+            except (orjson.JSONDecodeError, AttributeError):
+                pass
+        parts.append(f"{m['role']}:{_normalize(content)}")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def _assistant_message(reply: dict) -> dict:
+    # в том же виде, в каком ответ вернётся в диалог из истории (history.to_llm_messages)
+    content = orjson.dumps({"role": reply.get("role", "system"), "say": reply.get("say", "")}).decode()
+    return {"role": "assistant", "content": content}
+
+
+# --- генерация ---
+
+async def generate_pack(topic: str, turns: int | None = None) -> list[dict]:
+    """Ходы пакета: каждый следующий ход продолжает диалог с ответом на предыдущий"""
+    from .ai import orchestrate_turn  # ai подключает пакеты к orchestrate_turn
+
+    dialog: list[dict] = []
+    result = []
+    for utterance in pack_script(topic, turns):
+        dialog.append({"role": "user", "content": utterance})
+        reply = await orchestrate_turn(dialog, flow=GENERATION_FLOW, topic=topic)
+        result.append({"user": utterance, "reply": reply})
+        dialog.append(_assistant_message(reply))
+    return result
+
+
+async def store_pack(engine: AsyncEngine, topic: str, turns: list[dict], phash: str | None = None) -> int:
+    """Сохраняет пакет следующей версией темы; возвращает версию"""
+    async with engine.begin() as conn:
+        latest = (await conn.execute(
+            select(func.max(LessonPack.version)).where(LessonPack.topic == topic)
+        )).scalar()
+        version = (latest or 0) + 1
+        await conn.execute(LessonPack.__table__.insert().values(
+            topic=topic, version=version, prompt_hash=phash or prompt_hash(), turns=turns,
+        ))
+    return version
+
+
+async def generate_packs(topics: list[str], engine: AsyncEngine | None = None, turns: int | None = None,
+                         concurrency: int | None = None) -> dict[str, int]:
+    """Генерирует и сохраняет пакеты тем; возвращает {тема: версия} для удавшихся"""
+    engine = engine or app_engine
+    phash = prompt_hash()
+    sem = asyncio.Semaphore(concurrency or settings.LESSON_PACK_CONCURRENCY)
+    versions: dict[str, int] = {}
+
+    async def one(topic: str) -> None:
+        async with sem:
+            started = time.perf_counter()
+            try:
+                pack = await generate_pack(topic, turns)
+                versions[topic] = await store_pack(engine, topic, pack, phash)
+            except Exception as e:
+                logger.error(f"Lesson pack generation failed for {topic!r}: {e}")
+                return
+            logger.info(f"Lesson pack {topic!r} v{versions[topic]}: {len(pack)} turns in {time.perf_counter() - started:.1f}s")
+
+    await asyncio.gather(*(one(t) for t in dict.fromkeys(topics)))
+    return versions
+
+
+async def missing_topics(engine: AsyncEngine, topics: list[str]) -> list[str]:
+    """Темы без пакета с текущим prompt_hash"""
+    async with engine.connect() as conn:
+        ready = set((await conn.execute(
+            select(LessonPack.topic).where(LessonPack.prompt_hash == prompt_hash(), LessonPack.topic.in_(topics))
+        )).scalars())
+    return [t for t in dict.fromkeys(topics) if t not in ready]
+
+
+async def ensure_packs(topics: list[str], engine: AsyncEngine | None = None) -> dict[str, int]:
+    """Догенерирует пакеты тем, у которых нет пакета с текущими промптами; если этим занят другой воркер — пропускаем"""
+    engine = engine or app_engine
+    async with engine.connect() as lock_conn:
+        locked = (await lock_conn.execute(text("SELECT pg_try_advisory_lock(:id)"), {"id": ADVISORY_LOCK_ID})).scalar()
+        await lock_conn.commit()
+        if not locked:
+            return {}
+        try:
+            missing = await missing_topics(engine, topics)
+            return await generate_packs(missing, engine) if missing else {}
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": ADVISORY_LOCK_ID})
+            await lock_conn.commit()
+
+
+async def prune_packs(engine: AsyncEngine | None = None) -> int:
+    """Удаляет пакеты, сгенерированные с другими промптами"""
+    engine = engine or app_engine
+    async with engine.begin() as conn:
+        result = await conn.execute(delete(LessonPack).where(LessonPack.prompt_hash != prompt_hash()))
+    return result.rowcount
+
+
+# --- отдача ---
+
+class LessonPacks:
+    """Пакеты с текущими промптами в памяти воркера: ключ диалога -> ответ"""
+
+    def __init__(self):
+        self.replies: dict[str, dict] = {}
+        self.versions: dict[str, int] = {}
+        self.depth = 0  # ходов ребёнка в самом длинном пакете
+        self.prompt_hash: str | None = None
+        self.loaded_at: float | None = None
+        self.hits = 0
+        self.misses = 0
+
+    def install(self, packs: list[tuple[str, int, list[dict]]], phash: str) -> None:
+        replies, versions, depth = {}, {}, 0
+        for topic, version, turns in packs:
+            dialog: list[dict] = []
+            for turn in turns:
+                dialog.append({"role": "user", "content": turn["user"]})
+                replies[dialog_key(dialog)] = turn["reply"]
+                dialog.append(_assistant_message(turn["reply"]))
+            versions[topic] = version
+            depth = max(depth, len(turns))
+        self.replies, self.versions, self.depth = replies, versions, depth
+        self.prompt_hash, self.loaded_at = phash, time.time()
+
+    async def load(self, engine: AsyncEngine | None = None) -> None:
+        """Перечитывает последние версии пакетов с текущим prompt_hash"""
+        engine = engine or app_engine
+        phash = prompt_hash()
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                select(LessonPack.topic, LessonPack.version, LessonPack.turns)
+                .where(LessonPack.prompt_hash == phash)
+                .order_by(LessonPack.topic, LessonPack.version.desc())
+                .distinct(LessonPack.topic)
+            )).all()
+        self.install([tuple(r) for r in rows], phash)
+
+    def lookup(self, dialog: list[dict], summary: str | None = None) -> dict | None:
+        """Ответ из пакета, если диалог — начало урока по сценарию пакета"""
+        if not self.replies or summary or not dialog or dialog[-1]["role"] != "user" or len(dialog) > 2 * self.depth:
+            return None
+        reply = self.replies.get(dialog_key(dialog))
+        if reply is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return reply
+
+    def snapshot(self) -> dict:
+        return {
+            "prompt_hash": self.prompt_hash,
+            "topics": len(self.versions),
+            "turns": len(self.replies),
+            "loaded_at": self.loaded_at,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+lesson_packs = LessonPacks()
+
+
+@registry.on_collect
+def _collect_lesson_packs() -> None:
+    lesson_pack_requests.set(lesson_packs.hits, "hit")
+    lesson_pack_requests.set(lesson_packs.misses, "miss")
+
+
+def configured_topics() -> list[str]:
+    return [t.strip() for t in settings.LESSON_PACK_TOPICS.split(",") if t.strip()]
+
+
+_task: asyncio.Task | None = None
+
+
+async def _refresh_loop() -> None:
+    while True:
+        try:
+            if configured_topics():
+                await ensure_packs(configured_topics())
+            await lesson_packs.load()
+        except Exception as e:
+            logger.error(f"Lesson packs refresh failed: {e}")
+        await asyncio.sleep(settings.LESSON_PACKS_REFRESH_SECONDS)
+
+
+async def start_lesson_packs() -> None:
+    global _task
+    if settings.LESSON_PACKS_ENABLED and _task is None:
+        _task = asyncio.create_task(_refresh_loop(), name="lesson-packs")
+
+
+async def stop_lesson_packs() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+# --- CLI ---
+
+def _read_topics(path: str) -> list[str]:
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+async def _cli(args: argparse.Namespace) -> None:
+    from .ai import shutdown_llm_client, startup_llm_client
+
+    try:
+        if args.command == "generate":
+            topics = _read_topics(args.topics) if args.topics else configured_topics()
+            if args.missing:
+                topics = await missing_topics(app_engine, topics)
+            await startup_llm_client()
+            versions = await generate_packs(topics, turns=args.turns, concurrency=args.concurrency)
+            print(f"generated {len(versions)}/{len(topics)} packs, prompt_hash={prompt_hash()}")
+        elif args.command == "list":
+            current = prompt_hash()
+            async with app_engine.connect() as conn:
+                rows = (await conn.execute(
+                    select(LessonPack.topic, LessonPack.version, LessonPack.prompt_hash, LessonPack.created_at)
+                    .order_by(LessonPack.topic, LessonPack.version)
+                )).all()
+            for topic, version, phash, created_at in rows:
+                mark = "current" if phash == current else "stale"
+                print(f"{topic}\tv{version}\t{phash}\t{mark}\t{created_at:%Y-%m-%d %H:%M}")
+        elif args.command == "prune":
+            print(f"deleted {await prune_packs()} stale packs")
+    finally:
+        await shutdown_llm_client()
+        await app_engine.dispose()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(prog="python -m app.lesson_packs")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="сгенерировать пакеты тем (новой версией)")
+    gen.add_argument("--topics", help="файл с темами, по одной на строку (по умолчанию LESSON_PACK_TOPICS)")
+    gen.add_argument("--turns", type=int, default=None)
+    gen.add_argument("--concurrency", type=int, default=None)
+    gen.add_argument("--missing", action="store_true", help="только темы без пакета с текущими промптами")
+    commands.add_parser("list", help="пакеты в базе и подходят ли они к текущим промптам")
+    commands.add_parser("prune", help="удалить пакеты, сгенерированные с другими промптами")
+    asyncio.run(_cli(parser.parse_args()))
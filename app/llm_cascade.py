@@ -0,0 +1,179 @@
+"""
+Каскад моделей: простые ходы урока — быстрой модели (LLM_FAST_MODEL), остальные — основной (OPENAI_MODEL).
+
+Ход классифицируется локальными эвристиками, без вызова LLM (classify_turn),
+по этапу цикла Фейнмана и последней реплике ребёнка:
+  - opening  — в диалоге ещё нет ответа ассистента: Айя задаёт урок → основная;
+  - long     — реплика длиннее LLM_CASCADE_FAST_MAX_CHARS → основная;
+  - confused — «не знаю», «не понял», встречный вопрос: нужна коррекция Айи → основная;
+  - project  — этап мини-проекта (план, наблюдения, презентация) → основная;
+  - followup — короткое «да», «понятно», «ещё»: дальше простой вопрос Аяны → быстрая;
+  - answer   — ответ на вопрос ассистента: его надо проверить и, может быть, поправить → основная;
+  - remark   — остальные короткие реплики → быстрая.
+Ответ быстрой модели проверяется (validate_reply). Невалидный JSON, неверные поля или
+ошибка запроса — тот же ход уходит основной модели (эскалация). Невалидный ответ
+не кэшируется, а принятый ответ основной кладётся в кэш и под ключом быстрой:
+повтор хода не спрашивает быструю модель и не эскалирует снова.
+
+Задержка, токены и стоимость (LLM_*_COST_PER_MTOKENS) считаются по уровням: /metrics
+и /health/llm-cascade. Офлайн-оценка на записанных диалогах — benchmarks/eval_cascade.py.
+"""
+
+import re
+
+import orjson
+
+from .config import settings
+from .metrics import registry, LLM_BUCKETS
+
+FAST = "fast"
+STRONG = "strong"
+TIERS = (FAST, STRONG)
+
+REPLY_ROLES = frozenset(("ayya", "ayana", "system"))
+WORD_RE = re.compile(r"\w+")
+NUMBER_RE = re.compile(r"\d")
+
+
+def _normalize(text: str) -> str:
+    """Реплики и словари сравниваются в нижнем регистре и с «е» вместо «ё»"""
+    return text.lower().replace("ё", "е")
+
+
+# короткие согласия и просьбы продолжить: дальше — следующий простой вопрос
+FOLLOWUP_WORDS = frozenset(
+    _normalize("да ага угу ок окей хорошо понятно поняла понял ясно ещё дальше давай интересно класс ура хочу").split()
+)
+# ребёнок запутался: Айя должна поправить и объяснить иначе
+CONFUSED_PHRASES = tuple(map(_normalize, (
+    "не знаю", "не понял", "не поняла", "не понятно", "непонятно", "не могу", "не получается", "запутал",
+)))
+# встречный вопрос ребёнка часто без «?»: «а почему они падают»
+QUESTION_WORDS = frozenset(_normalize("почему зачем отчего откуда как сколько где куда когда").split())
+PROJECT_WORDS = frozenset(_normalize(
+    "проект проекта проекту проектом план плана наблюдение наблюдения опыт опыта презентация презентацию родителям"
+).split())
+
+cascade_turns = registry.counter("llm_cascade_turns_total", "Ходы по уровню модели и причине выбора", ("tier", "reason"))
+cascade_escalations = registry.counter(
+    "llm_cascade_escalations_total", "Ходы, переданные основной модели после ответа быстрой", ("reason",),
+)
+tier_duration = registry.histogram(
+    "llm_tier_request_duration_seconds", "Время запроса к LLM по уровню модели (с повторами)", ("tier",),
+    buckets=LLM_BUCKETS,
+)
+tier_tokens = registry.counter("llm_tier_tokens_total", "Токены по usage по уровню модели", ("tier",))
+tier_cost = registry.counter("llm_tier_cost_usd_total", "Оценка стоимости по usage и LLM_*_COST_PER_MTOKENS", ("tier",))
+
+
+def enabled() -> bool:
+    return settings.LLM_CASCADE_ENABLED and bool(settings.LLM_FAST_MODEL)
+
+
+def tier_model(tier: str) -> str:
+    return settings.LLM_FAST_MODEL if tier == FAST else settings.OPENAI_MODEL
+
+
+def model_tier(model: str | None) -> str:
+    """Уровень по имени модели из запроса; всё, кроме LLM_FAST_MODEL, — основная"""
+    if model and settings.LLM_FAST_MODEL and model == settings.LLM_FAST_MODEL and model != settings.OPENAI_MODEL:
+        return FAST
+    return STRONG
+
+
+def tier_price(tier: str) -> float:
+    """$ за 1M токенов"""
+    return settings.LLM_FAST_COST_PER_MTOKENS if tier == FAST else settings.LLM_STRONG_COST_PER_MTOKENS
+
+
+def _assistant_say(message: dict) -> str:
+    try:
+        return str(orjson.loads(message["content"]).get("say") or "")
+    except (orjson.JSONDecodeError, AttributeError):
+        return message["content"]
+
+
+def classify_turn(dialog: list[dict]) -> tuple[str, str]:
+    """(уровень, причина) для хода, который отвечает на последнюю реплику ребёнка в `dialog`"""
+    last_assistant = next((m for m in reversed(dialog) if m["role"] == "assistant"), None)
+    if last_assistant is None or not dialog or dialog[-1]["role"] != "user":
+        return STRONG, "opening"
+    # все реплики ребёнка после последнего ответа ассистента
+    text = []
+    for m in reversed(dialog):
+        if m["role"] != "user":
+            break
+        text.append(m["content"])
+    child = _normalize(" ".join(reversed(text)))
+    words = WORD_RE.findall(child)
+    if len(child) > settings.LLM_CASCADE_FAST_MAX_CHARS:
+        return STRONG, "long"
+    if any(p in child for p in CONFUSED_PHRASES) or "?" in child or QUESTION_WORDS.intersection(words[:2]):
+        return STRONG, "confused"
+    said = _normalize(_assistant_say(last_assistant))
+    if PROJECT_WORDS.intersection(words) or PROJECT_WORDS.intersection(WORD_RE.findall(said)):
+        return STRONG, "project"
+    if words and len(words) <= 3 and all(w in FOLLOWUP_WORDS for w in words) and not NUMBER_RE.search(child):
+        return FAST, "followup"
+    if said.rstrip().endswith("?"):
+        return STRONG, "answer"
+    return FAST, "remark"
+
+
+def validate_reply(reply) -> str | None:
+    """Почему ответ оркестратора не годится (None — годится)"""
+    if not isinstance(reply, dict):
+        return "not_object"
+    if reply.get("role") not in REPLY_ROLES:
+        return "bad_role"
+    say = reply.get("say")
+    if not isinstance(say, str) or not say.strip():
+        return "empty_say"
+    animations = reply.get("animations")
+    if animations is not None and not (isinstance(animations, list) and all(isinstance(a, str) for a in animations)):
+        return "bad_animations"
+    if reply.get("next_task") is not None and not isinstance(reply["next_task"], str):
+        return "bad_next_task"
+    return None
+
+
+class CascadeStats:
+    """Ходы по уровням и причинам, эскалации, токены и стоимость по usage"""
+
+    def __init__(self):
+        self.turns: dict[tuple[str, str], int] = {}
+        self.escalations: dict[str, int] = {}
+        self.tokens = {tier: 0 for tier in TIERS}
+        self.cost_usd = {tier: 0.0 for tier in TIERS}
+
+    def route(self, tier: str, reason: str) -> None:
+        self.turns[(tier, reason)] = self.turns.get((tier, reason), 0) + 1
+        cascade_turns.inc(tier, reason)
+
+    def escalate(self, reason: str) -> None:
+        self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        cascade_escalations.inc(reason)
+
+    def record_tokens(self, model: str | None, total: int) -> None:
+        tier = model_tier(model)
+        cost = total * tier_price(tier) / 1e6
+        self.tokens[tier] += total
+        self.cost_usd[tier] += cost
+        tier_tokens.inc(tier, amount=total)
+        tier_cost.inc(tier, amount=cost)
+
+    def as_dict(self) -> dict:
+        routed = {tier: sum(n for (t, _), n in self.turns.items() if t == tier) for tier in TIERS}
+        return {
+            "enabled": enabled(),
+            "models": {tier: tier_model(tier) for tier in TIERS},
+            "turns": routed,
+            "reasons": {f"{tier}:{reason}": n for (tier, reason), n in sorted(self.turns.items())},
+            "escalations": dict(self.escalations),
+            "escalation_rate": round(sum(self.escalations.values()) / routed[FAST], 4) if routed[FAST] else None,
+            "tokens": dict(self.tokens),
+            "cost_usd": {tier: round(cost, 6) for tier, cost in self.cost_usd.items()},
+        }
+
+
+cascade_stats = CascadeStats()
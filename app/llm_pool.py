@@ -0,0 +1,393 @@
+"""
+Пул эндпоинтов LLM: пары «base_url + ключ» у одного или нескольких провайдеров.
+
+Источник списка (JSON: [{"name", "base_url", "api_key", "model"?, "fast_model"?}, ...]):
+  1. LLM_ENDPOINTS_FILE — перечитывается при изменении файла (проверка не чаще
+     LLM_ENDPOINTS_RELOAD_SECONDS): ключ можно сменить без перезапуска;
+  2. LLM_ENDPOINTS — та же строка в переменной окружения;
+  3. иначе один эндпоинт из OPENAI_BASE_URL / OPENAI_API_KEY (GROQ_API_KEY).
+При перечитывании эндпоинт с тем же name и base_url сохраняет статистику и
+соединения (меняется только заголовок Authorization), удалённые закрываются
+после OPENAI_TIMEOUT, когда допишут начатые запросы.
+
+Выбор эндпоинта (pick): из тех, у кого есть квота и нет паузы после ошибки, —
+с наименьшей ценой EWMA-задержка × (запросов в полёте + 1) / доля оставшейся квоты.
+Эндпоинт, которым давно не пользовались, снова считается «холодным» и получает
+запросы, — так видно, что он перестал тормозить.
+Лимиты провайдера (x-ratelimit-*, retry-after) — свои у каждого ключа (ProviderLimits).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from typing import Mapping
+
+import httpx
+
+from .config import settings
+from .metrics import registry
+from .llm_cascade import FAST, model_tier
+
+logger = logging.getLogger(__name__)
+
+EWMA_ALPHA = 0.2
+LATENCY_SAMPLES = 200  # окно для p95 (хеджирование)
+RESET_MARGIN = 0.02  # запрос доходит до провайдера чуть позже отправки — окно считаем с запасом
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+llm_rate_limited = registry.counter("llm_rate_limited_total", "Ответы 429 от провайдера LLM", ("endpoint",))
+llm_endpoint_requests = registry.counter("llm_endpoint_requests_total", "Запросы к эндпоинтам LLM", ("endpoint", "outcome"))
+llm_endpoint_latency = registry.gauge("llm_endpoint_latency_seconds", "Задержка эндпоинта LLM: EWMA и p95", ("endpoint", "stat"))
+
+
+def parse_duration(value: str | None) -> float | None:
+    """'7.66s', '2m59.56s', '150ms', '1' (секунды) -> секунды"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parts = _DURATION_RE.findall(value)
+    if not parts:
+        return None
+    return sum(float(n) * _UNITS[unit] for n, unit in parts)
+
+
+class ProviderLimits:
+    """
+    Лимиты одного ключа по заголовкам провайдера.
+
+    - 429 ставит ключ на паузу: до x-ratelimit-reset-requests, если кончились
+      запросы окна (точнее целых секунд retry-after), иначе по retry-after;
+    - x-ratelimit-remaining/-limit/-reset-requests дают число запросов до сброса
+      окна (allowance); остаток из ответов на запросы прошлых окон (epoch) не учитывается;
+    - x-ratelimit-remaining-tokens меньше среднего запроса — пауза до -reset-tokens.
+    """
+
+    def __init__(self):
+        self.paused_until = 0.0
+        self.allowance: int | None = None  # сколько запросов ещё можно до сброса окна
+        self.allowance_reset = 0.0
+        self.limit: int | None = None  # x-ratelimit-limit-requests
+        self.window = 0.0  # длина окна (наибольший увиденный reset-requests)
+        self.epoch = 0
+        self.tokens_per_request: float | None = None  # EWMA usage.total_tokens
+        self.rate_limited = 0
+        self.pauses = 0
+
+    def pause(self, until: float) -> None:
+        if until > self.paused_until:
+            self.paused_until = until
+            self.pauses += 1
+
+    def ready_at(self, now: float) -> float:
+        """Когда ключ примет следующий запрос (now — уже)"""
+        if self.allowance is not None and self.allowance_reset <= now:
+            # окно провайдера сбросилось: снова весь лимит (если известен) до следующего сброса
+            if self.limit and self.window:
+                self.allowance, self.allowance_reset = self.limit, now + self.window
+            else:
+                self.allowance = None
+            self.epoch += 1
+        if self.allowance is not None and self.allowance <= 0:
+            self.pause(self.allowance_reset)
+        return max(self.paused_until, now)
+
+    def headroom(self) -> float:
+        if self.allowance is None or not self.limit:
+            return 1.0
+        return min(max(self.allowance / self.limit, 0.05), 1.0)
+
+    def take(self) -> int:
+        if self.allowance is not None:
+            self.allowance -= 1
+        return self.epoch
+
+    def observe(self, status_code: int, headers: Mapping[str, str], epoch: int | None = None,
+                sent_at: float | None = None) -> None:
+        """
+        Остаток и сброс окна провайдер считает в момент получения запроса,
+        поэтому сброс отсчитывается от sent_at (отправки), а не от ответа.
+        """
+        now = time.monotonic()
+        counted_at = (sent_at or now) + RESET_MARGIN
+        reset_requests = parse_duration(headers.get("x-ratelimit-reset-requests"))
+        remaining = headers.get("x-ratelimit-remaining-requests")
+        remaining = int(remaining) if remaining is not None and remaining.isdigit() else None
+        limit = headers.get("x-ratelimit-limit-requests")
+        if limit is not None and limit.isdigit():
+            self.limit = int(limit)
+        if reset_requests is not None:
+            self.window = max(self.window, reset_requests)
+
+        if status_code == 429:
+            self.rate_limited += 1
+            if remaining == 0 and reset_requests is not None:
+                delay = reset_requests
+                self.allowance, self.allowance_reset = 0, now + delay + RESET_MARGIN
+                self.epoch += 1
+            else:
+                delay = parse_duration(headers.get("retry-after")) or reset_requests or settings.LLM_RATELIMIT_DEFAULT_PAUSE
+            self.pause(now + delay + RESET_MARGIN)
+        elif remaining is not None and (epoch is None or epoch == self.epoch):
+            if self.allowance is None:
+                self.allowance = remaining
+                self.allowance_reset = counted_at + (reset_requests if reset_requests is not None else 1.0)
+            else:
+                # в этом окне ключ могли тратить и другие воркеры
+                self.allowance = min(self.allowance, remaining)
+                if reset_requests is not None:
+                    # окно у провайдера могло начаться позже, чем мы думали
+                    self.allowance_reset = max(self.allowance_reset, counted_at + reset_requests)
+
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        if remaining_tokens is not None and remaining_tokens.isdigit() and self.tokens_per_request:
+            if int(remaining_tokens) < self.tokens_per_request:
+                reset_tokens = parse_duration(headers.get("x-ratelimit-reset-tokens"))
+                self.pause(now + (reset_tokens if reset_tokens is not None else settings.LLM_RATELIMIT_DEFAULT_PAUSE))
+
+    def record_tokens(self, total: int) -> None:
+        if total:
+            self.tokens_per_request = total if self.tokens_per_request is None else (
+                EWMA_ALPHA * total + (1 - EWMA_ALPHA) * self.tokens_per_request
+            )
+
+    def snapshot(self, now: float) -> dict:
+        return {
+            "allowance": self.allowance,
+            "limit": self.limit,
+            "paused_for_ms": round(max(self.paused_until - now, 0.0) * 1000, 1),
+            "rate_limited": self.rate_limited,
+            "pauses": self.pauses,
+        }
+
+
+def build_client(base_url: str, api_key: str) -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=settings.LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.LLM_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(settings.OPENAI_TIMEOUT, connect=settings.LLM_CONNECT_TIMEOUT)
+    headers = {"Content-Type": "application/json"}
+    if api_key:
+        headers["Authorization"] = f"Bearer {api_key}"
+    return httpx.AsyncClient(
+        base_url=base_url,
+        headers=headers,
+        timeout=timeout,
+        limits=limits,
+        http2=settings.LLM_HTTP2,
+    )
+
+
+class Endpoint:
+    def __init__(self, name: str, base_url: str, api_key: str = "", model: str | None = None,
+                 client: httpx.AsyncClient | None = None, fast_model: str | None = None):
+        self.name = name
+        self.base_url = base_url
+        # имена моделей у этого провайдера вместо общих OPENAI_MODEL / LLM_FAST_MODEL
+        self.model = model
+        self.fast_model = fast_model
+        self.client = client or build_client(base_url, api_key)
+        self.limits = ProviderLimits()
+        self.ewma: float | None = None
+        self.samples: deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.inflight = 0
+        self.last_used = 0.0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def observe(self, status_code: int, headers: Mapping[str, str], epoch: int | None = None,
+                sent_at: float | None = None) -> None:
+        self.limits.observe(status_code, headers, epoch, sent_at)
+        if status_code == 429:
+            llm_rate_limited.inc(self.name)
+            pause = self.limits.paused_until - time.monotonic()
+            logger.warning(f"LLM endpoint {self.name} rate limited (429), pausing for {pause:.2f} s")
+
+    def set_api_key(self, api_key: str) -> None:
+        if api_key:
+            self.client.headers["Authorization"] = f"Bearer {api_key}"
+        else:
+            self.client.headers.pop("Authorization", None)
+
+    def record_latency(self, latency: float) -> None:
+        self.ewma = latency if self.ewma is None else EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma
+        self.samples.append(latency)
+
+    def record_error(self) -> None:
+        self.errors += 1
+        self.cooldown_until = time.monotonic() + settings.LLM_ENDPOINT_COOLDOWN_SECONDS
+
+    def quantile(self, q: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def hedge_delay(self) -> float | None:
+        """Через сколько слать дублирующий запрос: p95 этого эндпоинта (None — не хеджировать)"""
+        if not settings.LLM_HEDGE_ENABLED or len(self.samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return self.quantile(settings.LLM_HEDGE_QUANTILE)
+
+    def ready_at(self, now: float) -> float:
+        return max(self.limits.ready_at(now), self.cooldown_until)
+
+    def model_for(self, model: str | None) -> str | None:
+        """Имя модели запроса у этого провайдера"""
+        if model_tier(model) == FAST:
+            return self.fast_model or model
+        return self.model or model
+
+    def snapshot(self, now: float) -> dict:
+        p95 = self.quantile(0.95)
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "fast_model": self.fast_model,
+            "requests": self.requests,
+            "errors": self.errors,
+            "inflight": self.inflight,
+            "ewma_ms": round(self.ewma * 1000, 2) if self.ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+            "cooldown_for_ms": round(max(self.cooldown_until - now, 0.0) * 1000, 1),
+            **self.limits.snapshot(now),
+        }
+
+
+def parse_endpoints(raw: str) -> list[dict]:
+    entries = json.loads(raw)
+    if not isinstance(entries, list) or not all(isinstance(e, dict) and e.get("base_url") for e in entries):
+        raise ValueError("LLM endpoints: expected a JSON list of objects with base_url")
+    return [{**e, "name": e.get("name") or f"llm-{i}"} for i, e in enumerate(entries)]
+
+
+class LLMPool:
+    def __init__(self, endpoints: list[Endpoint] | None = None):
+        # endpoints передаются явно (тесты, бенчмарки) — тогда настройки не читаются
+        self._fixed = endpoints is not None
+        self._endpoints: list[Endpoint] | None = endpoints
+        self._file_mtime: float | None = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    @classmethod
+    def from_urls(cls, urls: list[str], api_key: str = "stub") -> "LLMPool":
+        return cls([Endpoint(f"llm-{i}", url, api_key) for i, url in enumerate(urls)])
+
+    @property
+    def endpoints(self) -> list[Endpoint]:
+        return self.load()
+
+    def load(self) -> list[Endpoint]:
+        """Собирает эндпоинты из настроек, если их ещё нет; ошибка в LLM_ENDPOINTS(_FILE) — исключение"""
+        if self._endpoints is None:
+            self._endpoints = [self._build(e) for e in self._configured()]
+        return self._endpoints
+
+    @staticmethod
+    def _build(entry: dict) -> Endpoint:
+        return Endpoint(entry["name"], entry["base_url"], entry.get("api_key", ""), entry.get("model"),
+                        fast_model=entry.get("fast_model"))
+
+    def _configured(self) -> list[dict]:
+        if settings.LLM_ENDPOINTS_FILE:
+            self._file_mtime = os.stat(settings.LLM_ENDPOINTS_FILE).st_mtime
+            with open(settings.LLM_ENDPOINTS_FILE) as f:
+                return parse_endpoints(f.read())
+        if settings.LLM_ENDPOINTS:
+            return parse_endpoints(settings.LLM_ENDPOINTS)
+        api_key = settings.OPENAI_API_KEY or (settings.GROQ_API_KEY or "")
+        return [{"name": "default", "base_url": settings.OPENAI_BASE_URL, "api_key": api_key}]
+
+    def maybe_reload(self, now: float) -> None:
+        """Перечитывает LLM_ENDPOINTS_FILE, если он изменился (ротация ключей без перезапуска)"""
+        if self._fixed or not settings.LLM_ENDPOINTS_FILE or now - self._checked_at < settings.LLM_ENDPOINTS_RELOAD_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            if os.stat(settings.LLM_ENDPOINTS_FILE).st_mtime == self._file_mtime:
+                return
+            self.reload(self._configured())
+        except (OSError, ValueError) as e:
+            # битый или недописанный файл — работаем со старым списком
+            logger.error(f"LLM endpoints not reloaded: {e}")
+
+    def reload(self, entries: list[dict]) -> None:
+        current = {ep.name: ep for ep in self.endpoints}
+        endpoints = []
+        for entry in entries:
+            ep = current.pop(entry["name"], None)
+            if ep is not None and ep.base_url == entry["base_url"]:
+                ep.set_api_key(entry.get("api_key", ""))
+                ep.model = entry.get("model")
+                ep.fast_model = entry.get("fast_model")
+            else:
+                if ep is not None:
+                    current[ep.name] = ep  # тот же name, другой base_url — старый закрываем
+                ep = self._build(entry)
+            endpoints.append(ep)
+        self._endpoints = endpoints
+        self.reloads += 1
+        for ep in current.values():
+            asyncio.get_running_loop().create_task(self._close_later(ep))
+        logger.info(f"LLM endpoints reloaded: {[ep.name for ep in endpoints]}")
+
+    @staticmethod
+    async def _close_later(ep: Endpoint) -> None:
+        await asyncio.sleep(settings.OPENAI_TIMEOUT)
+        await ep.client.aclose()
+
+    def pick(self, now: float, exclude: Endpoint | None = None) -> Endpoint | None:
+        """Эндпоинт с наименьшей ценой среди готовых принять запрос; None — все заняты квотой/паузой"""
+        self.maybe_reload(now)
+        endpoints = self.endpoints
+        known = [ep.ewma for ep in endpoints if ep.ewma is not None and now - ep.last_used < settings.LLM_ENDPOINT_IDLE_RESET_SECONDS]
+        cold = min(known) if known else 0.0
+        best, best_cost = None, None
+        for ep in endpoints:
+            if ep is exclude or ep.ready_at(now) > now:
+                continue
+            warm = ep.ewma is not None and now - ep.last_used < settings.LLM_ENDPOINT_IDLE_RESET_SECONDS
+            cost = (ep.ewma if warm else cold) * (ep.inflight + 1) / ep.limits.headroom()
+            if best_cost is None or cost < best_cost:
+                best, best_cost = ep, cost
+        return best
+
+    def ready_at(self, now: float) -> float:
+        """Когда освободится хотя бы один эндпоинт"""
+        return min((ep.ready_at(now) for ep in self.endpoints), default=now + settings.LLM_RATELIMIT_DEFAULT_PAUSE)
+
+    def snapshot(self) -> dict:
+        now = time.monotonic()
+        return {"reloads": self.reloads, "endpoints": {ep.name: ep.snapshot(now) for ep in self.endpoints}}
+
+    async def aclose(self) -> None:
+        endpoints = self._endpoints or []
+        if not self._fixed:
+            self._endpoints = None  # следующий вызов соберёт пул заново из настроек
+        for ep in endpoints:
+            await ep.client.aclose()
+
+
+llm_pool = LLMPool()
+
+
+@registry.on_collect
+def _collect_endpoints() -> None:
+    if llm_pool._endpoints is None:
+        return
+    for ep in llm_pool._endpoints:
+        if ep.ewma is not None:
+            llm_endpoint_latency.set(ep.ewma, ep.name, "ewma")
+            llm_endpoint_latency.set(ep.quantile(0.95), ep.name, "p95")
@@ -0,0 +1,222 @@
+"""
+Допуск запросов к LLM: общий лимит одновременных вызовов, справедливая
+очередь по потокам (ребёнок) и лимиты провайдера.
+
+- Не больше LLM_MAX_CONCURRENCY вызовов в полёте; остальные ждут в очереди.
+- Очередь — своя у каждого потока (flow, обычно id пользователя); свободный
+  слот достаётся потокам по кругу, поэтому ребёнок, у которого в очереди
+  один ход, не ждёт за двадцатью ходами соседа.
+- У запроса в очереди есть срок (LLM_QUEUE_TIMEOUT). Если по оценке
+  (длина очереди впереди × среднее время вызова / лимит) он всё равно не
+  успеет, или очередь длиннее LLM_QUEUE_MAX, он сразу получает 503 с Retry-After,
+  а не висит до таймаута клиента.
+- Слот выдаётся вместе с эндпоинтом из пула (app/llm_pool.py): самым быстрым
+  из тех, у кого есть квота. Когда квота кончилась или пауза после 429 у всех
+  ключей, выдача ждёт ближайшего из них.
+Счётчики — snapshot(), GET /health/llm-scheduler и /metrics.
+"""
+
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Mapping
+
+from fastapi import HTTPException, status
+
+from .config import settings
+from .llm_pool import Endpoint, LLMPool, llm_pool
+from .metrics import registry
+
+DEFAULT_FLOW = "default"
+EWMA_ALPHA = 0.2
+
+llm_queue_wait = registry.histogram("llm_queue_wait_seconds", "Ожидание слота планировщика LLM")
+llm_shed = registry.counter("llm_shed_total", "Запросы к LLM, отклонённые планировщиком", ("reason",))
+llm_scheduler_slots = registry.gauge("llm_scheduler_requests", "Запросы к LLM в полёте и в очереди", ("state",))
+
+
+class SchedulerStats:
+    def __init__(self):
+        self.admitted = 0
+        self.queued = 0
+        self.shed_queue_full = 0
+        self.shed_deadline = 0
+        self.shed_timeout = 0
+        self.rate_limited = 0
+        self.paused = 0
+
+    def as_dict(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_deadline": self.shed_deadline,
+            "shed_timeout": self.shed_timeout,
+            "rate_limited": self.rate_limited,
+            "paused": self.paused,
+        }
+
+
+class Slot:
+    def __init__(self, scheduler: "LLMScheduler", endpoint: Endpoint, epoch: int):
+        self._scheduler = scheduler
+        self.endpoint = endpoint
+        self._epoch = epoch
+        self._sent_at = time.monotonic()
+
+    def observe(self, status_code: int, headers: Mapping[str, str]) -> None:
+        """Передаёт эндпоинту статус и заголовки ответа провайдера"""
+        if status_code == 429:
+            self._scheduler.stats.rate_limited += 1
+        self.endpoint.observe(status_code, headers, self._epoch, self._sent_at)
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int | None = None, max_queue: int | None = None, pool: LLMPool | None = None):
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.max_queue = settings.LLM_QUEUE_MAX if max_queue is None else max_queue
+        self.pool = pool or llm_pool
+        self.active = 0
+        self.waiting = 0
+        self.stats = SchedulerStats()
+        self.service_time: float | None = None  # EWMA времени удержания слота
+        self._flows: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+        self._timer: asyncio.TimerHandle | None = None
+
+    # --- очередь ---
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        now = time.monotonic()
+        while self._flows and self.active < self.max_concurrency:
+            endpoint = self.pool.pick(now)
+            if endpoint is None:
+                break
+            flow, queue = next(iter(self._flows.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._flows.move_to_end(flow)  # следующий слот — другому потоку
+            else:
+                del self._flows[flow]
+            if waiter.done():
+                continue  # срок истёк или запрос отменён
+            waiter.set_result(self._grant(endpoint, now))
+        if self._flows and self.active < self.max_concurrency and self._timer is None:
+            # все ключи без квоты или на паузе — ждём ближайший
+            ready = self.pool.ready_at(now)
+            if ready > now:
+                self.stats.paused += 1
+                loop = asyncio.get_running_loop()
+                self._timer = loop.call_at(loop.time() + ready - now, self._on_timer)
+
+    def _grant(self, endpoint: Endpoint, now: float) -> Slot:
+        self.active += 1
+        self.stats.admitted += 1
+        endpoint.inflight += 1
+        endpoint.last_used = now
+        return Slot(self, endpoint, endpoint.limits.take())
+
+    def _expected_wait(self, flow: str, now: float) -> float | None:
+        """Оценка ожидания нового запроса потока flow при раздаче слотов по кругу"""
+        if self.service_time is None:
+            return None
+        rounds = len(self._flows.get(flow, ())) + 1
+        ahead = sum(min(len(q), rounds) for q in self._flows.values())
+        return max(self.pool.ready_at(now) - now, 0.0) + ahead / self.max_concurrency * self.service_time
+
+    def _shed(self, reason: str, retry_after: float) -> HTTPException:
+        setattr(self.stats, f"shed_{reason}", getattr(self.stats, f"shed_{reason}") + 1)
+        llm_shed.inc(reason)
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Слишком много запросов к AI. Попробуйте через несколько секунд.",
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+
+    async def acquire(self, flow: str | None = None, deadline: float | None = None) -> Slot:
+        """Ждёт слот; 503 (HTTPException), если не дождаться до deadline (time.monotonic())"""
+        flow = flow or DEFAULT_FLOW
+        now = time.monotonic()
+        deadline = deadline or now + settings.LLM_QUEUE_TIMEOUT
+        if not self._flows and self.active < self.max_concurrency:
+            endpoint = self.pool.pick(now)
+            if endpoint is not None:
+                llm_queue_wait.observe(0.0)
+                return self._grant(endpoint, now)
+        if self.waiting >= self.max_queue:
+            raise self._shed("queue_full", self._expected_wait(flow, now) or 1.0)
+        expected = self._expected_wait(flow, now)
+        if expected is not None and now + expected > deadline:
+            raise self._shed("deadline", expected)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._flows.setdefault(flow, deque()).append(waiter)
+        self.waiting += 1
+        self.stats.queued += 1
+        self._dispatch()  # слот мог освободиться, а пауза — закончиться; иначе ставит таймер
+        try:
+            slot = await asyncio.wait_for(waiter, max(deadline - now, 0.0))
+        except asyncio.TimeoutError:
+            raise self._shed("timeout", self._expected_wait(flow, time.monotonic()) or 1.0)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release(waiter.result(), None)  # слот выдан, но ждавший уже ушёл
+            raise
+        finally:
+            self.waiting -= 1
+        llm_queue_wait.observe(time.monotonic() - now)
+        return slot
+
+    def try_acquire(self, exclude: Endpoint | None = None) -> Slot | None:
+        """
+        Слот без ожидания на другом эндпоинте (для дублирующего запроса); None —
+        если есть очередь, нет свободного слота или другого готового эндпоинта.
+        """
+        now = time.monotonic()
+        if self._flows or self.active >= self.max_concurrency:
+            return None
+        endpoint = self.pool.pick(now, exclude=exclude)
+        return self._grant(endpoint, now) if endpoint is not None else None
+
+    def release(self, slot: Slot, held: float | None) -> None:
+        self.active -= 1
+        slot.endpoint.inflight -= 1
+        if held is not None:
+            self.service_time = held if self.service_time is None else (
+                EWMA_ALPHA * held + (1 - EWMA_ALPHA) * self.service_time
+            )
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, flow: str | None = None, deadline: float | None = None) -> AsyncIterator[Slot]:
+        slot = await self.acquire(flow, deadline)
+        started = time.monotonic()
+        try:
+            yield slot
+        finally:
+            self.release(slot, time.monotonic() - started)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats.as_dict(),
+            "active": self.active,
+            "waiting": self.waiting,
+            "flows_waiting": len(self._flows),
+            "max_concurrency": self.max_concurrency,
+            "service_time_ms": round(self.service_time * 1000, 2) if self.service_time is not None else None,
+            "pool": self.pool.snapshot(),
+        }
+
+
+llm_scheduler = LLMScheduler()
+
+
+@registry.on_collect
+def _collect_scheduler() -> None:
+    llm_scheduler_slots.set(llm_scheduler.active, "active")
+    llm_scheduler_slots.set(llm_scheduler.waiting, "waiting")
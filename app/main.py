@@ -1,9 +1,14 @@
-import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from .config import settings
-from .db import Base, engine
-from .routers import health, auth, lesson, project
+from .ai import startup_llm_client, shutdown_llm_client
+from .cache import close_redis
+from .http_clients import close_http_clients
+from .archive import start_archiver, stop_archiver
+from .lesson_packs import start_lesson_packs, stop_lesson_packs
+from .google_auth import start_google_keys, stop_google_keys
+from .metrics import MetricsMiddleware, start_metrics, stop_metrics
+from .routers import health, auth, lesson, project, metrics
 
 app = FastAPI(title="AI Tutor MVP", debug=settings.APP_DEBUG)
 
@@ -14,16 +19,40 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# задержка по маршрутам для /metrics
+app.add_middleware(MetricsMiddleware)
 
 @app.on_event("startup")
 async def on_startup():
-    # create tables
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # схема базы — отдельным шагом деплоя (alembic upgrade head), не при старте процесса
+    await startup_llm_client()
+    # партиции messages на ближайшие месяцы и архивирование старых
+    await start_archiver()
+    # заранее сгенерированные первые ходы уроков (и догенерация по LESSON_PACK_TOPICS)
+    await start_lesson_packs()
+    # ключи Google для /auth/google
+    await start_google_keys()
+    # снимки метрик воркера для /metrics (при METRICS_DIR)
+    await start_metrics()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await stop_metrics()
+    await stop_archiver()
+    await stop_lesson_packs()
+    await stop_google_keys()
+    # модуль почты грузит роутер auth; без писем воркеров нет и stop() ничего не ждёт
+    from .email_service import email_service
+    await email_service.stop()
+    await shutdown_llm_client()
+    await close_http_clients()
+    await close_redis()
 
 app.include_router(health.router, prefix="/api/v1")
 app.include_router(auth.router, prefix="/api/v1")
 app.include_router(lesson.router, prefix="/api/v1")
 app.include_router(project.router, prefix="/api/v1")
+# /metrics — вне /api/v1, где его ожидает Prometheus
+app.include_router(metrics.router)
 
 # Run: uvicorn app.main:app --host 0.0.0.0 --port 8000 
\ No newline at end of file
@@ -0,0 +1,282 @@
+"""
+Метрики в формате Prometheus (GET /metrics) без внешних зависимостей.
+
+Горячий путь — только инкременты в словарях процесса: Counter.inc,
+Histogram.observe (поиск корзины bisect'ом), без блокировок и I/O.
+Счётчики, которые модули уже ведут сами (кэш, пул, почта), копируются
+в метрики перед выгрузкой функциями из on_collect.
+
+Несколько воркеров uvicorn: если задан METRICS_DIR, каждый воркер раз в
+METRICS_FLUSH_SECONDS (и при каждом /metrics) атомарно пишет свой снимок
+в METRICS_DIR/metrics-<pid>.json, а /metrics складывает снимки всех воркеров:
+счётчики и гистограммы суммируются (в том числе завершившихся воркеров — счётчики
+не откатываются назад), gauge — только у живых (снимок свежее METRICS_STALE_SECONDS).
+Каталог должен очищаться при старте контейнера (tmpfs или новый контейнер).
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.values: dict[tuple, object] = {}
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def samples(self) -> list:
+        return [[list(k), v] for k, v in self.values.items()]
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels: str) -> None:
+        state = self.values.get(labels)
+        if state is None:
+            # [счётчики по корзинам (последняя — +Inf), сумма]
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: dict[str, Metric] = {}
+        self.collectors: list[Callable[[], None]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def on_collect(self, fn: Callable[[], None]) -> Callable[[], None]:
+        """fn вызывается перед каждым снимком: переносит в метрики счётчики модуля"""
+        self.collectors.append(fn)
+        return fn
+
+    def snapshot(self) -> dict:
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception as e:
+                logger.warning(f"metrics collector {fn.__name__} failed: {e!r}")
+        metrics = {}
+        for m in self.metrics.values():
+            entry = {"type": m.type, "help": m.help, "labels": list(m.labels), "samples": m.samples()}
+            if isinstance(m, Histogram):
+                entry["buckets"] = list(m.buckets)
+            metrics[m.name] = entry
+        return {"pid": os.getpid(), "written_at": time.time(), "metrics": metrics}
+
+
+registry = Registry()
+
+# --- запись снимков и сборка со всех воркеров ---
+
+def _snapshot_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_DIR, f"metrics-{pid}.json")
+
+
+def write_snapshot(snapshot: dict) -> None:
+    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+    path = _snapshot_path(snapshot["pid"])
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def read_snapshots(own: dict) -> list[dict]:
+    snapshots = [own]
+    for path in glob.glob(os.path.join(settings.METRICS_DIR, "metrics-*.json")):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue  # воркер как раз переписывает файл
+        if snapshot.get("pid") != own["pid"]:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def merge(snapshots: list[dict], now: float | None = None) -> dict:
+    """Складывает снимки воркеров; gauge устаревших снимков не учитываются"""
+    now = time.time() if now is None else now
+    merged: dict[str, dict] = {}
+    for snapshot in snapshots:
+        live = now - snapshot["written_at"] <= settings.METRICS_STALE_SECONDS
+        for name, entry in snapshot["metrics"].items():
+            if entry["type"] == "gauge" and not live:
+                continue
+            target = merged.setdefault(name, {**entry, "samples": {}})
+            samples = target["samples"]
+            for labels, value in entry["samples"]:
+                key = tuple(labels)
+                if entry["type"] != "histogram":
+                    samples[key] = samples.get(key, 0) + value
+                elif key not in samples:
+                    samples[key] = [list(value[0]), value[1]]
+                else:
+                    counts, total = samples[key]
+                    samples[key] = [[a + b for a, b in zip(counts, value[0])], total + value[1]]
+    return merged
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable) -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render(merged: dict) -> str:
+    lines = []
+    for name, entry in sorted(merged.items()):
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        names = entry["labels"]
+        for labels, value in sorted(entry["samples"].items()):
+            if entry["type"] != "histogram":
+                lines.append(f"{name}{_format_labels(names, labels)} {_format_value(value)}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for bound, count in zip([*entry["buckets"], None], counts):
+                cumulative += count
+                le = "+Inf" if bound is None else _format_value(bound)
+                lines.append(f"{name}_bucket{_format_labels([*names, 'le'], [*labels, le])} {cumulative}")
+            lines.append(f"{name}_sum{_format_labels(names, labels)} {_format_value(total)}")
+            lines.append(f"{name}_count{_format_labels(names, labels)} {cumulative}")
+    return "\n".join(lines) + "\n"
+
+
+async def exposition() -> str:
+    """Текст для /metrics: этот процесс или, при METRICS_DIR, все воркеры хоста"""
+    snapshot = registry.snapshot()
+    if not settings.METRICS_DIR:
+        return render(merge([snapshot]))
+
+    def collect() -> str:
+        write_snapshot(snapshot)
+        return render(merge(read_snapshots(snapshot)))
+
+    return await asyncio.to_thread(collect)
+
+# --- периодическая запись снимка воркера ---
+
+_flush_task: asyncio.Task | None = None
+
+
+async def _flush_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+        try:
+            await asyncio.to_thread(write_snapshot, registry.snapshot())
+        except Exception as e:
+            logger.warning(f"metrics snapshot not written: {e!r}")
+
+
+async def start_metrics() -> None:
+    global _flush_task
+    if settings.METRICS_ENABLED and settings.METRICS_DIR and _flush_task is None:
+        _flush_task = asyncio.create_task(_flush_loop())
+
+
+async def stop_metrics() -> None:
+    global _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        _flush_task = None
+        # последний снимок: счётчики воркера останутся в сумме после его остановки
+        try:
+            await asyncio.to_thread(write_snapshot, registry.snapshot())
+        except Exception as e:
+            logger.warning(f"metrics snapshot not written: {e!r}")
+
+# --- задержка запросов по маршрутам ---
+
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Время обработки запроса до последнего байта ответа",
+    ("method", "route", "status"),
+)
+
+
+class MetricsMiddleware:
+    """
+    ASGI-middleware: гистограмма по шаблону маршрута (/lesson/sessions/{session_id}),
+    а не по фактическому пути — число рядов не растёт с числом сессий.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.METRICS_ENABLED:
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            http_request_duration.observe(
+                time.perf_counter() - started,
+                scope["method"], getattr(route, "path", "unmatched"), str(status),
+            )
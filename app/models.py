@@ -1,5 +1,6 @@
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy import String, Text, ForeignKey, Integer, DateTime, JSON, Boolean
+from sqlalchemy import String, Text, ForeignKey, Integer, DateTime, Boolean, Index, UniqueConstraint
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 from .db import Base
 
@@ -13,7 +14,7 @@ class User(Base):
     uid: Mapped[str | None] = mapped_column(String(128), unique=True, index=True)  # Firebase UID или custom (для совместимости)
     display_name: Mapped[str | None] = mapped_column(String(128))  # Отображаемое имя (для совместимости)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
-    sessions = relationship("ChatSession", back_populates="user")
+    sessions = relationship("ChatSession", back_populates="user", lazy="raise")  # только постранично: GET /lesson/sessions
     
 
 class VerificationToken(Base):
@@ -27,28 +28,63 @@ class VerificationToken(Base):
 
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
+    __table_args__ = (
+        Index("ix_chat_sessions_user_id_created_at", "user_id", "created_at"),  # сессии ребёнка по времени
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"))
     topic: Mapped[str | None] = mapped_column(String(128))
+    summary: Mapped[str | None] = mapped_column(Text)  # Скользящий конспект старых реплик
+    summary_upto_id: Mapped[int | None] = mapped_column(Integer)  # Последнее сообщение, вошедшее в конспект
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
     user = relationship("User", back_populates="sessions")
-    messages = relationship("Message", back_populates="session")
+    messages = relationship("Message", back_populates="session", lazy="raise")  # только постранично: GET /lesson/sessions/{id}/messages
 
 class Message(Base):
+    # Партиционирована по месяцам created_at (см. app/archive.py): первичный ключ включает ключ партиции
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_session_id_created_at", "session_id", "created_at"),  # история сессии
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     session_id: Mapped[int] = mapped_column(ForeignKey("chat_sessions.id", ondelete="CASCADE"))
     role: Mapped[str] = mapped_column(String(32))  # user/ayya/ayana/system
     content: Mapped[str] = mapped_column(Text)
-    meta: Mapped[dict | None] = mapped_column(JSON)
-    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+    meta: Mapped[dict | None] = mapped_column(JSONB)
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, default=datetime.utcnow)
     session = relationship("ChatSession", back_populates="messages")
 
+class MessageArchive(Base):
+    """Месячная партиция messages, выгруженная в файл и удалённая из базы"""
+    __tablename__ = "message_archives"
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    partition: Mapped[str] = mapped_column(String(64), unique=True)  # messages_p202601
+    range_from: Mapped[datetime] = mapped_column(DateTime)
+    range_to: Mapped[datetime] = mapped_column(DateTime, index=True)
+    path: Mapped[str] = mapped_column(String(512))  # .jsonl.gz рядом с .index.json
+    rows: Mapped[int] = mapped_column(Integer)
+    archived_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
+class LessonPack(Base):
+    """Первые ходы урока по теме, сгенерированные заранее (см. app/lesson_packs.py)"""
+    __tablename__ = "lesson_packs"
+    __table_args__ = (UniqueConstraint("topic", "version", name="lesson_packs_topic_version_key"),)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    topic: Mapped[str] = mapped_column(String(128))
+    version: Mapped[int] = mapped_column(Integer)
+    prompt_hash: Mapped[str] = mapped_column(String(32), index=True)  # пакеты с другим хэшем промптов не отдаются
+    turns: Mapped[list] = mapped_column(JSONB)  # [{"user": реплика ребёнка, "reply": ответ оркестратора}, ...]
+    created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow)
+
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        Index("ix_projects_data_gin", "data", postgresql_using="gin", postgresql_ops={"data": "jsonb_path_ops"}),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    session_id: Mapped[int] = mapped_column(ForeignKey("chat_sessions.id", ondelete="CASCADE"))
+    session_id: Mapped[int] = mapped_column(ForeignKey("chat_sessions.id", ondelete="CASCADE"), index=True)
     title: Mapped[str] = mapped_column(String(128))
-    plan: Mapped[dict] = mapped_column(JSON)  # steps, data schema, etc.
-    data: Mapped[dict | None] = mapped_column(JSON)
+    plan: Mapped[dict] = mapped_column(JSONB)  # steps, data schema, etc.
+    data: Mapped[dict | None] = mapped_column(JSONB)
     created_at: Mapped[datetime] = mapped_column(default=datetime.utcnow) 
\ No newline at end of file
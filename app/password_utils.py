@@ -1,5 +1,22 @@
+import asyncio
+import time
 import bcrypt
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
+from fastapi import HTTPException, status
+from .config import settings
+from .metrics import registry
+
+# bcrypt отпускает GIL, поэтому хватает пула потоков; размер пула ограничивает
+# долю CPU, которую логины могут отнять у ходов урока
+_executor = ThreadPoolExecutor(max_workers=settings.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_pending = 0
+
+bcrypt_duration = registry.histogram(
+    "bcrypt_duration_seconds", "Хеширование/проверка пароля вместе с ожиданием в пуле bcrypt", ("op",),
+)
+bcrypt_rejected = registry.counter("bcrypt_rejected_total", "Отказы 429: очередь пула bcrypt заполнена")
+bcrypt_pending = registry.gauge("bcrypt_pending_jobs", "Задач в пуле bcrypt (выполняются и ждут)")
 
 def hash_password(password: str) -> str:
     """
@@ -12,7 +29,7 @@ def hash_password(password: str) -> str:
         Хешированный пароль
     """
     # Генерируем соль и хешируем пароль
-    salt = bcrypt.gensalt()
+    salt = bcrypt.gensalt(rounds=settings.BCRYPT_ROUNDS)
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed.decode('utf-8')
 
@@ -29,6 +46,46 @@ def verify_password(password: str, hashed_password: str) -> bool:
     """
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
 
+async def _run_bounded(fn, *args):
+    """
+    Выполняет fn в пуле bcrypt. Если в очереди уже BCRYPT_MAX_PENDING задач,
+    сразу отвечает 429, а не копит ожидание.
+    """
+    global _pending
+    if _pending >= settings.BCRYPT_MAX_PENDING:
+        bcrypt_rejected.inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Слишком много запросов. Попробуйте позже.",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    started = time.perf_counter()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+        bcrypt_duration.observe(time.perf_counter() - started, fn.__name__)
+
+async def hash_password_async(password: str) -> str:
+    """
+    hash_password вне event loop (в пуле bcrypt)
+    """
+    return await _run_bounded(hash_password, password)
+
+async def verify_password_async(password: str, hashed_password: str) -> bool:
+    """
+    verify_password вне event loop (в пуле bcrypt)
+    """
+    return await _run_bounded(verify_password, password, hashed_password)
+
+def pending_hash_jobs() -> int:
+    return _pending
+
+@registry.on_collect
+def _collect_bcrypt() -> None:
+    bcrypt_pending.set(_pending)
+
 def validate_password_strength(password: str) -> Tuple[bool, str]:
     """
     Проверяет сложность пароля
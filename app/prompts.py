@@ -26,4 +26,9 @@ CORRECTION_INSTRUCTIONS = (
 PROJECT_GUIDE = (
     "Веди к мини-проекту: план (3 шага), сбор данных (наблюдения/счёт), оформление (простая презентация), "
     "что можно показать родителям. Давай маленькие задания и подтверждай успехи."
-) 
\ No newline at end of file
+) 
+SUMMARY_INSTRUCTIONS = (
+    "Ты ведёшь краткий конспект урока для дошкольника. Тебе дают прежний конспект и новые реплики. "
+    "Обнови конспект: тема, что ребёнок уже понял, где ошибался, на каком шаге мини-проекта остановились. "
+    "Пиши коротко, не больше {max_tokens} токенов. Формат ответа — JSON: {{summary: 'конспект'}}."
+)
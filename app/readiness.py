@@ -0,0 +1,119 @@
+"""
+Готовность инстанса принимать трафик (GET /health/ready).
+
+Зависимости (Postgres, Redis и, если включено, LLM) проверяются параллельно,
+каждая со своим коротким таймаутом: медленная зависимость не растягивает
+проверку дольше HEALTH_PROBE_TIMEOUT_SECONDS. Результат кэшируется на
+HEALTH_READY_CACHE_SECONDS, одновременные пробы балансировщика ждут одну проверку.
+Пул Postgres, в котором нет свободных соединений, проба не дождётся — инстанс
+считается неготовым, пока пул не освободится.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+Probe = Callable[[], Awaitable[dict | None]]
+
+
+async def probe_db() -> dict:
+    from .db import engine, pool_stats
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    return {"pool": pool_stats()}
+
+
+async def probe_redis() -> None:
+    from .cache import redis_client
+    await redis_client.ping()
+
+
+async def probe_llm() -> dict:
+    from .llm_pool import llm_pool
+
+    async def probe(endpoint) -> int | str:
+        try:
+            return (await endpoint.client.get("/models")).status_code
+        except Exception as e:
+            return f"{type(e).__name__}: {e}"
+
+    # любой ответ, кроме 5xx, значит, что эндпоинт жив (401/404 — тоже); готовы — если жив хоть один
+    endpoints = llm_pool.endpoints
+    statuses = await asyncio.gather(*(probe(ep) for ep in endpoints))
+    result = {ep.name: status for ep, status in zip(endpoints, statuses)}
+    if not any(isinstance(status, int) and status < 500 for status in statuses):
+        raise RuntimeError(f"no live LLM endpoint: {result}")
+    return {"endpoints": result}
+
+
+def default_probes() -> dict[str, Probe]:
+    probes: dict[str, Probe] = {"db": probe_db, "redis": probe_redis}
+    if settings.HEALTH_READY_CHECK_LLM:
+        probes["llm"] = probe_llm
+    return probes
+
+
+class Readiness:
+    def __init__(self, probes: dict[str, Probe] | None = None,
+                 timeout: float | None = None, cache_seconds: float | None = None):
+        self._probes = probes
+        self.timeout = settings.HEALTH_PROBE_TIMEOUT_SECONDS if timeout is None else timeout
+        self.cache_seconds = settings.HEALTH_READY_CACHE_SECONDS if cache_seconds is None else cache_seconds
+        self.checks = 0
+        self._result: dict | None = None
+        self._checked_at = 0.0
+        self._inflight: asyncio.Task | None = None
+
+    @property
+    def probes(self) -> dict[str, Probe]:
+        return self._probes if self._probes is not None else default_probes()
+
+    async def _run(self, name: str, probe: Probe) -> dict:
+        started = time.perf_counter()
+        try:
+            details = await asyncio.wait_for(probe(), self.timeout)
+            result = {"ok": True, **(details or {})}
+        except asyncio.TimeoutError:
+            result = {"ok": False, "error": f"timeout after {self.timeout:.2f} s"}
+        except Exception as e:
+            result = {"ok": False, "error": repr(e)}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        if not result["ok"]:
+            logger.warning(f"readiness probe {name} failed: {result['error']}")
+        return result
+
+    async def _check(self) -> dict:
+        probes = self.probes
+        results = await asyncio.gather(*(self._run(name, probe) for name, probe in probes.items()))
+        self.checks += 1
+        self._result = {
+            "ready": all(r["ok"] for r in results),
+            "checks": dict(zip(probes, results)),
+        }
+        self._checked_at = time.monotonic()
+        return self._result
+
+    async def check(self) -> dict:
+        """Последний результат, если он свежее cache_seconds, иначе новая проверка"""
+        age = time.monotonic() - self._checked_at
+        if self._result is not None and age < self.cache_seconds:
+            return {**self._result, "cached": True, "age_ms": round(age * 1000, 2)}
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._check())
+        # shield: проба, которую балансировщик бросил по таймауту, не отменяет проверку для остальных
+        result = await asyncio.shield(self._inflight)
+        return {**result, "cached": False, "age_ms": 0.0}
+
+    def clear(self) -> None:
+        self._result = None
+        self._checked_at = 0.0
+
+
+readiness = Readiness()
@@ -9,16 +9,14 @@ from ..schemas import (
     AuthResponse, TokenResponse, UserProfileResponse, PasswordChangeRequest
 )
 from ..email_service import email_service
-from ..password_utils import hash_password, verify_password, validate_password_strength
+from ..password_utils import hash_password_async, verify_password_async, validate_password_strength
 from ..cache import token_cache
 from ..config import settings
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
-import jwt
+from ..google_auth import verify_google_id_token
+from ..http_clients import http_clients
 from datetime import datetime, timedelta
 import logging
-import httpx
-from ..deps import create_access_token
+from ..deps import create_access_token, access_token_for, get_current_user, CurrentUser
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -70,7 +68,7 @@ async def register_user(
             )
         
         # Хешируем пароль
-        password_hash = hash_password(registration_data.password)
+        password_hash = await hash_password_async(registration_data.password)
         
         # Создаем пользователя
         new_user = User(
@@ -88,13 +86,13 @@ async def register_user(
         verification_token = email_service.generate_token()
         
         # Сохраняем токен в кэш
-        token_cache.store_verification_token(
+        await token_cache.store_verification_token(
             registration_data.email,
             verification_token,
             settings.VERIFICATION_TOKEN_EXPIRE_SECONDS
         )
         
-        # Отправляем email с токеном
+        # Ставим письмо с токеном в очередь отправки
         email_sent = email_service.send_verification_email(
             registration_data.email,
             verification_token
@@ -136,7 +134,7 @@ async def verify_email(
     """
     try:
         # Получаем токен из кэша
-        cached_token = token_cache.get_verification_token(verification_data.email)
+        cached_token = await token_cache.get_verification_token(verification_data.email)
         
         if not cached_token:
             raise HTTPException(
@@ -175,17 +173,10 @@ async def verify_email(
         await db.refresh(user)
         
         # Удаляем токен из кэша
-        token_cache.delete_verification_token(verification_data.email)
+        await token_cache.delete_verification_token(verification_data.email)
         
         # Создаем JWT токен
-        token_payload = {
-            "user_id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "exp": datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
-        }
-        
-        access_token = jwt.encode(token_payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+        access_token = access_token_for(user)
         
         return AuthResponse(
             access_token=access_token,
@@ -229,7 +220,7 @@ async def login_user(
             )
         
         # Проверяем пароль
-        if not verify_password(login_data.password, user.password_hash):
+        if not await verify_password_async(login_data.password, user.password_hash):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Неверный ник или пароль"
@@ -243,14 +234,7 @@ async def login_user(
             )
         
         # Создаем JWT токен
-        token_payload = {
-            "user_id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "exp": datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
-        }
-        
-        access_token = jwt.encode(token_payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+        access_token = access_token_for(user)
         
         return AuthResponse(
             access_token=access_token,
@@ -303,13 +287,13 @@ async def resend_verification_token(
         verification_token = email_service.generate_token()
         
         # Сохраняем токен в кэш
-        token_cache.store_verification_token(
+        await token_cache.store_verification_token(
             email,
             verification_token,
             settings.VERIFICATION_TOKEN_EXPIRE_SECONDS
         )
         
-        # Отправляем email
+        # Ставим письмо в очередь отправки
         email_sent = email_service.send_verification_email(email, verification_token)
         
         if not email_sent:
@@ -359,13 +343,13 @@ async def forgot_password(email: str, db: AsyncSession = Depends(get_db)):
         reset_token = email_service.generate_token()
         
         # Сохраняем токен в кэш
-        token_cache.store_password_reset_token(
+        await token_cache.store_password_reset_token(
             email,
             reset_token,
             settings.VERIFICATION_TOKEN_EXPIRE_SECONDS
         )
         
-        # Отправляем email
+        # Ставим письмо в очередь отправки
         email_sent = email_service.send_password_reset_email(email, reset_token)
         
         if not email_sent:
@@ -417,7 +401,7 @@ async def reset_password(
             )
         
         # Получаем токен из кэша
-        cached_token = token_cache.get_password_reset_token(email)
+        cached_token = await token_cache.get_password_reset_token(email)
         
         if not cached_token:
             raise HTTPException(
@@ -445,11 +429,11 @@ async def reset_password(
             )
         
         # Обновляем пароль
-        user.password_hash = hash_password(new_password)
+        user.password_hash = await hash_password_async(new_password)
         await db.commit()
         
         # Удаляем токен из кэша
-        token_cache.delete_password_reset_token(email)
+        await token_cache.delete_password_reset_token(email)
         
         return {"message": "Пароль успешно изменен"}
         
@@ -465,16 +449,13 @@ async def reset_password(
 @router.post("/change-password")
 async def change_password(
     password_data: PasswordChangeRequest,
-    current_user: dict = Depends(lambda x: x),  # Будет заменено на реальную аутентификацию
+    current_user: CurrentUser = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Изменение пароля авторизованным пользователем.
     """
     try:
-        # TODO: Добавить реальную аутентификацию
-        # Пока что это заглушка
-        
         # Проверяем, что новые пароли совпадают
         if password_data.new_password != password_data.new_password_confirm:
             raise HTTPException(
@@ -490,19 +471,23 @@ async def change_password(
                 detail=message
             )
         
-        # TODO: Получить реального пользователя из токена
-        # user = await get_current_user(current_user, db)
+        user = await db.get(User, current_user.id)
+        if user is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Пользователь не найден"
+            )
         
-        # TODO: Проверить текущий пароль
-        # if not verify_password(password_data.current_password, user.password_hash):
-        #     raise HTTPException(
-        #         status_code=status.HTTP_400_BAD_REQUEST,
-        #         detail="Неверный текущий пароль"
-        #     )
+        # Проверяем текущий пароль
+        if not await verify_password_async(password_data.current_password, user.password_hash):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Неверный текущий пароль"
+            )
         
-        # TODO: Обновить пароль
-        # user.password_hash = hash_password(password_data.new_password)
-        # await db.commit()
+        # Обновляем пароль
+        user.password_hash = await hash_password_async(password_data.new_password)
+        await db.commit()
         
         return {"message": "Пароль успешно изменен"}
         
@@ -532,15 +517,8 @@ async def login_with_google(
         )
 
     try:
-        idinfo = id_token.verify_oauth2_token(
-            id_token_str,
-            google_requests.Request(),
-            settings.GOOGLE_CLIENT_ID,
-        )
-        
-        if idinfo.get("iss") not in {"accounts.google.com", "https://accounts.google.com"}:
-            raise ValueError("Неверный издатель токена")
-            
+        # подпись проверяется локально по закэшированным ключам Google
+        idinfo = await verify_google_id_token(id_token_str)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -568,20 +546,14 @@ async def login_with_google(
             username=name or email,
             email=email,
             display_name=name or email,
+            password_hash="google_oauth",
             is_verified=True
         )
         db.add(user)
         await db.commit()
         await db.refresh(user)
 
-    token_payload = {
-        "uid": uid,
-        "user_id": user.id,
-        "email": email,
-        "exp": datetime.utcnow() + timedelta(hours=settings.JWT_EXPIRE_HOURS)
-    }
-    
-    app_token = jwt.encode(token_payload, settings.JWT_SECRET, algorithm=settings.JWT_ALG)
+    app_token = access_token_for(user)
 
     return {
         "access_token": app_token,
@@ -622,31 +594,33 @@ async def google_callback(code: str, session: AsyncSession = Depends(get_session
         logger.info(f"Google callback received code: {code}")  # ✅ логируем код из query
         logger.info(f"Google redirect_uri (callback stage): {settings.GOOGLE_REDIRECT_URI}")  # ✅ логируем редирект
         # 1. Получаем access_token от Google
-        async with httpx.AsyncClient() as client:
-            token_resp = await client.post(
-                "https://oauth2.googleapis.com/token",
-                data={
-                    "client_id": settings.GOOGLE_CLIENT_ID,
-                    "client_secret": settings.GOOGLE_CLIENT_SECRET,
-                    "code": code,
-                    "grant_type": "authorization_code",
-                    "redirect_uri": settings.GOOGLE_REDIRECT_URI,  # ✅ должен совпадать 1в1
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            token_data = token_resp.json()
-            access_token = token_data.get("access_token")
-            if not access_token:
-                logger.error(f"Google Token Error: {token_data}")
-                raise HTTPException(status_code=400, detail="Не удалось получить токен Google")
+        # (общие клиенты: соединения с Google переиспользуются между входами;
+        # код одноразовый, поэтому POST повторяется только если не ушёл)
+        token_resp = await http_clients.request(
+            "POST",
+            settings.GOOGLE_TOKEN_URL,
+            data={
+                "client_id": settings.GOOGLE_CLIENT_ID,
+                "client_secret": settings.GOOGLE_CLIENT_SECRET,
+                "code": code,
+                "grant_type": "authorization_code",
+                "redirect_uri": settings.GOOGLE_REDIRECT_URI,  # ✅ должен совпадать 1в1
+            },
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        token_data = token_resp.json()
+        access_token = token_data.get("access_token")
+        if not access_token:
+            logger.error(f"Google Token Error: {token_data}")
+            raise HTTPException(status_code=400, detail="Не удалось получить токен Google")
 
         # 2. Получаем профиль пользователя
-        async with httpx.AsyncClient() as client:
-            userinfo_resp = await client.get(
-                "https://www.googleapis.com/oauth2/v3/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"},
-            )
-            userinfo = userinfo_resp.json()
+        userinfo_resp = await http_clients.request(
+            "GET",
+            settings.GOOGLE_USERINFO_URL,
+            headers={"Authorization": f"Bearer {access_token}"},
+        )
+        userinfo = userinfo_resp.json()
 
         email = userinfo.get("email")
         username = userinfo.get("name") or email.split("@")[0]
@@ -672,13 +646,10 @@ async def google_callback(code: str, session: AsyncSession = Depends(get_session
 
         # 5. Генерация JWT
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_jwt = create_access_token(
-            data={"sub": user.email}, 
-            expires_delta=access_token_expires
-        )
+        access_jwt = access_token_for(user, expires_delta=access_token_expires)
         refresh_token_expires = timedelta(days=7)
         refresh_jwt = create_access_token(
-            data={"sub": user.email, "type": "refresh"},
+            data={"user_id": user.id, "type": "refresh"},
             expires_delta=refresh_token_expires
         )
 
@@ -695,6 +666,8 @@ async def google_callback(code: str, session: AsyncSession = Depends(get_session
             token_type="bearer"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка Google OAuth: {e}")
         raise HTTPException(
@@ -1,7 +1,61 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from ..cache import completion_cache_stats
+from ..ai import singleflight_stats
+from ..db import pool_stats
+from ..http_clients import http_clients
+from ..readiness import readiness
+from ..llm_scheduler import llm_scheduler
+from ..lesson_packs import lesson_packs
+from ..llm_cascade import cascade_stats
+from ..config import settings
 
 router = APIRouter(prefix="/health", tags=["health"])
 
 @router.get("/")
 async def health():
-    return {"ok": True} 
\ No newline at end of file
+    return {"ok": True}
+
+@router.get("/live")
+async def live():
+    """Процесс жив и event loop отвечает; без обращений к базе, Redis и сети"""
+    return {"ok": True}
+
+@router.get("/ready")
+async def ready():
+    """Готовность к трафику: Postgres, Redis (и LLM, если включено) с задержкой каждой проверки; 503 — не готов"""
+    result = await readiness.check()
+    return JSONResponse(result, status_code=200 if result["ready"] else 503)
+
+@router.get("/cache")
+async def cache_stats():
+    """Попадания/промахи/вытеснения кэша ответов LLM по уровням (пакеты уроков, LRU, Redis, семантический) и single-flight"""
+    stats = {
+        **await completion_cache_stats(),
+        "singleflight": singleflight_stats.as_dict(),
+        "lesson_packs": lesson_packs.snapshot(),
+    }
+    if settings.SEMANTIC_CACHE_ENABLED:
+        from ..semantic_cache import semantic_cache
+        stats["semantic"] = semantic_cache.snapshot()
+    return stats
+
+@router.get("/db-pool")
+async def db_pool_stats():
+    """Состояние пула соединений Postgres: занято, overflow, время ожидания"""
+    return pool_stats()
+
+@router.get("/http-clients")
+async def http_client_stats():
+    """Исходящие запросы по хостам: сколько соединений открыто заново, сколько переиспользовано, повторы"""
+    return http_clients.stats()
+
+@router.get("/llm-scheduler")
+async def llm_scheduler_stats():
+    """Планировщик LLM: в полёте, в очереди, отказы по причинам, пауза по лимитам провайдера"""
+    return llm_scheduler.snapshot()
+
+@router.get("/llm-cascade")
+async def llm_cascade_stats():
+    """Каскад моделей: ходы по уровням и причинам, эскалации на основную модель, токены и стоимость"""
+    return cascade_stats.as_dict()
@@ -1,60 +1,258 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from ..db import get_db
-from ..models import User, ChatSession, Message
-from ..schemas import TurnRequest, TurnReply, CreateSessionRequest, CreateSessionReply
-from ..ai import orchestrate_turn
+from sqlalchemy import select, insert, literal, values, column, true, tuple_, Integer, String, Text, DateTime
+from datetime import datetime
+import orjson
+import logging
+from ..db import get_db, SessionLocal
+from ..deps import get_current_user, CurrentUser
+from ..models import ChatSession, Message
+from ..schemas import TurnRequest, TurnReply, TurnResponse, CreateSessionRequest, CreateSessionReply, SessionPage, MessagePage
+from ..pagination import encode_cursor, decode_cursor
+from ..archive import load_archived_messages
+from ..ai import orchestrate_turn, orchestrate_turn_stream, fit_context, summarize_dialog
+from ..json_stream import TurnStreamParser
+from ..history import load_history, append_history, history_entry, to_llm_messages, load_summary, save_summary
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/lesson", tags=["lesson"])
 
 @router.post("/create-session", response_model=CreateSessionReply)
-async def create_session(body: CreateSessionRequest, db: AsyncSession = Depends(get_db)):
-    q = await db.execute(select(User).where(User.uid == body.user_uid))
-    user = q.scalar_one_or_none()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
+async def create_session(
+    body: CreateSessionRequest,
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
     session = ChatSession(user_id=user.id, topic=body.topic)
     db.add(session)
     await db.commit()
-    await db.refresh(session)
     return CreateSessionReply(session_id=session.id)
 
-@router.post("/turn", response_model=TurnReply)
-async def turn(body: TurnRequest, db: AsyncSession = Depends(get_db)):
-    # ensure user
-    q = await db.execute(select(User).where(User.uid == body.user_uid))
-    user = q.scalar_one_or_none()
-    if user is None:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    # ensure/create session
-    if body.session_id is None:
-        cs = ChatSession(user_id=user.id, topic=body.topic)
-        db.add(cs)
-        await db.commit()
-        await db.refresh(cs)
-        session_id = cs.id
-    else:
-        session_id = body.session_id
-
-    # persist incoming messages
-    dialog = []
-    for m in body.messages:
-        db.add(Message(session_id=session_id, role=m.role, content=m.content))
-        dialog.append({"role": m.role, "content": m.content})
-    await db.commit()
+def _insert_incoming(session_ids, messages: list, now: datetime):
+    """
+    Один INSERT ... SELECT для всех новых сообщений хода.
 
-    # orchestrate LLM
-    reply = await orchestrate_turn(dialog)
+    session_ids — CTE с id и темой сессии (новая сессия или проверка владельца);
+    если CTE пустой, ничего не вставится и вызывающий вернёт 404.
+    Вставленные строки возвращаются вместе с темой сессии — тем же запросом.
+    """
+    incoming = values(
+        column("ord", Integer), column("role", String), column("content", Text), name="incoming"
+    ).data([(i, m.role, m.content) for i, m in enumerate(messages)])
+    inserted = (
+        insert(Message)
+        .from_select(
+            ["session_id", "role", "content", "created_at"],
+            select(session_ids.c.id, incoming.c.role, incoming.c.content, literal(now, DateTime))
+            .select_from(session_ids.join(incoming, true()))
+            .order_by(incoming.c.ord),
+        )
+        .returning(Message.id, Message.session_id, Message.role, Message.content)
+        .cte("inserted")
+    )
+    return (
+        select(inserted.c.id, inserted.c.session_id, inserted.c.role, inserted.c.content, session_ids.c.topic)
+        .select_from(inserted.join(session_ids, inserted.c.session_id == session_ids.c.id))
+    )
 
-    # store reply
-    db.add(Message(session_id=session_id, role=reply.get("role", "system"), content=reply.get("say", ""), meta={"animations": reply.get("animations"), "next_task": reply.get("next_task")}))
-    await db.commit()
+async def _prepare_turn(body: TurnRequest, user: CurrentUser) -> tuple[int, str | None, list[dict], str | None, tuple[str, int] | None]:
+    """
+    Пишет входящие сообщения хода и собирает контекст для LLM.
+
+    Всё, что касается базы, — одна короткая транзакция: создание сессии
+    (INSERT ... RETURNING) и сообщения ребёнка уходят одним запросом.
+    Соединение возвращается в пул до вызова LLM. Возвращает id и тему сессии
+    (из базы: на следующих ходах клиент присылает только session_id), диалог,
+    конспект и (конспект, upto_id), если его нужно сохранить вместе с ответом.
+    """
+    messages = body.new_messages()
+    now = datetime.utcnow()
+    async with SessionLocal.begin() as db:
+        if body.session_id is None:
+            session_ids = (
+                insert(ChatSession)
+                .values(user_id=user.id, topic=body.topic, created_at=now)
+                .returning(ChatSession.id, ChatSession.topic)
+                .cte("new_session")
+            )
+            summary, summary_upto_id, history = None, None, []
+        else:
+            # сессия должна принадлежать этому ребёнку
+            session_ids = (
+                select(ChatSession.id, ChatSession.topic)
+                .where(ChatSession.id == body.session_id, ChatSession.user_id == user.id)
+                .cte("owned_session")
+            )
+            summary, summary_upto_id = await load_summary(db, body.session_id)
+            history = await load_history(db, body.session_id, after_id=summary_upto_id)
+
+        if messages:
+            rows = sorted((await db.execute(_insert_incoming(session_ids, messages, now))).all(), key=lambda r: r.id)
+            session = rows[0] if rows else None
+        else:
+            rows = []
+            session = (await db.execute(select(session_ids.c.id.label("session_id"), session_ids.c.topic))).one_or_none()
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session_id, topic = session.session_id, session.topic
+    new_entries = [history_entry(m) for m in rows]
+    await append_history(session_id, new_entries)
+
+    # keep the prompt within the token budget: fold older turns into the summary
+    # (конспект пишется в базу вместе с ответом, в последней транзакции хода)
+    folded, kept = fit_context(history + new_entries, summary)
+    pending_summary = None
+    if folded:
+        summary = await summarize_dialog(summary, folded, flow=str(user.id))
+        pending_summary = (summary, folded[-1]["id"])
+    return session_id, topic, to_llm_messages(kept), summary, pending_summary
 
+def _to_turn_reply(reply: dict) -> TurnReply:
     return TurnReply(**{
         "role": reply.get("role", "system"),
         "say": reply.get("say", ""),
-        "animations": reply.get("animations", []),
+        "animations": reply.get("animations") or [],
         "next_task": reply.get("next_task"),
-    }) 
\ No newline at end of file
+    })
+
+async def _store_reply(session_id: int, reply: TurnReply, pending_summary: tuple[str, int] | None = None) -> None:
+    """Ответ (и новый конспект, если он есть) — одной транзакцией"""
+    msg = Message(session_id=session_id, role=reply.role, content=reply.say, meta={"animations": reply.animations, "next_task": reply.next_task})
+    async with SessionLocal.begin() as db:
+        db.add(msg)
+        if pending_summary is not None:
+            await save_summary(db, session_id, *pending_summary)
+    await append_history(session_id, [history_entry(msg)])
+
+@router.post("/turn", response_model=TurnResponse)
+async def turn(body: TurnRequest, user: CurrentUser = Depends(get_current_user)):
+    session_id, topic, dialog, summary, pending_summary = await _prepare_turn(body, user)
+
+    # orchestrate LLM (соединение с базой в это время не занято)
+    # в планировщике LLM очередь у каждого ребёнка своя
+    reply = _to_turn_reply(await orchestrate_turn(dialog, summary, flow=str(user.id), topic=topic))
+
+    # store reply
+    await _store_reply(session_id, reply, pending_summary)
+    return TurnResponse(**reply.model_dump(), session_id=session_id)
+
+def _sse(event: str, data: dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data) + b"\n\n"
+
+@router.post("/turn/stream")
+async def turn_stream(body: TurnRequest, user: CurrentUser = Depends(get_current_user)):
+    """
+    Потоковый вариант /turn (Server-Sent Events).
+
+    События:
+      session — {"session_id": ...} сразу после сохранения входящих сообщений
+      meta    — {"role": ...}, {"animations": [...]}, {"next_task": ...} как только поле известно
+      say     — {"text": "кусок реплики"} по мере генерации
+      done    — итоговый TurnReply (после сохранения в базу)
+      error   — {"detail": ...} если LLM не ответил; при перегрузке ещё "retry_after" (секунды)
+    """
+    session_id, topic, dialog, summary, pending_summary = await _prepare_turn(body, user)
+
+    async def events():
+        yield _sse("session", {"session_id": session_id})
+        parser = TurnStreamParser()
+        raw: list[str] = []
+        try:
+            async for chunk in orchestrate_turn_stream(dialog, summary, flow=str(user.id), topic=topic):
+                raw.append(chunk)
+                for ev in parser.feed(chunk):
+                    if ev[0] == "say":
+                        yield _sse("say", {"text": ev[1]})
+                    else:
+                        yield _sse("meta", {ev[1]: ev[2]})
+            reply = parser.fields if parser.done else orjson.loads("".join(raw))
+            # роль вне схемы или не JSON-объект — такая же ошибка LLM, как обрыв ответа
+            final = _to_turn_reply(reply)
+        except HTTPException as e:
+            # планировщик LLM отклонил ход (перегрузка) — клиент может повторить через Retry-After
+            error = {"detail": e.detail}
+            retry = (e.headers or {}).get("Retry-After")
+            if retry is not None:
+                error["retry_after"] = int(retry)
+            yield _sse("error", error)
+            return
+        except Exception as e:
+            logger.error(f"Lesson stream failed: {e}")
+            yield _sse("error", {"detail": "LLM request failed"})
+            return
+
+        await _store_reply(session_id, final, pending_summary)
+        yield _sse("done", final.model_dump())
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/sessions", response_model=SessionPage)
+async def list_sessions(
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Прошлые уроки ребёнка, новые сверху.
+
+    Keyset-пагинация по (created_at, id) и индексу (user_id, created_at):
+    любая страница стоит столько же, сколько первая.
+    """
+    q = select(ChatSession.id, ChatSession.topic, ChatSession.created_at).where(ChatSession.user_id == user.id)
+    if cursor:
+        created_at, session_id = decode_cursor(cursor)
+        q = q.where(tuple_(ChatSession.created_at, ChatSession.id) < tuple_(created_at, session_id))
+    q = q.order_by(ChatSession.created_at.desc(), ChatSession.id.desc()).limit(limit + 1)
+    rows = (await db.execute(q)).all()
+    items = [r._asdict() for r in rows[:limit]]
+    next_cursor = encode_cursor(rows[limit - 1].created_at, rows[limit - 1].id) if len(rows) > limit else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
+
+@router.get("/sessions/{session_id}/messages", response_model=MessagePage)
+async def list_session_messages(
+    session_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    user: CurrentUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Сообщения урока по порядку (старые сверху), страницами по курсору (created_at, id).
+
+    Месяцы, ушедшие в архив, дочитываются из него: они всегда старше живых
+    партиций, поэтому идут в начале ленты.
+    """
+    owned = await db.execute(
+        select(ChatSession.id).where(ChatSession.id == session_id, ChatSession.user_id == user.id)
+    )
+    if owned.scalar_one_or_none() is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    after = decode_cursor(cursor) if cursor else None
+
+    rows: list[dict] = []
+    for m in await load_archived_messages(db, session_id, since=after[0] if after else None):
+        key = (datetime.fromisoformat(m["created_at"]), m["id"])
+        if after is None or key > after:
+            rows.append({"id": m["id"], "role": m["role"], "content": m["content"], "meta": m["meta"], "created_at": key[0]})
+            if len(rows) > limit:
+                break
+
+    if len(rows) <= limit:
+        q = select(Message.id, Message.role, Message.content, Message.meta, Message.created_at).where(Message.session_id == session_id)
+        if rows:
+            last = rows[-1]
+            q = q.where(tuple_(Message.created_at, Message.id) > tuple_(last["created_at"], last["id"]))
+        elif after:
+            q = q.where(tuple_(Message.created_at, Message.id) > tuple_(*after))
+        q = q.order_by(Message.created_at, Message.id).limit(limit + 1 - len(rows))
+        rows += [r._asdict() for r in (await db.execute(q)).all()]
+
+    items = rows[:limit]
+    next_cursor = encode_cursor(items[-1]["created_at"], items[-1]["id"]) if len(rows) > limit else None
+    return ORJSONResponse({"items": items, "next_cursor": next_cursor})
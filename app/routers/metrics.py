@@ -0,0 +1,10 @@
+from fastapi import APIRouter
+from fastapi.responses import Response
+from ..metrics import exposition, CONTENT_TYPE
+
+router = APIRouter(tags=["metrics"])
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Метрики в текстовом формате Prometheus (при METRICS_DIR — сумма по воркерам хоста)"""
+    return Response(await exposition(), media_type=CONTENT_TYPE)
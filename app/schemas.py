@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field, EmailStr
 from typing import List, Optional, Literal, Any
+from datetime import datetime
 
 Role = Literal["user", "ayya", "ayana", "system"]
 
@@ -8,24 +9,56 @@ class MessageIn(BaseModel):
     content: str
 
 class TurnRequest(BaseModel):
+    # Пользователь берётся из токена (Authorization: Bearer ...)
     session_id: Optional[int] = None
-    user_uid: str
     topic: Optional[str] = None
+    # История хранится на сервере: клиент присылает только новую реплику ребёнка
+    text: Optional[str] = Field(None, description="Новая реплика ребёнка")
+    # Только новые сообщения этого хода (для клиентов, которым нужно несколько сразу)
     messages: List[MessageIn] = Field(default_factory=list)
 
+    def new_messages(self) -> List[MessageIn]:
+        if self.text is not None:
+            return [MessageIn(role="user", content=self.text)]
+        return self.messages
+
 class TurnReply(BaseModel):
     role: Literal["ayya", "ayana", "system"]
     say: str
     animations: List[str] = Field(default_factory=list)
     next_task: Optional[str] = None
 
+class TurnResponse(TurnReply):
+    # сессия хода (новая, если session_id не передан): её id передают в следующих ходах
+    session_id: int
+
 class CreateSessionRequest(BaseModel):
-    user_uid: str
     topic: Optional[str] = None
 
 class CreateSessionReply(BaseModel):
     session_id: int
 
+# История уроков: страницы по курсору (created_at, id)
+class SessionItem(BaseModel):
+    id: int
+    topic: Optional[str] = None
+    created_at: datetime
+
+class SessionPage(BaseModel):
+    items: List[SessionItem]
+    next_cursor: Optional[str] = Field(None, description="Передайте в cursor, чтобы получить следующую страницу")
+
+class MessageItem(BaseModel):
+    id: int
+    role: Role
+    content: str
+    meta: Optional[dict] = None
+    created_at: datetime
+
+class MessagePage(BaseModel):
+    items: List[MessageItem]
+    next_cursor: Optional[str] = Field(None, description="Передайте в cursor, чтобы получить следующую страницу")
+
 class ProjectCreateRequest(BaseModel):
     session_id: int
     title: str
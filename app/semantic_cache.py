@@ -0,0 +1,308 @@
+"""
+Семантический кэш ответов урока: перефразированный вопрос ребёнка
+(«почему небо голубое?» / «а почему небо такое голубое») получает уже
+сгенерированный ответ без вызова LLM.
+
+- Ключ — эмбеддинг реплики ребёнка, пространство имён — тема урока (topic):
+  ответ из одной темы не попадает в другую.
+- Эмбеддинг считается локально на CPU. По умолчанию — хэши слов и символьных
+  триграмм (без модели и скачиваний; «голубое»/«голубой» и опечатки делят
+  большую часть триграмм). Если задан SEMANTIC_CACHE_MODEL и установлен
+  sentence-transformers — эта модель (в потоке, чтобы не держать event loop).
+- Индекс — матрица NumPy нормированных векторов, сходство — косинус.
+  Полный перебор; при SEMANTIC_CACHE_IVF_LISTS > 0 векторы делятся k-means
+  на списки (обучение в потоке, когда записей достаточно), и поиск идёт
+  только в SEMANTIC_CACHE_IVF_PROBE ближайших списках.
+- Больше SEMANTIC_CACHE_MAX_ENTRIES в пространстве имён — вытесняется давно
+  не использованный ответ; ответы старше SEMANTIC_CACHE_TTL_SECONDS не отдаются.
+Индекс живёт в памяти воркера; модуль (и numpy) импортируется, только если кэш включён.
+"""
+
+import asyncio
+import logging
+import re
+import time
+import zlib
+
+import numpy as np
+
+from .cache import CacheStats
+from .config import settings
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"\w+")
+# слова-связки почти не меняют вопрос («а почему…», «скажи, пожалуйста, что такое…»)
+FILLER_WORDS = frozenset("а и ну вот же ли ведь скажи расскажи пожалуйста слушай такое такой такая такие это мне вообще".split())
+FILLER_WEIGHT = 0.2
+# числа и отрицания сравниваются только целиком и с большим весом: «2+2» и «2+3», «голубое» и «не голубое» — разные вопросы
+EXACT_WORDS = frozenset("не ни нет без".split())
+EXACT_WEIGHT = 6.0
+IVF_TRAIN_FACTOR = 16  # обучать IVF, когда записей хотя бы столько на список
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE_PER_LIST = 64
+INITIAL_ROWS = 1024
+
+semantic_requests = registry.counter("semantic_cache_requests_total", "Поиск в семантическом кэше ответов", ("result",))
+semantic_lookup = registry.histogram("semantic_cache_lookup_seconds", "Поиск ближайшего ответа в семантическом кэше")
+semantic_entries = registry.gauge("semantic_cache_entries", "Ответов в семантическом кэше")
+
+
+def normalize(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower().replace("ё", "е")))
+
+
+class HashingEmbedder:
+    """
+    Символьные триграммы слов -> знаковые хэши в dim измерений, вектор единичной длины.
+    Триграммы, а не слова целиком: «кошки»/«кошка» и опечатки остаются близки.
+    """
+
+    blocking = False
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, text: str) -> np.ndarray:
+        indices, weights = [], []
+        for word in normalize(text).split():
+            if word.isdigit() or word in EXACT_WORDS:
+                features = [("w:" + word, EXACT_WEIGHT)]
+            else:
+                padded = f"<{word}>"
+                # у каждого слова одинаковый вклад, как бы длинно оно ни было
+                weight = (FILLER_WEIGHT if word in FILLER_WORDS else 1.0) / (len(padded) - 2) ** 0.5
+                features = [(padded[i:i + 3], weight) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                h = zlib.crc32(feature.encode())
+                indices.append(h % self.dim)
+                weights.append(weight if h & 0x80000000 else -weight)
+        vector = np.zeros(self.dim, dtype=np.float32)
+        np.add.at(vector, indices, weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceTransformerEmbedder:
+    blocking = True  # ~10 мс на CPU — считается в потоке
+
+    def __init__(self, name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+def build_embedder():
+    if settings.SEMANTIC_CACHE_MODEL:
+        try:
+            return SentenceTransformerEmbedder(settings.SEMANTIC_CACHE_MODEL)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed, semantic cache uses hashing embeddings")
+    return HashingEmbedder(settings.SEMANTIC_CACHE_DIM)
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """Сферический k-means по выборке; возвращает центроиды и список каждого вектора"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), k * KMEANS_SAMPLE_PER_LIST), replace=False)]
+    centroids = sample[rng.choice(len(sample), k, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # пустой список оставляет прежний центроид
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    assign = np.concatenate([
+        np.argmax(vectors[i:i + 8192] @ centroids.T, axis=1) for i in range(0, len(vectors), 8192)
+    ])
+    return centroids.astype(np.float32), assign.astype(np.int32)
+
+
+class VectorIndex:
+    """Ответы одного пространства имён: векторы, значения, время создания и последнего попадания"""
+
+    def __init__(self, dim: int, capacity: int, ivf_lists: int = 0, ivf_probe: int = 8):
+        self.dim = dim
+        self.capacity = capacity
+        self.ivf_lists = ivf_lists
+        self.ivf_probe = ivf_probe
+        self.size = 0
+        rows = min(capacity, INITIAL_ROWS)
+        self.vectors = np.zeros((rows, dim), dtype=np.float32)
+        self.created_at = np.zeros(rows)
+        self.used_at = np.zeros(rows)
+        self.values: list = []
+        self.evictions = 0
+        self.centroids: np.ndarray | None = None
+        self._row_list = np.zeros(rows, dtype=np.int32)
+        self._lists: list[list[int]] = []
+        self._list_rows: dict[int, np.ndarray] = {}  # списки в виде массивов, пока не изменились
+        self._training = False
+        self._changed: set[int] = set()  # строки, изменённые во время обучения
+
+    def _grow(self) -> None:
+        rows = min(self.capacity, len(self.vectors) * 2)
+        for name in ("vectors", "created_at", "used_at", "_row_list"):
+            old = getattr(self, name)
+            new = np.zeros((rows, *old.shape[1:]), dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def search(self, vector: np.ndarray) -> tuple[int, float] | None:
+        """Строка с наибольшим косинусом и сам косинус"""
+        if not self.size:
+            return None
+        if self.centroids is None:
+            scores = self.vectors[:self.size] @ vector
+            row = int(np.argmax(scores))
+            return row, float(scores[row])
+        nearest = self.centroids @ vector
+        probe = np.argpartition(-nearest, self.ivf_probe)[:self.ivf_probe] if self.ivf_probe < len(nearest) else range(len(nearest))
+        rows = np.concatenate([self._rows(int(i)) for i in probe])
+        if not rows.size:
+            return None
+        scores = self.vectors[rows] @ vector
+        best = int(np.argmax(scores))
+        return int(rows[best]), float(scores[best])
+
+    def _rows(self, lst: int) -> np.ndarray:
+        rows = self._list_rows.get(lst)
+        if rows is None:
+            rows = self._list_rows[lst] = np.array(self._lists[lst], dtype=np.int64)
+        return rows
+
+    def _assign(self, row: int) -> None:
+        lst = int(np.argmax(self.centroids @ self.vectors[row]))
+        self._row_list[row] = lst
+        self._lists[lst].append(row)
+        self._list_rows.pop(lst, None)
+
+    def add(self, vector: np.ndarray, value, now: float) -> int:
+        if self.size < self.capacity:
+            if self.size == len(self.vectors):
+                self._grow()
+            row = self.size
+            self.size += 1
+            self.values.append(value)
+        else:
+            row = int(np.argmin(self.used_at[:self.size]))  # давно не использованный
+            self.values[row] = value
+            self.evictions += 1
+            if self.centroids is not None:
+                lst = int(self._row_list[row])
+                self._lists[lst].remove(row)
+                self._list_rows.pop(lst, None)
+        self.vectors[row] = vector
+        self.created_at[row] = self.used_at[row] = now
+        if self.centroids is not None:
+            self._assign(row)
+        if self._training:
+            self._changed.add(row)
+        return row
+
+    def needs_training(self) -> bool:
+        return bool(self.ivf_lists) and self.centroids is None and not self._training \
+            and self.size >= self.ivf_lists * IVF_TRAIN_FACTOR
+
+    async def train(self) -> None:
+        """k-means по копии векторов в потоке; пока идёт обучение, поиск — полным перебором"""
+        self._training = True
+        self._changed = set()
+        trained = self.size
+        try:
+            centroids, assign = await asyncio.to_thread(kmeans, self.vectors[:trained].copy(), self.ivf_lists)
+        except Exception as e:
+            logger.error(f"Semantic cache IVF training failed: {e}")
+            return
+        finally:
+            self._training = False
+        self._row_list[:trained] = assign
+        self._lists = [[] for _ in range(self.ivf_lists)]
+        for row, lst in enumerate(assign.tolist()):
+            self._lists[lst].append(row)
+        self._list_rows = {}
+        self.centroids = centroids
+        for row in sorted(self._changed | set(range(trained, self.size))):
+            if row < trained:
+                self._lists[int(self._row_list[row])].remove(row)
+            self._assign(row)
+        self._changed = set()
+
+
+class SemanticCache:
+    def __init__(self, embedder=None, max_entries: int | None = None, ivf_lists: int | None = None):
+        self._embedder = embedder
+        self.max_entries = max_entries or settings.SEMANTIC_CACHE_MAX_ENTRIES
+        self.ivf_lists = settings.SEMANTIC_CACHE_IVF_LISTS if ivf_lists is None else ivf_lists
+        self.namespaces: dict[str, VectorIndex] = {}
+        self.stats = CacheStats()
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = build_embedder()
+        return self._embedder
+
+    async def embed(self, text: str) -> np.ndarray:
+        if self.embedder.blocking:
+            return await asyncio.to_thread(self.embedder.embed, text)
+        return self.embedder.embed(text)
+
+    def _index(self, topic: str | None) -> VectorIndex:
+        namespace = normalize(topic or "")
+        index = self.namespaces.get(namespace)
+        if index is None:
+            index = self.namespaces[namespace] = VectorIndex(
+                self.embedder.dim, self.max_entries, self.ivf_lists, settings.SEMANTIC_CACHE_IVF_PROBE,
+            )
+        return index
+
+    def lookup(self, topic: str | None, vector: np.ndarray) -> dict | None:
+        """Сохранённый ответ на похожий вопрос темы (косинус >= SEMANTIC_CACHE_THRESHOLD)"""
+        started = time.perf_counter()
+        index = self.namespaces.get(normalize(topic or ""))
+        found = index.search(vector) if index is not None else None
+        semantic_lookup.observe(time.perf_counter() - started)
+        now = time.monotonic()
+        if found is None or found[1] < settings.SEMANTIC_CACHE_THRESHOLD:
+            self.stats.misses += 1
+            return None
+        row = found[0]
+        if now - index.created_at[row] > settings.SEMANTIC_CACHE_TTL_SECONDS:
+            self.stats.expired += 1
+            self.stats.misses += 1
+            return None
+        index.used_at[row] = now
+        self.stats.hits += 1
+        return index.values[row]
+
+    def store(self, topic: str | None, vector: np.ndarray, reply: dict) -> None:
+        index = self._index(topic)
+        evictions = index.evictions
+        index.add(vector, reply, time.monotonic())
+        self.stats.evictions += index.evictions - evictions
+        if index.needs_training():
+            asyncio.get_running_loop().create_task(index.train())
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats.as_dict(),
+            "namespaces": len(self.namespaces),
+            "entries": sum(index.size for index in self.namespaces.values()),
+            "ivf_trained": sum(index.centroids is not None for index in self.namespaces.values()),
+        }
+
+
+semantic_cache = SemanticCache()
+
+
+@registry.on_collect
+def _collect_semantic_cache() -> None:
+    semantic_requests.set(semantic_cache.stats.hits, "hit")
+    semantic_requests.set(semantic_cache.stats.misses, "miss")
+    semantic_entries.set(sum(index.size for index in semantic_cache.namespaces.values()))
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Холодный старт API-процесса.
+
+1. Импорт app.main под `python -X importtime` в новом процессе: общее время и
+   самые дорогие пакеты (по собственному времени модулей, сгруппированному по пакету).
+   Заодно проверяет, что ленивые подсистемы (Google OAuth, почта) при импорте не грузятся.
+2. Время от запуска `uvicorn app.main:app` до первого ответа 200 на /api/v1/health/.
+Каждый замер — отдельный процесс; печатается медиана по --runs.
+Postgres и Redis для старта не нужны (фоновые задачи стартуют с задержкой или в фоне).
+Запуск: python -m benchmarks.bench_cold_start --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from .common import free_port
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ["google.auth", "rsa", "smtplib", "email.mime", "requests"]
+
+
+def import_time() -> tuple[float, dict[str, float], list[str]]:
+    check = "import sys, app.main; print(','.join(m for m in %r if m in sys.modules))" % LAZY_MODULES
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", check],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total = 0.0
+    by_package: dict[str, float] = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        by_package[name.split(".")[0]] += int(self_us) / 1000
+        if name == "app.main":
+            total = int(cumulative_us) / 1000
+    loaded = [m for m in proc.stdout.strip().split(",") if m]
+    return total, by_package, loaded
+
+
+def time_to_healthy(timeout: float = 30.0) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(timeout=1.0) as client:
+            while time.perf_counter() - started < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/api/v1/health/").status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.005)
+        raise RuntimeError("server did not become healthy")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(runs: int, top: int) -> None:
+    import_time()  # прогрев: .pyc и файловый кэш ОС
+    totals, packages, loaded = [], defaultdict(list), []
+    for _ in range(runs):
+        total, by_package, loaded = import_time()
+        totals.append(total)
+        for name, ms in by_package.items():
+            packages[name].append(ms)
+    print(f"import app.main (python -X importtime): median={statistics.median(totals):.0f} ms over {runs} runs")
+    ranked = sorted(packages.items(), key=lambda kv: -statistics.median(kv[1]))[:top]
+    for name, values in ranked:
+        print(f"  {name:<24} {statistics.median(values):7.1f} ms")
+    print(f"lazy subsystems loaded at import: {', '.join(loaded) or 'none'}")
+
+    healthy = [time_to_healthy() for _ in range(runs)]
+    print(f"uvicorn start -> first 200 /api/v1/health/: median={statistics.median(healthy) * 1000:.0f} ms "
+          f"(min {min(healthy) * 1000:.0f}, max {max(healthy) * 1000:.0f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12, help="сколько самых дорогих пакетов показать")
+    args = parser.parse_args()
+    main(args.runs, args.top)
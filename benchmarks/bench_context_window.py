@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк бюджета контекста: размер промпта (токены) и латентность хода
+для сессий из 10/50/200 ходов — без ограничения и со сворачиванием в конспект.
+LLM — локальная заглушка, время ответа которой растёт с размером промпта.
+Запуск: python -m benchmarks.bench_context_window --budget 4000
+"""
+
+import argparse
+import asyncio
+import time
+
+from app import ai, cache
+from app.config import settings
+from app.history import to_llm_messages
+from .common import serve, percentile
+from .fake_redis import FakeRedis
+from .stub_llm import create_app, DEFAULT_REPLY
+
+CHILD_LINES = [
+    "А почему небо голубое?",
+    "Я думаю, что два плюс два это пять",
+    "Можно я посчитаю яблоки сама?",
+    "А что будет, если сложить три и четыре?",
+]
+
+
+async def run_session(turns: int, bounded: bool) -> tuple[list[int], list[float]]:
+    entries: list[dict] = []
+    summary: str | None = None
+    next_id = 1
+    prompt_tokens: list[int] = []
+    latencies: list[float] = []
+    for i in range(turns):
+        # уникальный текст, чтобы не попадать в кэш completion
+        entries.append({"id": next_id, "role": "user", "content": f"{CHILD_LINES[i % len(CHILD_LINES)]} (ход {i}, {time.time_ns()})"})
+        next_id += 1
+        started = time.perf_counter()
+        if bounded:
+            folded, kept = ai.fit_context(entries, summary)
+            if folded:
+                summary = await ai.summarize_dialog(summary, folded)
+                entries = kept
+        messages = ai.build_orchestrator_messages(to_llm_messages(entries), summary)
+        reply = await ai.chat_completion(messages)
+        latencies.append(time.perf_counter() - started)
+        prompt_tokens.append(ai.count_message_tokens(messages))
+        entries.append({"id": next_id, "role": reply["role"], "content": reply["say"]})
+        next_id += 1
+    return prompt_tokens, latencies
+
+
+async def main(budget: int, prompt_token_latency: float) -> None:
+    settings.LLM_CONTEXT_TOKEN_BUDGET = budget
+    reply = {**DEFAULT_REPLY, "summary": "Ребёнок считает яблоки, путает 2+2 и 5, дошли до шага 1 мини-проекта."}
+    with FakeRedis() as fake:
+        fake.attach()
+        async with serve(create_app(latency=0.005, reply=reply, prompt_token_latency=prompt_token_latency)) as base_url:
+            settings.OPENAI_BASE_URL = base_url
+            print(f"budget={budget} tokens, tokenizer={'tiktoken' if ai._get_encoding() else 'approx'}")
+            for turns in (10, 50, 200):
+                for bounded in (False, True):
+                    tokens, latencies = await run_session(turns, bounded)
+                    mode = "budgeted" if bounded else "unbounded"
+                    print(
+                        f"{turns:>4} turns {mode:<10} last prompt={tokens[-1]:6d} tok  "
+                        f"max={max(tokens):6d} tok  "
+                        f"turn p50={percentile(latencies, 50) * 1000:7.2f} ms  "
+                        f"p99={percentile(latencies, 99) * 1000:7.2f} ms"
+                    )
+            await ai.shutdown_llm_client()
+        await cache.close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget", type=int, default=settings.LLM_CONTEXT_TOKEN_BUDGET)
+    parser.add_argument("--prompt-token-latency", type=float, default=0.00002, help="сек на токен промпта у заглушки")
+    args = parser.parse_args()
+    asyncio.run(main(args.budget, args.prompt_token_latency))
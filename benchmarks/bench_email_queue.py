@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Проверка и бенчмарк очереди писем против локального SMTP-приёмника.
+
+Показывает, что enqueue не ждёт SMTP (микросекунды против времени доставки),
+что все письма доходят и что соединения переиспользуются
+(открыто не больше EMAIL_WORKERS соединений).
+Запуск: python -m benchmarks.bench_email_queue --emails 100 --smtp-delay 0.02
+"""
+
+import argparse
+import asyncio
+import time
+
+from app.config import settings
+from .common import report
+from .smtp_sink import SMTPSink
+
+
+async def main(emails: int, smtp_delay: float) -> None:
+    async with SMTPSink(delay=smtp_delay) as sink:
+        settings.SMTP_HOST = "127.0.0.1"
+        settings.SMTP_PORT = sink.port
+        settings.SMTP_TLS = False
+        settings.SMTP_PASSWORD = ""
+        settings.GOOGLE_REFRESH_TOKEN = None
+        settings.SMTP_USER = "ayana@example.com"
+
+        from app.email_service import EmailService
+        service = EmailService()
+        await service.start()
+
+        enqueue_latencies: list[float] = []
+        started = time.perf_counter()
+        for i in range(emails):
+            t0 = time.perf_counter()
+            assert service.send_verification_email(f"kid{i}@example.com", "1234567")
+            enqueue_latencies.append(time.perf_counter() - t0)
+        await service.join()
+        delivered_in = time.perf_counter() - started
+        await service.stop()
+
+        report("enqueue (handler latency)", enqueue_latencies)
+        print(f"delivered {len(sink.messages)}/{emails} in {delivered_in:.2f} s, "
+              f"smtp connections={sink.connections} (workers={settings.EMAIL_WORKERS}), failed={service.failed}")
+        assert len(sink.messages) == emails, "не все письма доставлены"
+        assert sink.connections <= settings.EMAIL_WORKERS, "соединения не переиспользуются"
+        assert {m["rcpt"][0] for m in sink.messages} == {f"kid{i}@example.com" for i in range(emails)}
+        print("OK")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--smtp-delay", type=float, default=0.02, help="задержка приёмника на письмо, сек")
+    args = parser.parse_args()
+    asyncio.run(main(args.emails, args.smtp_delay))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Исходящие запросы GET /auth/google-callback: новые соединения на каждый вход
+против общих клиентов app/http_clients.py.
+
+Обмен кода (/token) и профиль (/userinfo) отдают две локальные заглушки Google
+на разных портах — как oauth2.googleapis.com и www.googleapis.com.
+  1. «было»: два httpx.AsyncClient на вход (как раньше в google_callback) — только HTTP-часть;
+  2. «стало»: те же два запроса через http_clients — только HTTP-часть;
+  3. весь callback через приложение (Postgres — локальный, DB_*) и счётчики реестра.
+Новый httpx.AsyncClient каждый раз собирает SSL-контекст (читает сертификаты) — это
+видно и на localhost; у Google к новому соединению добавляются ещё TCP+TLS рукопожатия.
+Запуск: python -m benchmarks.bench_google_callback --logins 200
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from app.config import settings
+from app.db import engine
+from app.http_clients import HTTPClients, close_http_clients, http_clients
+from app.main import app
+from .common import serve, migrate, report
+from .stub_google import GoogleStub
+
+
+async def fresh_clients(token_url: str, userinfo_url: str, code: str) -> int:
+    opened = 0
+
+    async def trace(event: str, info: dict) -> None:
+        nonlocal opened
+        if event == "connection.connect_tcp.started":
+            opened += 1
+
+    async with httpx.AsyncClient() as client:
+        token = (await client.post(token_url, data={"grant_type": "authorization_code", "code": code}, extensions={"trace": trace})).json()
+    async with httpx.AsyncClient() as client:
+        await client.get(userinfo_url, headers={"Authorization": f"Bearer {token['access_token']}"}, extensions={"trace": trace})
+    return opened
+
+
+async def shared_clients(clients: HTTPClients, token_url: str, userinfo_url: str, code: str) -> None:
+    token = (await clients.request("POST", token_url, data={"grant_type": "authorization_code", "code": code})).json()
+    await clients.request("GET", userinfo_url, headers={"Authorization": f"Bearer {token['access_token']}"})
+
+
+async def timed(fn, logins: int) -> list[float]:
+    latencies = []
+    for i in range(logins):
+        started = time.perf_counter()
+        await fn(i)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def main(logins: int) -> None:
+    await migrate()
+    stub = GoogleStub(bits=1024)
+    run_id = uuid.uuid4().hex[:8]
+    async with serve(stub.create_app()) as token_host, serve(stub.create_app()) as userinfo_host:
+        settings.GOOGLE_TOKEN_URL = token_host + "/token"
+        settings.GOOGLE_USERINFO_URL = userinfo_host + "/userinfo"
+        print(f"logins={logins}")
+
+        opened = []
+
+        async def before(i):
+            opened.append(await fresh_clients(settings.GOOGLE_TOKEN_URL, settings.GOOGLE_USERINFO_URL, f"b-{run_id}-{i}"))
+        report("HTTP part, new clients", await timed(before, logins))
+        print(f"{'':<32} connections opened per login={sum(opened) / logins:.2f}")
+
+        clients = HTTPClients()
+        latencies = await timed(lambda i: shared_clients(clients, settings.GOOGLE_TOKEN_URL, settings.GOOGLE_USERINFO_URL, f"s-{run_id}-{i}"), logins)
+        report("HTTP part, shared clients", latencies)
+        total = sum(s["connections_opened"] for s in clients.stats().values())
+        print(f"{'':<32} connections opened per login={total / logins:.2f}")
+        await clients.aclose()
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+            async def callback(i):
+                resp = await client.get("/api/v1/auth/google-callback", params={"code": f"c-{run_id}-{i}"})
+                assert resp.status_code == 200, resp.text[:200]
+            report("/auth/google-callback", await timed(callback, logins))
+        for origin, stats in http_clients.stats().items():
+            print(f"  {origin}: {stats}")
+        await close_http_clients()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins))
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Задержка POST /auth/google с холодным и тёплым кэшем ключей Google.
+
+Ключи (JWKS) отдаёт локальная заглушка с задержкой --jwks-latency (как поход
+к googleapis.com). «Холодный» вход — кэш ключей сброшен перед каждым запросом,
+«тёплый» — ключи уже в памяти. Параллельно меряется, насколько запаздывает
+event loop (сон по 1 мс): проверка токена не должна его блокировать.
+Postgres — локальный (DB_*); запросы — in-process через ASGITransport.
+Запуск: python -m benchmarks.bench_google_login --logins 200 --concurrency 20 --jwks-latency 0.1
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+
+from app.config import settings
+from app.db import engine
+from app.google_auth import google_keys
+from app.http_clients import close_http_clients
+from app.main import app
+from .common import serve, migrate, report
+from .stub_google import GoogleStub
+
+CLIENT_ID = "ayana-bench.apps.googleusercontent.com"
+
+
+async def loop_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append(time.perf_counter() - started - 0.001)
+
+
+async def run_logins(client: httpx.AsyncClient, tokens: list[str], concurrency: int, cold: bool) -> tuple[list[float], list[float]]:
+    latencies: list[float] = []
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(loop_lag(stop, lags))
+    queue = list(tokens)
+
+    async def worker():
+        while queue:
+            token = queue.pop()
+            if cold:
+                google_keys.clear()
+            started = time.perf_counter()
+            resp = await client.post("/api/v1/auth/google", params={"id_token_str": token})
+            latencies.append(time.perf_counter() - started)
+            assert resp.status_code == 200, resp.text[:200]
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    stop.set()
+    await probe
+    return latencies, lags
+
+
+async def main(logins: int, concurrency: int, jwks_latency: float) -> None:
+    await migrate()
+    settings.GOOGLE_CLIENT_ID = CLIENT_ID
+    stub = GoogleStub(latency=jwks_latency)
+    run_id = uuid.uuid4().hex[:8]
+    # подпись RS256 на стороне «Google» — заранее, чтобы не мерить её
+    tokens = [stub.id_token(f"bench-{run_id}-{i}", CLIENT_ID) for i in range(logins)]
+
+    async with serve(stub.create_app()) as stub_url:
+        settings.GOOGLE_JWKS_URL = stub_url + "/certs"
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+            # первый проход создаёт пользователей: дальше в обоих режимах одинаковая работа с базой
+            await run_logins(client, tokens, concurrency, cold=False)
+            print(f"logins={logins} concurrency={concurrency} jwks_latency={jwks_latency * 1000:.0f} ms")
+            for name, cold in (("cold keys (fetch per login)", True), ("warm keys (cached)", False)):
+                stub.requests = 0
+                latencies, lags = await run_logins(client, tokens, concurrency, cold)
+                report(f"/auth/google {name}", latencies)
+                print(f"{'':<32} JWKS fetches={stub.requests}  loop lag max={max(lags) * 1000:.2f} ms")
+        await google_keys.stop()
+        await close_http_clients()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--jwks-latency", type=float, default=0.1, help="задержка ответа заглушки JWKS, сек")
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency, args.jwks_latency))
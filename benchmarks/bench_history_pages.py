@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Постраничное чтение истории: keyset-курсор против OFFSET на миллионе сообщений.
+
+Создаёт отдельную базу <DB_NAME>_history_bench на локальном Postgres (DB_*),
+накатывает миграции и засевает урок из --messages сообщений и --sessions уроков
+одного ребёнка. Затем меряет GET /lesson/sessions/{id}/messages и GET /lesson/sessions
+на разной глубине страниц (курсор берётся прямо из базы) и для сравнения —
+тот же запрос с OFFSET.
+Запуск: python -m benchmarks.bench_history_pages --messages 1000000 --sessions 5000
+"""
+
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+from .common import migrate, percentile
+
+UID = "bench-history-kid"
+
+
+async def recreate_database() -> None:
+    from sqlalchemy import text
+    from sqlalchemy.engine import make_url
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.db import DATABASE_URL
+    name = make_url(DATABASE_URL).database
+    admin = create_async_engine(make_url(DATABASE_URL).set(database="postgres"), isolation_level="AUTOCOMMIT")
+    async with admin.connect() as conn:
+        await conn.execute(text(f'DROP DATABASE IF EXISTS "{name}"'))
+        await conn.execute(text(f'CREATE DATABASE "{name}"'))
+    await admin.dispose()
+
+
+async def seed(messages: int, sessions: int) -> int:
+    from sqlalchemy import text
+    from app.archive import add_months, ensure_partitions
+    from app.db import engine
+    from datetime import datetime
+    await ensure_partitions(engine, start=add_months(datetime.utcnow(), -3), months=4)
+    started = time.perf_counter()
+    async with engine.begin() as conn:
+        await conn.execute(text(
+            "INSERT INTO users (username, email, password_hash, is_verified, uid, created_at) "
+            "VALUES (:uid, :email, '-', true, :uid, now())"
+        ), {"uid": UID, "email": f"{UID}@example.com"})
+        # уроки за последние ~80 дней; самый старый — длинный, на --messages сообщений
+        await conn.execute(text(
+            "INSERT INTO chat_sessions (user_id, topic, created_at) "
+            "SELECT u.id, 'Урок ' || g, now() - interval '80 days' + (g || ' minutes')::interval "
+            "FROM users u, generate_series(1, :n) g WHERE u.uid = :uid"
+        ), {"uid": UID, "n": sessions})
+        session_id = (await conn.execute(text(
+            "SELECT cs.id FROM chat_sessions cs JOIN users u ON u.id = cs.user_id WHERE u.uid = :uid ORDER BY cs.created_at LIMIT 1"
+        ), {"uid": UID})).scalar_one()
+        # ~4 сообщения в секунду разговора, по несколько на одну метку времени (как вставляет /turn)
+        await conn.execute(text(
+            "INSERT INTO messages (session_id, role, content, meta, created_at) "
+            "SELECT :sid, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'ayya' END, 'Реплика номер ' || g, "
+            "'{\"animations\": []}'::jsonb, now() - interval '79 days' + ((g / 4) || ' seconds')::interval "
+            "FROM generate_series(1, :n) g"
+        ), {"sid": session_id, "n": messages})
+    async with engine.connect() as conn:
+        await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM ANALYZE"))
+    print(f"seeded {messages} messages, {sessions} sessions in {time.perf_counter() - started:.1f} s")
+    return session_id
+
+
+async def timed(fn, repeats: int) -> float:
+    latencies = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        latencies.append(time.perf_counter() - started)
+    return percentile(latencies, 50) * 1000
+
+
+async def main(messages: int, sessions: int, page_size: int, repeats: int) -> None:
+    from sqlalchemy import text
+    from app.db import engine
+    from app.main import app
+    from app.pagination import encode_cursor
+    from app.deps import create_access_token
+
+    await recreate_database()
+    await migrate()
+    session_id = await seed(messages, sessions)
+
+    async def cursor_at(sql: str, offset: int, **params) -> str | None:
+        if offset == 0:
+            return None
+        async with engine.connect() as conn:
+            row = (await conn.execute(text(sql + " OFFSET :o LIMIT 1"), {"o": offset - 1, **params})).one()
+        return encode_cursor(row.created_at, row.id)
+
+    async def offset_query(sql: str, offset: int, **params):
+        async with engine.connect() as conn:
+            (await conn.execute(text(sql + " OFFSET :o LIMIT :l"), {"o": offset, "l": page_size, **params})).all()
+
+    messages_sql = "SELECT id, role, content, meta, created_at FROM messages WHERE session_id = :sid ORDER BY created_at, id"
+    sessions_sql = (
+        "SELECT cs.id, cs.topic, cs.created_at FROM chat_sessions cs JOIN users u ON u.id = cs.user_id "
+        "WHERE u.uid = :uid ORDER BY cs.created_at DESC, cs.id DESC"
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {create_access_token({'uid': UID})}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://app", headers=headers) as client:
+        print(f"\nGET /lesson/sessions/{{id}}/messages  limit={page_size}")
+        last_page = messages // page_size - 1
+        for page in sorted({0, 10, 100, 1000, last_page // 2, last_page}):
+            cursor = await cursor_at(messages_sql, page * page_size, sid=session_id)
+            params = {"limit": page_size, **({"cursor": cursor} if cursor else {})}
+
+            async def keyset():
+                resp = await client.get(f"/api/v1/lesson/sessions/{session_id}/messages", params=params)
+                assert resp.status_code == 200 and len(resp.json()["items"]) == page_size, resp.text[:200]
+
+            keyset_ms = await timed(keyset, repeats)
+            offset_ms = await timed(lambda: offset_query(messages_sql, page * page_size, sid=session_id), repeats)
+            print(f"  page {page:>6}: keyset p50={keyset_ms:7.2f} ms   OFFSET p50={offset_ms:8.2f} ms")
+
+        print(f"\nGET /lesson/sessions  limit=20")
+        last_page = sessions // 20 - 1
+        for page in sorted({0, 10, last_page // 2, last_page}):
+            cursor = await cursor_at(sessions_sql, page * 20, uid=UID)
+            params = {"limit": 20, **({"cursor": cursor} if cursor else {})}
+
+            async def keyset():
+                resp = await client.get("/api/v1/lesson/sessions", params=params)
+                assert resp.status_code == 200 and len(resp.json()["items"]) == 20, resp.text[:200]
+
+            keyset_ms = await timed(keyset, repeats)
+            print(f"  page {page:>6}: keyset p50={keyset_ms:7.2f} ms")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=5000)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+    # своя база, чтобы не засорять рабочую; движок приложения создаётся при импорте — задаём до него
+    os.environ["DB_NAME"] = f"{os.environ.get('DB_NAME', 'aitutor')}_history_bench"
+    asyncio.run(main(args.messages, args.sessions, args.page_size, args.repeats))
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Первые ходы урока: живой вызов LLM vs пакеты уроков (app/lesson_packs.py).
+
+--kids детей начинают уроки по --topics темам, приходя в случайные моменты
+за --spread секунд (кэши ответов холодные: новый воркер или истёк TTL).
+  1. live: первые --turns ходов каждого урока идут в заглушку LLM (--latency);
+     платит первый ребёнок темы, следующие попадают в кэш ответов, пока он жив;
+  2. генерация пакетов по тем же темам, не больше --concurrency тем сразу;
+  3. packs: те же уроки с пакетами в памяти воркера.
+Postgres не нужен: пакеты генерируются тем же generate_pack и ставятся в память напрямую.
+Запуск: python -m benchmarks.bench_lesson_packs --topics 20 --kids 200 --latency 0.8
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app import ai, cache, lesson_packs as lp
+from app.config import settings
+from app.lesson_packs import LessonPacks, pack_script
+from .common import serve, report
+from .fake_redis import FakeRedis
+from .stub_llm import create_app
+
+
+async def lessons(topics: list[str], kids: int, turns: int, spread: float) -> tuple[list[float], list[float]]:
+    """Латентность первого хода и всех ходов по сценарию пакета"""
+    rng = random.Random(0)
+    first, every = [], []
+
+    async def kid(i: int) -> None:
+        await asyncio.sleep(rng.uniform(0, spread))
+        dialog: list[dict] = []
+        for n, utterance in enumerate(pack_script(rng.choice(topics), turns)):
+            dialog.append({"role": "user", "content": utterance})
+            started = time.perf_counter()
+            reply = await ai.orchestrate_turn(dialog, flow=f"kid-{i}")
+            elapsed = time.perf_counter() - started
+            every.append(elapsed)
+            if n == 0:
+                first.append(elapsed)
+            dialog.append(lp._assistant_message(reply))
+
+    await asyncio.gather(*(kid(i) for i in range(kids)))
+    return first, every
+
+
+def reset_caches(fake: FakeRedis) -> None:
+    cache.local_completions.clear()
+    fake.data.clear()
+    fake.expires.clear()
+
+
+async def main(topics: int, kids: int, turns: int, latency: float, spread: float, concurrency: int) -> None:
+    names = [f"тема {i}" for i in range(topics)]
+    with FakeRedis() as fake:
+        fake.attach()
+        stub = create_app(latency=latency)
+        async with serve(stub) as base_url:
+            settings.OPENAI_BASE_URL = base_url
+            print(f"topics={topics} kids={kids} turns={turns} llm latency={latency * 1000:.0f} ms spread={spread}s")
+
+            first, every = await lessons(names, kids, turns, spread)
+            report("live: first turn", first)
+            report("live: all scripted turns", every)
+            live_calls = stub.state.requests
+
+            reset_caches(fake)
+            sem = asyncio.Semaphore(concurrency)
+
+            async def generate(topic: str):
+                async with sem:
+                    return topic, 1, await lp.generate_pack(topic, turns)
+
+            started = time.perf_counter()
+            packs = await asyncio.gather(*(generate(t) for t in names))
+            print(f"{'pack generation':<32} {time.perf_counter() - started:.2f} s for {topics} topics "
+                  f"(concurrency={concurrency}, llm calls={stub.state.requests - live_calls})")
+
+            # пакеты живут дольше TTL кэша ответов: сбрасываем его, как после рестарта
+            reset_caches(fake)
+            ai.lesson_packs = LessonPacks()
+            ai.lesson_packs.install(packs, lp.prompt_hash())
+            before = stub.state.requests
+            first, every = await lessons(names, kids, turns, spread)
+            report("packs: first turn", first)
+            report("packs: all scripted turns", every)
+            print(f"{'':<32} llm calls live={live_calls} with packs={stub.state.requests - before} "
+                  f"pack hits={ai.lesson_packs.hits}")
+            await ai.shutdown_llm_client()
+            await cache.close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--kids", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--spread", type=float, default=5.0)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+    asyncio.run(main(args.topics, args.kids, args.turns, args.latency, args.spread, args.concurrency))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Нагрузка на /lesson/turn против локального Postgres: «класс» детей одновременно
+делает ходы урока. LLM — локальная заглушка, Redis — локальная замена.
+Печатает p50/p99 хода, число ходов в секунду и статистику пула соединений
+(занято, overflow, время ожидания соединения).
+
+Параметры пула берутся из окружения (DB_POOL_SIZE, DB_MAX_OVERFLOW, ...),
+флаги ниже их переопределяют.
+Запуск: python -m benchmarks.bench_lesson_turn_db --kids 60 --turns 5 --pool-size 5 --max-overflow 5
+"""
+
+import argparse
+import asyncio
+import os
+import time
+import uuid
+
+import httpx
+
+from .common import serve, migrate, report
+from .fake_redis import FakeRedis
+from .stub_llm import create_app
+
+
+async def kid(client: httpx.AsyncClient, uid: str, turns: int, latencies: list[float], errors: list[str]) -> None:
+    from app.deps import create_access_token
+    headers = {"Authorization": f"Bearer {create_access_token({'uid': uid})}"}
+    created = await client.post("/api/v1/lesson/create-session", json={"topic": "Числа"}, headers=headers)
+    session_id = created.json()["session_id"]
+    for i in range(turns):
+        body = {"session_id": session_id, "topic": "Числа", "text": f"Ход {i}: сколько будет {i} + {i}? ({uuid.uuid4().hex})"}
+        started = time.perf_counter()
+        resp = await client.post("/api/v1/lesson/turn", json=body, headers=headers)
+        latencies.append(time.perf_counter() - started)
+        if resp.status_code != 200:
+            errors.append(f"{resp.status_code} {resp.text[:120]}")
+            return
+
+
+async def main(kids: int, turns: int, llm_latency: float) -> None:
+    from app import ai, cache
+    from app.config import settings
+    from app.db import engine, SessionLocal
+    from app.main import app
+    from app.models import User
+
+    await migrate()
+    uids = [f"bench-{uuid.uuid4().hex[:12]}" for _ in range(kids)]
+    async with SessionLocal() as db:
+        db.add_all(User(username=uid, email=f"{uid}@example.com", password_hash="-", uid=uid) for uid in uids)
+        await db.commit()
+
+    with FakeRedis() as fake:
+        fake.attach()
+        async with serve(create_app(latency=llm_latency)) as llm_url:
+            settings.OPENAI_BASE_URL = llm_url
+            await ai.startup_llm_client()
+            async with serve(app) as base_url:
+                latencies: list[float] = []
+                errors: list[str] = []
+                limits = httpx.Limits(max_connections=kids, max_keepalive_connections=kids)
+                async with httpx.AsyncClient(base_url=base_url, timeout=60, limits=limits) as client:
+                    started = time.perf_counter()
+                    await asyncio.gather(*(kid(client, uid, turns, latencies, errors) for uid in uids))
+                    elapsed = time.perf_counter() - started
+                    pool = (await client.get("/api/v1/health/db-pool")).json()
+
+            await ai.shutdown_llm_client()
+        await cache.close_redis()
+
+    print(
+        f"kids={kids} turns={turns} pool_size={settings.DB_POOL_SIZE} max_overflow={settings.DB_MAX_OVERFLOW} "
+        f"statement_cache={settings.DB_STATEMENT_CACHE_SIZE} llm_latency={llm_latency * 1000:.0f} ms"
+    )
+    report("/lesson/turn", latencies)
+    print(f"turns/s={len(latencies) / elapsed:.1f} errors={len(errors)}")
+    for err in errors[:5]:
+        print(f"  {err}")
+    print(f"pool: {pool}")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kids", type=int, default=60)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="задержка заглушки LLM, сек")
+    parser.add_argument("--pool-size", type=int)
+    parser.add_argument("--max-overflow", type=int)
+    parser.add_argument("--pool-timeout", type=float)
+    parser.add_argument("--statement-cache-size", type=int)
+    args = parser.parse_args()
+    # движок создаётся при импорте app.db — переопределяем настройки через окружение до импорта
+    for flag, env in (("pool_size", "DB_POOL_SIZE"), ("max_overflow", "DB_MAX_OVERFLOW"),
+                      ("pool_timeout", "DB_POOL_TIMEOUT"), ("statement_cache_size", "DB_STATEMENT_CACHE_SIZE")):
+        if getattr(args, flag) is not None:
+            os.environ[env] = str(getattr(args, flag))
+    asyncio.run(main(args.kids, args.turns, args.llm_latency))
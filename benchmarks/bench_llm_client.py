@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: новый httpx.AsyncClient на каждый ход vs общий пул соединений.
+Сравнивает p50/p99 латентности хода против локальной заглушки LLM.
+Запуск: python -m benchmarks.bench_llm_client --turns 500 --concurrency 20
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import orjson
+
+from app import ai
+from app.config import settings
+from .common import serve, report
+from .stub_llm import create_app
+
+PAYLOAD = {
+    "model": settings.OPENAI_MODEL,
+    "messages": [{"role": "user", "content": "Почему 2+2=4?"}],
+    "temperature": 0.7,
+    "response_format": {"type": "json_object"},
+}
+
+
+async def per_call_turn(base_url: str) -> None:
+    # Старое поведение: отдельный клиент (и рукопожатие) на каждый вызов
+    async with httpx.AsyncClient(base_url=base_url, timeout=settings.OPENAI_TIMEOUT) as client:
+        r = await client.post("/chat/completions", content=orjson.dumps(PAYLOAD))
+        r.raise_for_status()
+
+
+async def pooled_turn(base_url: str) -> None:
+    await ai.request_completion(PAYLOAD)
+
+
+async def run(name: str, turn, base_url: str, turns: int, concurrency: int) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+
+    async def one():
+        async with sem:
+            started = time.perf_counter()
+            await turn(base_url)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one() for _ in range(turns)))
+    report(name, latencies)
+
+
+async def main(turns: int, concurrency: int, latency: float) -> None:
+    async with serve(create_app(latency=latency)) as base_url:
+        settings.OPENAI_BASE_URL = base_url
+        await ai.startup_llm_client()
+        try:
+            # прогрев
+            await run("warmup", pooled_turn, base_url, concurrency, concurrency)
+            await run("new client per turn", per_call_turn, base_url, turns, concurrency)
+            await run("shared pooled client", pooled_turn, base_url, turns, concurrency)
+        finally:
+            await ai.shutdown_llm_client()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.01, help="задержка заглушки LLM, сек")
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency, args.latency))
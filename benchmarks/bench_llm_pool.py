@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Пул эндпоинтов LLM: два «провайдера» с разным профилем задержки.
+
+- fast: обычно --fast-latency, но доля --tail-ratio ответов ждёт --tail-latency;
+- steady: всегда --steady-latency.
+Сравниваются:
+  1. один эндпоинт (fast) — как было до пула;
+  2. пул из двух: выбор по EWMA задержки и квоте;
+  3. пул + дублирующий запрос на другой эндпоинт после p95 (LLM_HEDGE_ENABLED).
+Запуск: python -m benchmarks.bench_llm_pool --turns 400 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+
+from app import ai
+from app.config import settings
+from app.llm_pool import LLMPool
+from app.llm_scheduler import LLMScheduler
+from . import stub_llm
+from .common import serve, report
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "Почему 2+2=4?"}]}
+
+
+async def run(name: str, urls: list[str], turns: int, concurrency: int) -> None:
+    ai.llm_scheduler = LLMScheduler(pool=LLMPool.from_urls(urls))
+    latencies: list[float] = []
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            started = time.perf_counter()
+            await ai.request_completion(PAYLOAD, flow=f"kid-{i}")
+            latencies.append(time.perf_counter() - started)
+
+    hedges = dict(ai.llm_hedges.values)
+    await asyncio.gather(*(one(i) for i in range(turns)))
+    report(name, latencies)
+    split = {ep.name: ep.requests for ep in ai.llm_scheduler.pool.endpoints}
+    hedged = {k[0]: v - hedges.get(k, 0) for k, v in ai.llm_hedges.values.items() if v - hedges.get(k, 0)}
+    print(f"{'':<32} requests per endpoint={split} hedges={hedged}")
+    await ai.llm_scheduler.pool.aclose()
+
+
+async def main(turns: int, concurrency: int, fast_latency: float, tail_latency: float, tail_ratio: float,
+               steady_latency: float) -> None:
+    print(f"fast: {fast_latency * 1000:.0f} ms, {tail_ratio:.0%} at {tail_latency * 1000:.0f} ms; "
+          f"steady: {steady_latency * 1000:.0f} ms; turns={turns} concurrency={concurrency}")
+    scenarios = (
+        ("single endpoint (fast)", 1, False),
+        ("pool, latency routing", 2, False),
+        ("pool + hedging after p95", 2, True),
+    )
+    for name, size, hedge in scenarios:
+        settings.LLM_HEDGE_ENABLED = hedge
+        fast = stub_llm.create_app(latency=fast_latency, tail_latency=tail_latency, tail_ratio=tail_ratio)
+        steady = stub_llm.create_app(latency=steady_latency)
+        async with serve(fast) as fast_url, serve(steady) as steady_url:
+            await run(name, [fast_url, steady_url][:size], turns, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--fast-latency", type=float, default=0.05)
+    parser.add_argument("--tail-latency", type=float, default=1.0)
+    parser.add_argument("--tail-ratio", type=float, default=0.03)
+    parser.add_argument("--steady-latency", type=float, default=0.15)
+    args = parser.parse_args()
+    asyncio.run(main(args.turns, args.concurrency, args.fast_latency, args.tail_latency, args.tail_ratio,
+                     args.steady_latency))
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+«Вся школа зашла в 9:00»: одновременные ходы против LLM с лимитом запросов.
+
+Заглушка LLM пропускает --rate-limit запросов в секунду, сверх — 429 с retry-after
+(как Groq). --kids детей делают по одному ходу одновременно, а один «шумный»
+поток — ещё --spam ходов.
+  1. без планировщика: каждый ход сразу уходит к провайдеру (как было), 429 — ошибка хода;
+  2. через app/llm_scheduler.py: лимит одновременных вызовов, очередь по детям,
+     паузы по заголовкам провайдера, отказ 503 тем, кто не успевает к сроку.
+Запуск: python -m benchmarks.bench_llm_scheduler --kids 300 --spam 100 --rate-limit 50
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import orjson
+from fastapi import HTTPException
+
+from app import ai
+from app.config import settings
+from app.llm_pool import LLMPool
+from app.llm_scheduler import LLMScheduler
+from . import stub_llm
+from .common import serve, report
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "Почему 2+2=4?"}]}
+
+
+async def direct(client: httpx.AsyncClient, flow: str) -> None:
+    r = await client.post("/chat/completions", content=orjson.dumps(PAYLOAD))
+    r.raise_for_status()
+
+
+async def scheduled(client: httpx.AsyncClient, flow: str) -> None:
+    await ai.request_completion(PAYLOAD, flow=flow)
+
+
+async def storm(client: httpx.AsyncClient, call, kids: int, spam: int) -> dict:
+    results: dict[str, list] = {"kid": [], "spam": [], "failed": [], "shed": []}
+
+    async def one(kind: str, flow: str):
+        started = time.perf_counter()
+        try:
+            await call(client, flow)
+            results[kind].append(time.perf_counter() - started)
+        except HTTPException:
+            results["shed"].append(flow)
+        except (httpx.HTTPError, RuntimeError):
+            results["failed"].append(flow)
+
+    tasks = [one("spam", "spammer") for _ in range(spam)] + [one("kid", f"kid-{i}") for i in range(kids)]
+    started = time.perf_counter()
+    await asyncio.gather(*tasks)
+    results["elapsed"] = time.perf_counter() - started
+    return results
+
+
+async def main(kids: int, spam: int, rate_limit: int, latency: float, concurrency: int) -> None:
+    settings.LLM_QUEUE_TIMEOUT = 15.0
+    print(f"kids={kids} spam={spam} rate_limit={rate_limit}/s latency={latency * 1000:.0f} ms")
+    for name, call in (("no scheduler", direct), ("scheduler", scheduled)):
+        stub = stub_llm.create_app(latency=latency, rate_limit=rate_limit, rate_window=1.0)
+        async with serve(stub) as url:
+            ai.llm_scheduler = LLMScheduler(max_concurrency=concurrency, pool=LLMPool.from_urls([url]))
+            limits = httpx.Limits(max_connections=1000, max_keepalive_connections=1000)
+            async with httpx.AsyncClient(base_url=url, timeout=60, limits=limits) as client:
+                results = await storm(client, call, kids, spam)
+            await ai.llm_scheduler.pool.aclose()
+        print(f"--- {name}: {results['elapsed']:.1f} s, provider 429s={stub.state.rejected}, "
+              f"failed turns={len(results['failed'])}, shed (503)={len(results['shed'])}")
+        if results["kid"]:
+            report(f"{name}: kids ok={len(results['kid'])}", results["kid"])
+        if results["spam"]:
+            report(f"{name}: spammer ok={len(results['spam'])}", results["spam"])
+        if name == "scheduler":
+            print(f"{'':<32} {ai.llm_scheduler.snapshot()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kids", type=int, default=300)
+    parser.add_argument("--spam", type=int, default=100)
+    parser.add_argument("--rate-limit", type=int, default=50, help="запросов в секунду у заглушки")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--concurrency", type=int, default=16, help="LLM_MAX_CONCURRENCY")
+    args = parser.parse_args()
+    asyncio.run(main(args.kids, args.spam, args.rate_limit, args.latency, args.concurrency))
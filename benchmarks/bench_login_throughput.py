@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк логинов: bcrypt прямо в event loop vs ограниченный пул bcrypt.
+Параллельно идут «ходы урока» (ожидание LLM ~50 мс) — видно, насколько
+всплеск логинов замедляет их.
+Запуск: python -m benchmarks.bench_login_throughput --logins 64 --concurrency 32
+"""
+
+import argparse
+import asyncio
+import time
+
+from fastapi import HTTPException
+
+from app import password_utils
+from app.config import settings
+from .common import percentile
+
+LLM_WAIT = 0.05
+
+
+async def lesson_turns(stop: asyncio.Event, latencies: list[float]) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LLM_WAIT)
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(name: str, verify, hashed: str, logins: int, concurrency: int) -> None:
+    stop = asyncio.Event()
+    turn_latencies: list[float] = []
+    turns = [asyncio.create_task(lesson_turns(stop, turn_latencies)) for _ in range(10)]
+    sem = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def one():
+        nonlocal rejected
+        async with sem:
+            try:
+                assert await verify("secret123", hashed)
+            except HTTPException as e:
+                assert e.status_code == 429
+                rejected += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await asyncio.gather(*turns)
+    print(
+        f"{name:<18} logins/s={(logins - rejected) / elapsed:7.1f}  429={rejected:<4} "
+        f"lesson turn p50={percentile(turn_latencies, 50) * 1000:7.1f} ms  "
+        f"p99={percentile(turn_latencies, 99) * 1000:7.1f} ms  (ideal {LLM_WAIT * 1000:.0f} ms)"
+    )
+
+
+async def main(logins: int, concurrency: int) -> None:
+    hashed = password_utils.hash_password("secret123")
+
+    async def inline_verify(password: str, hashed_password: str) -> bool:
+        # старое поведение: bcrypt в потоке event loop
+        return password_utils.verify_password(password, hashed_password)
+
+    print(
+        f"rounds={settings.BCRYPT_ROUNDS} workers={settings.BCRYPT_WORKERS} "
+        f"max_pending={settings.BCRYPT_MAX_PENDING} logins={logins} concurrency={concurrency}"
+    )
+    await run("inline bcrypt", inline_verify, hashed, logins, concurrency)
+    await run("bcrypt pool", password_utils.verify_password_async, hashed, logins, concurrency)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(main(args.logins, args.concurrency))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Метрики: цена инструментирования и сборка со всех воркеров uvicorn.
+
+1. Histogram.observe / Counter.inc — нс на вызов.
+2. GET /api/v1/health/live in-process (ASGITransport) с METRICS_ENABLED и без,
+   раунды чередуются, чтобы шум машины делился поровну.
+3. `uvicorn --workers N`: запросы по новым соединениям расходятся по воркерам,
+   затем /metrics сверяется с числом отправленных запросов — без METRICS_DIR
+   (видно только ответивший воркер) и с общим METRICS_DIR.
+Postgres и Redis не нужны.
+Запуск: python -m benchmarks.bench_metrics --requests 2000 --workers 2
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from app.config import settings
+from app.main import app
+from app.metrics import Counter, Histogram
+from .common import free_port, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUTE = "/api/v1/health/live"
+
+
+def micro(ops: int = 1_000_000) -> None:
+    hist = Histogram("h", "", ("route",))
+    counter = Counter("c", "", ("route",))
+    for name, fn in (("Histogram.observe", lambda: hist.observe(0.042, "/lesson/turn")),
+                     ("Counter.inc", lambda: counter.inc("/lesson/turn"))):
+        started = time.perf_counter()
+        for _ in range(ops):
+            fn()
+        print(f"{name:<32} {(time.perf_counter() - started) / ops * 1e9:.0f} ns/op (with lambda call)")
+
+
+async def in_process(requests: int, rounds: int) -> None:
+    latencies = {True: [], False: []}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+        for _ in range(rounds):
+            for enabled in (False, True):
+                settings.METRICS_ENABLED = enabled
+                for _ in range(requests // rounds):
+                    started = time.perf_counter()
+                    await client.get(ROUTE)
+                    latencies[enabled].append(time.perf_counter() - started)
+    settings.METRICS_ENABLED = True
+    report(f"{ROUTE} metrics off", latencies[False])
+    report(f"{ROUTE} metrics on", latencies[True])
+
+
+def scraped_count(text: str) -> int:
+    pattern = r'http_request_duration_seconds_count\{method="GET",route="%s",status="200"\} (\d+)' % re.escape(ROUTE)
+    return sum(int(m) for m in re.findall(pattern, text))
+
+
+def multi_worker(requests: int, workers: int, metrics_dir: str) -> None:
+    port = free_port()
+    env = {**os.environ, "METRICS_DIR": metrics_dir, "METRICS_FLUSH_SECONDS": "0.5"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(base + "/metrics")
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+        # новое соединение на каждый запрос — ядро раздаёт их разным воркерам
+        for _ in range(requests):
+            httpx.get(base + ROUTE)
+        time.sleep(1.0)  # дождаться снимков остальных воркеров
+        counts = [scraped_count(httpx.get(base + "/metrics").text) for _ in range(5)]
+        files = len([f for f in os.listdir(metrics_dir) if f.endswith(".json")]) if metrics_dir else 0
+        label = f"METRICS_DIR={'set' if metrics_dir else 'unset'}"
+        print(f"{label:<20} sent={requests} /metrics counts over 5 scrapes={counts} snapshot files={files}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main(requests: int, workers: int, rounds: int) -> None:
+    micro()
+    asyncio.run(in_process(requests, rounds))
+    print(f"uvicorn --workers {workers}")
+    multi_worker(requests, workers, "")
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        multi_worker(requests, workers, metrics_dir)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--rounds", type=int, default=10)
+    args = parser.parse_args()
+    main(args.requests, args.workers, args.rounds)
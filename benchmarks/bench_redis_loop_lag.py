@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест: задержка event loop при медленном Redis.
+Сравнивает синхронный redis.Redis (старый app.cache) и асинхронный пул из app.cache.
+Запуск: python -m benchmarks.bench_redis_loop_lag --delay 0.05 --ops 200
+"""
+
+import argparse
+import asyncio
+import time
+
+import redis
+
+from .common import percentile
+from .fake_redis import FakeRedis
+
+TICK = 0.01
+
+
+async def measure_lag(stop: asyncio.Event, lags: list[float]) -> None:
+    # тикер: насколько позже запланированного просыпается корутина
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - started - TICK)
+
+
+async def run(name: str, op, ops: int, concurrency: int) -> None:
+    stop = asyncio.Event()
+    lags: list[float] = []
+    ticker = asyncio.create_task(measure_lag(stop, lags))
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with sem:
+            await op(i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(ops)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await ticker
+    print(
+        f"{name:<22} ops={ops:<5} total={elapsed:7.2f} s  "
+        f"loop lag p50={percentile(lags, 50) * 1000:7.2f} ms  "
+        f"p99={percentile(lags, 99) * 1000:7.2f} ms  max={max(lags, default=0) * 1000:7.2f} ms"
+    )
+
+
+async def main(delay: float, ops: int, concurrency: int) -> None:
+    with FakeRedis(delay=delay) as fake:
+        # app.cache читает настройки при импорте — подменяем порт заранее
+        from app.config import settings
+        settings.REDIS_HOST = "127.0.0.1"
+        settings.REDIS_PORT = fake.port
+        from app import cache
+
+        sync_client = redis.Redis(host="127.0.0.1", port=fake.port, decode_responses=True)
+
+        async def sync_op(i: int):
+            sync_client.get(f"completion:{i}")
+
+        async def async_op(i: int):
+            await cache.get_cached_completion(f"k{i}")
+
+        async def token_op(i: int):
+            await cache.token_cache.store_verification_token(f"kid{i}@example.com", "1234567", 45)
+            await cache.token_cache.get_verification_token(f"kid{i}@example.com")
+
+        print(f"Redis stand-in delay: {delay * 1000:.0f} ms, concurrency: {concurrency}")
+        await run("sync redis.Redis", sync_op, ops, concurrency)
+        await run("async completion cache", async_op, ops, concurrency)
+        await run("async TokenCache", token_op, ops, concurrency)
+        sync_client.close()
+        await cache.close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--delay", type=float, default=0.05, help="задержка ответа Redis, сек")
+    parser.add_argument("--ops", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.delay, args.ops, args.concurrency))
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Семантический кэш ответов на --entries записях одной темы.
+
+Вопросы собираются из шаблонов («почему X такой Y?», «сколько X у Y?» …) и
+псевдослов. Запросы:
+  - перефразы сохранённых вопросов (слова-связки, опечатка) — должны попасть
+    именно в свой ответ;
+  - новые вопросы из тех же слов — не должны получить чужой ответ.
+Сравниваются полный перебор и IVF (--lists, --probe): доля попаданий,
+ложные попадания, время эмбеддинга и поиска. Postgres, Redis и LLM не нужны.
+Запуск: python -m benchmarks.bench_semantic_cache --entries 100000 --queries 2000
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+from app.config import settings
+from app.semantic_cache import HashingEmbedder, VectorIndex
+from .common import report
+
+TEMPLATES = [
+    "почему {a} такой {b}?", "сколько {a} у {b}?", "что будет если {a} встретит {b}?",
+    "как {a} помогает {b}?", "где живёт {a} и {b}?", "зачем {a} нужен {b}?",
+    "чем {a} отличается от {b}?", "кто сильнее {a} или {b}?", "можно ли {a} превратить в {b}?",
+    "из чего сделан {a} для {b}?",
+]
+FILLERS = ["а ", "скажи, ", "а скажи пожалуйста, ", "ну ", "слушай, "]
+SYLLABLES = "ба ве ги до ку ла ми но пу ро са ти фу ха це чи ша ю ян ер ок ус".split()
+
+
+def make_words(rng: random.Random, n: int) -> list[str]:
+    words = set()
+    while len(words) < n:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def typo(rng: random.Random, text: str) -> str:
+    words = text.split()
+    i = max(range(len(words)), key=lambda j: len(words[j]))  # опечатка в самом длинном слове
+    w = words[i]
+    k = rng.randrange(1, len(w) - 2)
+    words[i] = w[:k] + w[k + 1] + w[k] + w[k + 2:]
+    return " ".join(words)
+
+
+def main(entries: int, queries: int, lists: int, probes: list[int], thresholds: list[float]) -> None:
+    rng = random.Random(0)
+    embedder = HashingEmbedder(settings.SEMANTIC_CACHE_DIM)
+    words = make_words(rng, 4000)
+    pairs: set[tuple[int, str, str]] = set()
+    while len(pairs) < entries + queries:
+        pairs.add((rng.randrange(len(TEMPLATES)), rng.choice(words), rng.choice(words)))
+    pairs = sorted(pairs)
+    rng.shuffle(pairs)
+    stored, novel = pairs[:entries], pairs[entries:]
+    questions = [TEMPLATES[t].format(a=a, b=b) for t, a, b in stored]
+
+    started = time.perf_counter()
+    vectors = [embedder.embed(q) for q in questions]
+    embed_us = (time.perf_counter() - started) / entries * 1e6
+    print(f"entries={entries} dim={embedder.dim} embed={embed_us:.0f} us/question "
+          f"matrix={entries * embedder.dim * 4 / 2**20:.0f} MiB threshold={settings.SEMANTIC_CACHE_THRESHOLD}")
+
+    targets = rng.sample(range(entries), queries)
+    paraphrases = []
+    for i in targets:
+        q = rng.choice(FILLERS) + questions[i]
+        paraphrases.append((embedder.embed(typo(rng, q) if rng.random() < 0.5 else q), i))
+    others = [embedder.embed(TEMPLATES[t].format(a=a, b=b)) for t, a, b in novel[:queries]]
+
+    indexes = [("brute force", VectorIndex(embedder.dim, entries))]
+    for probe in probes:
+        indexes.append((f"IVF lists={lists} probe={probe}", VectorIndex(embedder.dim, entries, lists, probe)))
+    trained = None
+    for name, index in indexes:
+        for i, v in enumerate(vectors):
+            index.add(v, i, now=0)
+        if index.ivf_lists:
+            if trained is None:
+                started = time.perf_counter()
+                asyncio.run(index.train())
+                print(f"{'IVF k-means training':<32} {time.perf_counter() - started:.2f} s (in a worker thread)")
+                trained = index
+            else:
+                # те же центроиды и списки, другой probe
+                index.centroids, index._lists, index._row_list = trained.centroids, trained._lists, trained._row_list
+
+    for name, index in indexes:
+        latencies, found, novel_scores = [], [], []
+        for vector, expected in paraphrases:
+            started = time.perf_counter()
+            row, score = index.search(vector)
+            latencies.append(time.perf_counter() - started)
+            found.append((score, index.values[row] == expected))
+        for vector in others:
+            started = time.perf_counter()
+            row, score = index.search(vector)
+            latencies.append(time.perf_counter() - started)
+            novel_scores.append(score)
+        report(f"{name}", latencies)
+        for threshold in sorted({settings.SEMANTIC_CACHE_THRESHOLD, *thresholds}):
+            hits = sum(score >= threshold for score, _ in found)
+            right = sum(score >= threshold and ok for score, ok in found)
+            false_hits = sum(score >= threshold for score in novel_scores)
+            print(f"{'':<32} threshold={threshold:.2f}: paraphrase hit rate={hits / queries:.1%} "
+                  f"(right answer {right / queries:.1%}), false hits on new questions={false_hits / queries:.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--lists", type=int, default=256)
+    parser.add_argument("--probe", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--thresholds", type=float, nargs="*", default=[0.8, 0.9, 0.95])
+    args = parser.parse_args()
+    main(args.entries, args.queries, args.lists, args.probe, args.thresholds)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Single-flight для одинаковых одновременных запросов к LLM («весь класс открыл один урок»).
+
+1) В одном процессе: N одинаковых диалогов одновременно -> 1 вызов LLM.
+2) Между воркерами: несколько процессов с LLM_SINGLEFLIGHT_REDIS=true против общей
+   замены Redis -> по-прежнему 1 вызов LLM на весь «класс».
+Запуск: python -m benchmarks.bench_singleflight --kids 30 --workers 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import orjson
+
+from .common import serve
+from .fake_redis import FakeRedis
+from .stub_llm import create_app
+
+OPENING = [{"role": "user", "content": "Привет! Начнём урок про числа?"}]
+
+
+async def fire(kids: int, tag: str) -> dict:
+    from app import ai
+    started = time.perf_counter()
+    replies = await asyncio.gather(*(ai.orchestrate_turn(OPENING + [{"role": "user", "content": tag}]) for _ in range(kids)))
+    assert all(r == replies[0] for r in replies)
+    stats = ai.singleflight_stats.as_dict()
+    stats["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return stats
+
+
+async def child(kids: int, tag: str, base_url: str, redis_port: int) -> None:
+    from app import ai, cache
+    from app.config import settings
+    settings.OPENAI_BASE_URL = base_url
+    settings.LLM_SINGLEFLIGHT_REDIS = True
+    cache.redis_pool.connection_kwargs.update(host="127.0.0.1", port=redis_port)
+    print(orjson.dumps(await fire(kids, tag)).decode())
+    await ai.shutdown_llm_client()
+    await cache.close_redis()
+
+
+async def main(kids: int, workers: int) -> None:
+    with FakeRedis() as fake:
+        fake.attach()
+        stub = create_app(latency=0.3)
+        async with serve(stub) as base_url:
+            from app import ai, cache
+            from app.config import settings
+            settings.OPENAI_BASE_URL = base_url
+
+            stats = await fire(kids, "in-process")
+            print(f"in-process: {kids} kids -> upstream calls={stub.state.requests}, stats={stats}")
+            await ai.shutdown_llm_client()
+            await cache.close_redis()
+
+            before = stub.state.requests
+            tag = f"multi-{time.time_ns()}"
+            procs = [
+                await asyncio.create_subprocess_exec(
+                    sys.executable, "-m", "benchmarks.bench_singleflight", "--child",
+                    "--kids", str(kids), "--tag", tag, "--base-url", base_url, "--redis-port", str(fake.port),
+                    stdout=asyncio.subprocess.PIPE, env=os.environ.copy(),
+                )
+                for _ in range(workers)
+            ]
+            outputs = [orjson.loads((await p.communicate())[0].splitlines()[-1]) for p in procs]
+            print(f"{workers} workers x {kids} kids -> upstream calls={stub.state.requests - before}")
+            for i, out in enumerate(outputs):
+                print(f"  worker {i}: {out}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--kids", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--child", action="store_true")
+    parser.add_argument("--tag", default="")
+    parser.add_argument("--base-url", default="")
+    parser.add_argument("--redis-port", type=int, default=0)
+    args = parser.parse_args()
+    if args.child:
+        asyncio.run(child(args.kids, args.tag, args.base_url, args.redis_port))
+    else:
+        asyncio.run(main(args.kids, args.workers))
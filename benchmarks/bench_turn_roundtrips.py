@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Сколько обращений к Postgres делает один ход /lesson/turn и сколько он держит соединение.
+
+Считает на ход: SQL-запросы, BEGIN/COMMIT, выдачи соединения из пула
+(с pre-ping каждая — ещё один round trip) и суммарное время, пока соединение
+было занято. Отдельно проверяет, занято ли соединение, пока идёт вызов LLM.
+Ходы выполняются последовательно (in-process через ASGITransport), LLM — заглушка,
+Redis — локальная замена, Postgres — локальный (DB_*).
+Запуск: python -m benchmarks.bench_turn_roundtrips --sessions 20 --turns 5
+"""
+
+import argparse
+import asyncio
+import time
+import uuid
+
+import httpx
+from sqlalchemy import event
+
+from app import ai, cache
+from app.config import settings
+from app.db import engine, SessionLocal
+from app.deps import create_access_token
+from app.main import app
+from app.models import User
+from .common import serve, migrate, percentile
+from .fake_redis import FakeRedis
+from .stub_llm import create_app
+
+
+class DBCounters:
+    def __init__(self):
+        self.statements = 0
+        self.begins = 0
+        self.commits = 0
+        self.checkouts = 0
+        self.held = 0.0
+        self._since: dict[int, float] = {}
+
+    def install(self) -> None:
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._on_statement)
+        event.listen(sync_engine, "begin", self._on_begin)
+        event.listen(sync_engine, "commit", self._on_commit)
+        event.listen(sync_engine, "checkout", self._on_checkout)
+        event.listen(sync_engine, "checkin", self._on_checkin)
+
+    def snapshot(self) -> tuple:
+        return self.statements, self.begins, self.commits, self.checkouts, self.held
+
+    def _on_statement(self, *args):
+        self.statements += 1
+
+    def _on_begin(self, *args):
+        self.begins += 1
+
+    def _on_commit(self, *args):
+        self.commits += 1
+
+    def _on_checkout(self, dbapi_conn, record, proxy):
+        self.checkouts += 1
+        self._since[id(record)] = time.perf_counter()
+
+    def _on_checkin(self, dbapi_conn, record):
+        started = self._since.pop(id(record), None)
+        if started is not None:
+            self.held += time.perf_counter() - started
+
+
+async def main(sessions: int, turns: int, llm_latency: float) -> None:
+    await migrate()
+    uid = f"bench-{uuid.uuid4().hex[:12]}"
+    async with SessionLocal() as db:
+        db.add(User(username=uid, email=f"{uid}@example.com", password_hash="-", uid=uid))
+        await db.commit()
+
+    counters = DBCounters()
+    counters.install()
+    stub = create_app(latency=llm_latency)
+    held_during_llm: list[int] = []
+
+    @stub.middleware("http")
+    async def sample_pool(request, call_next):
+        # в этот момент обработчик хода ждёт LLM: занятых соединений быть не должно
+        held_during_llm.append(engine.pool.checkedout())
+        return await call_next(request)
+
+    results: dict[str, list[tuple]] = {"first turn": [], "next turns": []}
+    with FakeRedis() as fake:
+        fake.attach()
+        async with serve(stub) as llm_url:
+            settings.OPENAI_BASE_URL = llm_url
+            await ai.startup_llm_client()
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60) as client:
+                headers = {"Authorization": f"Bearer {create_access_token({'uid': uid})}"}
+                for s in range(sessions):
+                    session_id = None
+                    for i in range(turns):
+                        body = {"session_id": session_id, "topic": "Числа", "text": f"Сессия {s}, ход {i} ({uuid.uuid4().hex})"}
+                        before = counters.snapshot()
+                        started = time.perf_counter()
+                        resp = await client.post("/api/v1/lesson/turn", json=body, headers=headers)
+                        elapsed = time.perf_counter() - started
+                        assert resp.status_code == 200, resp.text
+                        delta = tuple(a - b for a, b in zip(counters.snapshot(), before))
+                        results["next turns" if session_id else "first turn"].append(delta + (elapsed,))
+                        if session_id is None:
+                            session_id = await latest_session_id(uid)
+            await ai.shutdown_llm_client()
+        await cache.close_redis()
+
+    pre_ping = 1 if settings.DB_POOL_PRE_PING else 0
+    print(f"sessions={sessions} turns={turns} llm_latency={llm_latency * 1000:.0f} ms pre_ping={bool(pre_ping)}")
+    for name, rows in results.items():
+        if not rows:
+            continue
+        n = len(rows)
+        statements, begins, commits, checkouts = (sum(r[k] for r in rows) / n for k in range(4))
+        round_trips = statements + begins + commits + checkouts * pre_ping
+        held = [r[4] for r in rows]
+        total = [r[5] for r in rows]
+        print(
+            f"{name:<11} statements={statements:4.1f} begin={begins:3.1f} commit={commits:3.1f} "
+            f"checkouts={checkouts:3.1f} -> round trips={round_trips:4.1f}  "
+            f"conn held p50={percentile(held, 50) * 1000:6.2f} ms  "
+            f"turn p50={percentile(total, 50) * 1000:6.2f} ms"
+        )
+    print(f"connections checked out while LLM call in flight: max={max(held_during_llm)}")
+    await engine.dispose()
+
+
+async def latest_session_id(uid: str) -> int:
+    from sqlalchemy import select
+    from app.models import ChatSession
+    async with SessionLocal() as db:
+        q = await db.execute(
+            select(ChatSession.id).join(User, User.id == ChatSession.user_id)
+            .where(User.uid == uid).order_by(ChatSession.id.desc()).limit(1)
+        )
+        return q.scalar_one()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="задержка заглушки LLM, сек")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.turns, args.llm_latency))
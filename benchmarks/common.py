@@ -0,0 +1,55 @@
+"""Общие помощники для бенчмарков: локальный сервер, миграции и перцентили"""
+
+import asyncio
+import contextlib
+import os
+import socket
+
+import uvicorn
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.asynccontextmanager
+async def serve(app, port: int | None = None):
+    """Поднимает ASGI-приложение на 127.0.0.1 в текущем event loop и отдаёт базовый URL"""
+    port = port or free_port()
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
+
+
+async def migrate() -> None:
+    """alembic upgrade head для базы из DB_* (env.py сам крутит asyncio.run — поэтому в потоке)"""
+    from alembic import command
+    from alembic.config import Config
+    cfg = Config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini"))
+    await asyncio.to_thread(command.upgrade, cfg, "head")
+
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def report(name: str, latencies: list[float]) -> None:
+    """Печатает p50/p99 в миллисекундах"""
+    print(
+        f"{name:<32} n={len(latencies):<5} "
+        f"p50={percentile(latencies, 50) * 1000:8.2f} ms  "
+        f"p99={percentile(latencies, 99) * 1000:8.2f} ms"
+    )
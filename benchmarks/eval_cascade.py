@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Офлайн-оценка каскада моделей (app/llm_cascade.py) на записанных диалогах.
+
+Источник диалогов:
+  --file messages_p202601.jsonl.gz  — архив партиции (app/archive.py) или такой же JSONL
+                                     (строка — сообщение: session_id, role, content);
+  --db --sessions 500               — последние сессии из Postgres (DB_*);
+  иначе --synthetic N               — сгенерированные уроки (проверка самого скрипта).
+Ход — реплики ребёнка перед записанным ответом Айи/Аяны; контекст — записанная
+история (последние HISTORY_WINDOW сообщений, без конспекта).
+
+Без --replay: только маршрутизация — доля ходов по уровням и причинам и оценка
+токенов/стоимости «всё основной моделью» против каскада (без учёта эскалаций).
+--replay: каждый ход через ai.route_completion к LLM из настроек (LLM_FAST_MODEL
+обязателен): задержка по уровням, эскалации, токены и стоимость по usage,
+совпадение роли ответа (Айя/Аяна) с записанной. --compare дополнительно спрашивает
+основную модель на ходах быстрой и сравнивает роли.
+--stub: вместо настоящего LLM — benchmarks/stub_llm.py (быстрая модель с долей
+невалидных ответов --stub-invalid).
+Кэш ответов — всегда FakeRedis, чтобы не трогать рабочий Redis.
+Запуск: python -m benchmarks.eval_cascade --synthetic 200 --stub --compare
+"""
+
+import argparse
+import asyncio
+import gzip
+import random
+import time
+from collections import Counter
+
+import orjson
+
+from app import ai, cache
+from app.config import settings
+from app.history import ASSISTANT_ROLES, to_llm_messages
+from app.llm_cascade import FAST, STRONG, TIERS, cascade_stats, classify_turn, tier_model, tier_price
+from .common import serve, report
+from .fake_redis import FakeRedis
+
+CHILD_ACKS = ["да", "Да!", "понятно", "ага", "ещё!", "давай"]
+CHILD_CONFUSED = ["не знаю", "не понял", "а почему?", "а зачем это"]
+CHILD_REMARKS = ["у меня дома есть кошка", "я видел такое в парке", "мне нравится красный"]
+
+
+def read_rows(path: str) -> list[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        return [orjson.loads(line) for line in f if line.strip()]
+
+
+async def load_db_rows(sessions: int) -> list[dict]:
+    from sqlalchemy import select
+    from app.db import SessionLocal, engine
+    from app.models import Message
+
+    async with SessionLocal() as db:
+        ids = (await db.execute(
+            select(Message.session_id).group_by(Message.session_id).order_by(Message.session_id.desc()).limit(sessions)
+        )).scalars().all()
+        rows = (await db.execute(
+            select(Message.session_id, Message.role, Message.content)
+            .where(Message.session_id.in_(ids)).order_by(Message.session_id, Message.id)
+        )).all()
+    await engine.dispose()
+    return [dict(r._mapping) for r in rows]
+
+
+def synthetic_rows(sessions: int) -> list[dict]:
+    """Уроки по циклу Фейнмана: объяснение → вопросы Аяны → ответы и коррекции → проект"""
+    rng = random.Random(0)
+    rows = []
+    for sid in range(sessions):
+        def say(role: str, content: str) -> None:
+            rows.append({"session_id": sid, "role": role, "content": content})
+
+        say("user", "Давай изучим тему: счёт")
+        say("ayya", "Смотри: одно яблоко и ещё одно — это два яблока. Понятно?")
+        for _ in range(rng.randint(2, 6)):
+            kind = rng.random()
+            if kind < 0.35:
+                say("user", rng.choice(CHILD_ACKS))
+                say("ayana", f"А сколько будет {rng.randint(1, 5)} и {rng.randint(1, 4)}?")
+            elif kind < 0.6:
+                say("user", str(rng.randint(1, 9)))
+                say("ayya", "Правильно! Молодец." if rng.random() < 0.6 else "Почти! Давай посчитаем пальчики ещё раз.")
+            elif kind < 0.8:
+                say("user", rng.choice(CHILD_CONFUSED))
+                say("ayya", "Давай по-другому: положим яблоки на стол и посчитаем вместе.")
+            else:
+                say("user", rng.choice(CHILD_REMARKS))
+                say("ayana", "Ого! А это можно посчитать?")
+        if rng.random() < 0.3:
+            say("ayya", "Давай сделаем мини-проект: план из трёх шагов.")
+            say("user", "давай")
+            say("ayya", "Шаг первый: посчитай игрушки дома.")
+    return rows
+
+
+def build_turns(rows: list[dict]) -> list[tuple[list[dict], dict]]:
+    """(диалог для LLM, записанный ответ) для каждого ответа Айи/Аяны на реплику ребёнка"""
+    turns = []
+    history: list[dict] = []
+    session = None
+    for row in rows:
+        if row["session_id"] != session:
+            session, history = row["session_id"], []
+        if row["role"] in ASSISTANT_ROLES and history and history[-1]["role"] == "user":
+            dialog = to_llm_messages(history[-settings.HISTORY_WINDOW:])
+            turns.append((dialog, {"role": row["role"], "say": row["content"]}))
+        history.append({"role": row["role"], "content": row["content"]})
+    return turns
+
+
+def routing_report(turns: list[tuple[list[dict], dict]]) -> None:
+    reasons = Counter(classify_turn(dialog) for dialog, _ in turns)
+    tokens = {tier: 0 for tier in TIERS}
+    total = 0
+    for dialog, recorded in turns:
+        size = ai.count_message_tokens(ai.build_orchestrator_messages(dialog)) + ai.count_tokens(recorded["say"])
+        tokens[classify_turn(dialog)[0]] += size
+        total += size
+    print(f"turns={len(turns)}")
+    for (tier, reason), n in sorted(reasons.items()):
+        print(f"  {tier:<7} {reason:<9} {n:>6}  {n / len(turns):6.1%}")
+    strong_cost = total * tier_price(STRONG) / 1e6
+    cascade_cost = sum(tokens[t] * tier_price(t) / 1e6 for t in TIERS)
+    print(f"estimated tokens: fast={tokens[FAST]} strong={tokens[STRONG]}; cost all-strong=${strong_cost:.4f} "
+          f"cascade=${cascade_cost:.4f} (LLM_*_COST_PER_MTOKENS; escalations add to this)")
+
+
+async def replay(turns: list[tuple[list[dict], dict]], concurrency: int, compare: bool) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: dict[str, list[float]] = {"fast": [], "strong": [], "escalated": []}
+    role_match: Counter = Counter()
+    served: Counter = Counter()
+    agreement: Counter = Counter()
+
+    async def one(i: int, dialog: list[dict], recorded: dict) -> None:
+        async with sem:
+            started = time.perf_counter()
+            try:
+                reply, tier = await ai.route_completion(dialog, flow=f"eval-{i}")
+            except Exception as e:
+                served["failed"] += 1
+                print(f"turn {i} failed: {e}")
+                return
+            latencies[tier].append(time.perf_counter() - started)
+            served[tier] += 1
+            role_match[tier] += reply.get("role") == recorded["role"]
+            if compare and tier == FAST:
+                strong = await ai.chat_completion(ai.build_orchestrator_messages(dialog), f"eval-{i}")
+                agreement["same_role"] += strong.get("role") == reply.get("role")
+                agreement["compared"] += 1
+
+    before = cascade_stats.as_dict()
+    await asyncio.gather(*(one(i, dialog, recorded) for i, (dialog, recorded) in enumerate(turns)))
+    after = cascade_stats.as_dict()
+
+    for tier, values in latencies.items():
+        if values:
+            report(f"replay: {tier}", values)
+            print(f"{'':<32} role matches recording: {role_match[tier] / len(values):.1%}")
+    print(f"served: {dict(served)} escalations: {after['escalations']}")
+    for tier in TIERS:
+        tokens = after["tokens"][tier] - before["tokens"][tier]
+        cost = after["cost_usd"][tier] - before["cost_usd"][tier]
+        note = " (with --compare calls)" if compare and tier == STRONG else ""
+        print(f"  {tier:<7} model={tier_model(tier)!r} tokens={tokens} cost=${cost:.4f}{note}")
+    if agreement["compared"]:
+        print(f"fast vs strong on the same turns: same role {agreement['same_role'] / agreement['compared']:.1%} "
+              f"of {agreement['compared']}")
+
+
+async def main(args: argparse.Namespace) -> None:
+    if args.file:
+        rows = read_rows(args.file)
+    elif args.db:
+        rows = await load_db_rows(args.sessions)
+    else:
+        rows = synthetic_rows(args.synthetic)
+    turns = build_turns(rows)
+    if args.limit:
+        turns = turns[:args.limit]
+    if not turns:
+        print("no recorded turns")
+        return
+    routing_report(turns)
+    if not (args.replay or args.stub):
+        return
+
+    settings.LLM_CASCADE_ENABLED = True
+    with FakeRedis() as fake:
+        fake.attach()
+        if args.stub:
+            settings.LLM_FAST_MODEL, settings.OPENAI_MODEL = "stub-fast", "stub-strong"
+            from .stub_llm import create_app
+            stub = create_app(latency=args.stub_strong_latency, models={
+                "stub-fast": {"latency": args.stub_fast_latency, "invalid_ratio": args.stub_invalid},
+            })
+            async with serve(stub) as url:
+                settings.OPENAI_BASE_URL = url
+                await replay(turns, args.concurrency, args.compare)
+        else:
+            if not settings.LLM_FAST_MODEL:
+                raise SystemExit("LLM_FAST_MODEL is not set")
+            await replay(turns, args.concurrency, args.compare)
+        await ai.shutdown_llm_client()
+        await cache.close_redis()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", help="JSONL(.gz) сообщений, например архив партиции messages")
+    source.add_argument("--db", action="store_true", help="последние --sessions сессий из Postgres")
+    source.add_argument("--synthetic", type=int, default=200, help="сколько сгенерированных уроков")
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--limit", type=int, default=0, help="не больше N ходов")
+    parser.add_argument("--replay", action="store_true", help="прогнать ходы через LLM")
+    parser.add_argument("--compare", action="store_true", help="ещё и основной моделью на ходах быстрой")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stub", action="store_true", help="заглушка LLM вместо настоящего")
+    parser.add_argument("--stub-fast-latency", type=float, default=0.1)
+    parser.add_argument("--stub-strong-latency", type=float, default=0.6)
+    parser.add_argument("--stub-invalid", type=float, default=0.05)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,203 @@
+"""
+Локальная замена Redis (подмножество RESP2) с искусственной задержкой ответа.
+Сервер живёт в отдельном потоке со своим event loop, поэтому продолжает
+отвечать, даже когда синхронный клиент блокирует основной loop.
+"""
+
+import asyncio
+import threading
+import time
+
+from .common import free_port
+
+
+class FakeRedis:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.port = free_port()
+        self.data: dict[str, object] = {}
+        self.expires: dict[str, float] = {}
+        self.commands = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._server = None
+        self._thread: threading.Thread | None = None
+
+    # --- жизненный цикл ---
+
+    def start(self) -> "FakeRedis":
+        ready = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._server = self._loop.run_until_complete(
+                asyncio.start_server(self._handle, "127.0.0.1", self.port)
+            )
+            ready.set()
+            self._loop.run_forever()
+            self._loop.close()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        ready.wait()
+        return self
+
+    def stop(self) -> None:
+        if self._loop is not None:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout=2)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=2)
+
+    async def _shutdown(self) -> None:
+        self._server.close()
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def attach(self) -> "FakeRedis":
+        """Направляет пул app.cache на эту замену (после close_redis() — и повторно)"""
+        from app import cache
+        cache.redis_pool.connection_kwargs.update(host="127.0.0.1", port=self.port)
+        # соединения, созданные для прошлой замены, помнят её порт
+        cache.redis_pool.reset()
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # --- протокол ---
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queued: list[list[str]] | None = None  # MULTI ... EXEC этого соединения
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                self.commands += 1
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                cmd = args[0].upper()
+                if cmd == "MULTI":
+                    queued, result = [], True
+                elif cmd == "EXEC":
+                    result = [self._execute(a) for a in queued or []]
+                    queued = None
+                elif cmd == "DISCARD":
+                    queued, result = None, True
+                elif queued is not None:
+                    queued.append(args)
+                    result = "QUEUED"
+                else:
+                    result = self._execute(args)
+                writer.write(self._encode(result))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[str] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        count = int(line[1:].strip())
+        args = []
+        for _ in range(count):
+            size = int((await reader.readline())[1:].strip())
+            args.append((await reader.readexactly(size + 2))[:-2].decode())
+        return args
+
+    def _encode(self, value) -> bytes:
+        if isinstance(value, Exception):
+            return f"-ERR {value}\r\n".encode()
+        if value is True:
+            return b"+OK\r\n"
+        if value == "QUEUED":
+            return b"+QUEUED\r\n"
+        if value is None:
+            return b"$-1\r\n"
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(self._encode(v) for v in value)
+        raw = str(value).encode()
+        return b"$" + str(len(raw)).encode() + b"\r\n" + raw + b"\r\n"
+
+    def _alive(self, key: str) -> bool:
+        exp = self.expires.get(key)
+        if exp is not None and exp <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _execute(self, args: list[str]):
+        cmd, rest = args[0].upper(), args[1:]
+        if cmd == "PING":
+            return "PONG"
+        if cmd == "GET":
+            return self.data.get(rest[0]) if self._alive(rest[0]) else None
+        if cmd == "SETEX":
+            self.data[rest[0]] = rest[2]
+            self.expires[rest[0]] = time.monotonic() + int(rest[1])
+            return True
+        if cmd == "SET":
+            key, value, opts = rest[0], rest[1], [o.upper() for o in rest[2:]]
+            if "NX" in opts and self._alive(key):
+                return None
+            self.data[key] = value
+            self.expires.pop(key, None)
+            if "EX" in opts:
+                self.expires[key] = time.monotonic() + int(rest[2 + opts.index("EX") + 1])
+            if "PX" in opts:
+                self.expires[key] = time.monotonic() + int(rest[2 + opts.index("PX") + 1]) / 1000
+            return True
+        if cmd == "DEL":
+            removed = 0
+            for key in rest:
+                if self._alive(key):
+                    removed += 1
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if cmd == "EXISTS":
+            return sum(1 for key in rest if self._alive(key))
+        if cmd == "EVAL":
+            # поддерживается только скрипт compare-and-delete из app.cache.release_inflight_lock
+            key, token = rest[2], rest[3]
+            if self._alive(key) and self.data[key] == token:
+                return self._execute(["DEL", key])
+            return 0
+        if cmd == "PTTL":
+            if not self._alive(rest[0]):
+                return -2
+            exp = self.expires.get(rest[0])
+            return -1 if exp is None else int((exp - time.monotonic()) * 1000)
+        if cmd == "EXPIRE":
+            if not self._alive(rest[0]):
+                return 0
+            self.expires[rest[0]] = time.monotonic() + int(rest[1])
+            return 1
+        if cmd in ("RPUSH", "RPUSHX"):
+            if not self._alive(rest[0]):
+                if cmd == "RPUSHX":
+                    return 0
+                self.data[rest[0]] = []
+            self.data[rest[0]].extend(rest[1:])
+            return len(self.data[rest[0]])
+        if cmd in ("LRANGE", "LTRIM"):
+            items = self.data.get(rest[0], []) if self._alive(rest[0]) else []
+            start, stop = int(rest[1]), int(rest[2])
+            start = max(start + len(items) if start < 0 else start, 0)
+            stop = stop + len(items) if stop < 0 else stop
+            picked = items[start:stop + 1]
+            if cmd == "LRANGE":
+                return picked
+            if items:
+                self.data[rest[0]] = picked
+            return True
+        # CLIENT SETINFO и прочие служебные команды
+        return True
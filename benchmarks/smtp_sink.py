@@ -0,0 +1,83 @@
+"""
+Локальный SMTP-приёмник: принимает любые письма (и любую AUTH) и складывает их в память.
+Поддерживает EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT — без TLS.
+drop_connections() закрывает открытые соединения, как сервер по простою.
+"""
+
+import asyncio
+
+from .common import free_port
+
+
+class SMTPSink:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.port = free_port()
+        self.messages: list[dict] = []
+        self.connections = 0
+        self._server: asyncio.AbstractServer | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    async def __aenter__(self) -> "SMTPSink":
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", self.port)
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    def drop_connections(self) -> None:
+        for writer in self._writers:
+            writer.close()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        envelope: dict = {"rcpt": []}
+
+        async def reply(line: str) -> None:
+            writer.write(line.encode() + b"\r\n")
+            await writer.drain()
+
+        await reply("220 sink ESMTP")
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                line = raw.decode(errors="replace").rstrip("\r\n")
+                cmd = line.split(" ", 1)[0].upper()
+                if cmd in ("EHLO", "HELO"):
+                    await reply("250-sink\r\n250 AUTH PLAIN LOGIN XOAUTH2")
+                elif cmd == "AUTH":
+                    await reply("235 2.7.0 Accepted")
+                elif cmd == "MAIL":
+                    envelope = {"from": line[10:].strip("<> "), "rcpt": []}
+                    await reply("250 OK")
+                elif cmd == "RCPT":
+                    envelope["rcpt"].append(line[8:].strip("<> "))
+                    await reply("250 OK")
+                elif cmd == "DATA":
+                    await reply("354 End data with <CR><LF>.<CR><LF>")
+                    body = []
+                    while True:
+                        data_line = await reader.readline()
+                        if data_line in (b".\r\n", b".\n", b""):
+                            break
+                        body.append(data_line)
+                    if self.delay:
+                        await asyncio.sleep(self.delay)
+                    envelope["data"] = b"".join(body).decode(errors="replace")
+                    self.messages.append(envelope)
+                    await reply("250 OK queued")
+                elif cmd == "QUIT":
+                    await reply("221 Bye")
+                    break
+                else:
+                    # RSET, NOOP и прочее
+                    await reply("250 OK")
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
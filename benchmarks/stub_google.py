@@ -0,0 +1,114 @@
+"""
+Локальная заглушка Google: ключи (JWKS), обмен кода/refresh_token на access_token
+(/token), профиль (/userinfo) и выпуск ID token, подписанных её ключами.
+Запуск отдельно: python -m benchmarks.stub_google --port 9200 --latency 0.1
+"""
+
+import argparse
+import asyncio
+import base64
+import time
+from urllib.parse import parse_qsl
+
+import rsa
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
+from google.auth import crypt, jwt as google_jwt
+
+
+def _b64(value: int) -> str:
+    raw = value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+class GoogleStub:
+    """
+    RSA-ключи с kid, JWKS по /certs и подпись ID token как у accounts.google.com.
+    fail_next — сколько следующих запросов к /token и /userinfo ответят 503.
+    """
+
+    def __init__(self, bits: int = 2048, max_age: int = 3600, latency: float = 0.0):
+        self.max_age = max_age
+        self.latency = latency
+        self.requests = 0
+        self.fail_next = 0
+        self.calls: dict[str, int] = {}
+        self.keys: dict[str, tuple[rsa.PublicKey, rsa.PrivateKey]] = {}
+        self.bits = bits
+        self.kid = self.rotate()
+
+    def rotate(self) -> str:
+        """Новый ключ подписи (старые остаются в JWKS, как у Google)"""
+        kid = f"stub-{len(self.keys) + 1}"
+        self.keys[kid] = rsa.newkeys(self.bits)
+        self.kid = kid
+        return kid
+
+    def jwks(self) -> dict:
+        return {"keys": [
+            {"kty": "RSA", "alg": "RS256", "use": "sig", "kid": kid, "n": _b64(pub.n), "e": _b64(pub.e)}
+            for kid, (pub, _) in self.keys.items()
+        ]}
+
+    def id_token(self, sub: str, audience: str, email: str | None = None, ttl: int = 3600, **claims) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": "https://accounts.google.com", "aud": audience, "sub": sub,
+            "email": email or f"{sub}@example.com", "email_verified": True,
+            "name": f"Kid {sub}", "iat": now, "exp": now + ttl, **claims,
+        }
+        signer = crypt.RSASigner.from_string(self.keys[self.kid][1].save_pkcs1(), key_id=self.kid)
+        return google_jwt.encode(signer, payload).decode()
+
+    def create_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/certs")
+        async def certs():
+            self.requests += 1
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return ORJSONResponse(self.jwks(), headers={"Cache-Control": f"public, max-age={self.max_age}, must-revalidate"})
+
+        @app.middleware("http")
+        async def count_and_fail(request: Request, call_next):
+            path = request.url.path
+            self.calls[path] = self.calls.get(path, 0) + 1
+            if path != "/certs" and self.fail_next > 0:
+                self.fail_next -= 1
+                return ORJSONResponse({"error": "backendError"}, status_code=503)
+            return await call_next(request)
+
+        @app.post("/token")
+        async def token(request: Request):
+            # form-urlencoded разбираем сами: python-multipart не нужен
+            form = dict(parse_qsl((await request.body()).decode()))
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if form.get("grant_type") not in {"authorization_code", "refresh_token"}:
+                return ORJSONResponse({"error": "unsupported_grant_type"}, status_code=400)
+            # access_token несёт sub: по коду "kid-7" /userinfo вернёт пользователя kid-7
+            sub = form.get("code") or "smtp"
+            return {"access_token": f"ya29.{sub}", "expires_in": 3599, "token_type": "Bearer"}
+
+        @app.get("/userinfo")
+        async def userinfo(request: Request):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            auth = request.headers.get("authorization", "")
+            if not auth.startswith("Bearer ya29."):
+                return ORJSONResponse({"error": "invalid_token"}, status_code=401)
+            sub = auth.removeprefix("Bearer ya29.")
+            return {"sub": sub, "email": f"{sub}@example.com", "name": f"Kid {sub}", "email_verified": True}
+
+        return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9200)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--max-age", type=int, default=3600)
+    args = parser.parse_args()
+    uvicorn.run(GoogleStub(max_age=args.max_age, latency=args.latency).create_app(), host="127.0.0.1", port=args.port)
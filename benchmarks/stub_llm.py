@@ -0,0 +1,145 @@
+"""
+Локальная заглушка OpenAI-совместимого LLM для бенчмарков.
+Запуск отдельно: python -m benchmarks.stub_llm --port 9100 --latency 0.05
+"""
+
+import argparse
+import asyncio
+import math
+import random
+import time
+
+import orjson
+import uvicorn
+from fastapi import FastAPI, Request
+from starlette.requests import ClientDisconnect
+from fastapi.responses import Response, StreamingResponse
+
+DEFAULT_REPLY = {
+    "role": "ayya",
+    "say": "Давай посчитаем яблоки вместе! Один, два, три.",
+    "animations": ["яблоки появляются"],
+    "next_task": "Посчитай игрушки",
+}
+
+
+def create_app(
+    latency: float = 0.05,
+    reply: dict | None = None,
+    token_delay: float = 0.01,
+    prompt_token_latency: float = 0.0,
+    rate_limit: int = 0,
+    rate_window: float = 1.0,
+    tail_latency: float = 0.0,
+    tail_ratio: float = 0.0,
+    models: dict[str, dict] | None = None,
+) -> FastAPI:
+    """
+    Создаёт приложение-заглушку с фиксированной задержкой ответа.
+    prompt_token_latency добавляет задержку на каждый ~токен промпта (4 байта тела).
+    При "stream": true отдаёт ответ SSE-чанками по 4 символа с паузой token_delay.
+    rate_limit > 0 — не больше rate_limit запросов за окно rate_window секунд, как у Groq:
+    заголовки x-ratelimit-* в каждом ответе, сверх лимита — 429 с retry-after.
+    tail_ratio — доля ответов (случайных, но воспроизводимых) с задержкой tail_latency вместо latency.
+    models — поведение по полю "model" запроса: {"имя": {"latency": ..., "reply": ..., "invalid_ratio": ...}};
+    invalid_ratio — доля ответов с обрезанным (невалидным) JSON, status — код ошибки провайдера
+    вместо ответа (после задержки). usage — по ~4 байта на токен.
+    """
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.prompt_token_latency = prompt_token_latency
+    app.state.token_delay = token_delay
+    app.state.reply = reply or DEFAULT_REPLY
+    app.state.requests = 0
+    app.state.rate_limit = rate_limit
+    app.state.rate_window = rate_window
+    app.state.window_started = time.monotonic()
+    app.state.window_requests = 0
+    app.state.rejected = 0
+    app.state.inflight = 0
+    app.state.max_inflight = 0
+    app.state.tail_latency = tail_latency
+    app.state.tail_ratio = tail_ratio
+    app.state.rng = random.Random(0)
+    app.state.authorization = None  # заголовок последнего запроса (проверка смены ключа)
+    app.state.models = models or {}
+    app.state.model_requests = {}  # запросов по полю "model"
+
+    def rate_limit_headers() -> tuple[bool, dict]:
+        """(превышен ли лимит, заголовки) — фиксированное окно"""
+        if not app.state.rate_limit:
+            return False, {}
+        now = time.monotonic()
+        if now - app.state.window_started >= app.state.rate_window:
+            app.state.window_started, app.state.window_requests = now, 0
+        reset = app.state.window_started + app.state.rate_window - now
+        allowed = app.state.window_requests < app.state.rate_limit
+        if allowed:
+            app.state.window_requests += 1
+        headers = {
+            "x-ratelimit-limit-requests": str(app.state.rate_limit),
+            "x-ratelimit-remaining-requests": str(app.state.rate_limit - app.state.window_requests),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }
+        if not allowed:
+            headers["retry-after"] = str(max(1, math.ceil(reset)))
+        return not allowed, headers
+
+    async def stream_chunks(content: str):
+        for i in range(0, len(content), 4):
+            chunk = {"choices": [{"index": 0, "delta": {"content": content[i:i + 4]}}]}
+            yield b"data: " + orjson.dumps(chunk) + b"\n\n"
+            await asyncio.sleep(app.state.token_delay)
+        yield b"data: [DONE]\n\n"
+
+    @app.post("/chat/completions")
+    async def chat_completions(request: Request):
+        try:
+            raw = await request.body()
+        except ClientDisconnect:
+            return Response(status_code=499)  # клиент отменил запрос (проигравший дубль)
+        body = orjson.loads(raw)
+        app.state.requests += 1
+        model = app.state.models.get(body.get("model"), {})
+        app.state.model_requests[body.get("model")] = app.state.model_requests.get(body.get("model"), 0) + 1
+        app.state.authorization = request.headers.get("authorization")
+        limited, headers = rate_limit_headers()
+        if limited:
+            app.state.rejected += 1
+            error = {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}}
+            return Response(orjson.dumps(error), status_code=429, media_type="application/json", headers=headers)
+        app.state.inflight += 1
+        app.state.max_inflight = max(app.state.max_inflight, app.state.inflight)
+        try:
+            tail = app.state.tail_ratio and app.state.rng.random() < app.state.tail_ratio
+            latency = app.state.tail_latency if tail else model.get("latency", app.state.latency)
+            await asyncio.sleep(latency + app.state.prompt_token_latency * len(raw) / 4)
+        finally:
+            app.state.inflight -= 1
+        if model.get("status"):
+            error = {"error": {"message": "Upstream error", "type": "server_error"}}
+            return Response(orjson.dumps(error), status_code=model["status"], media_type="application/json", headers=headers)
+        content = orjson.dumps(model.get("reply", app.state.reply)).decode()
+        if model.get("invalid_ratio") and app.state.rng.random() < model["invalid_ratio"]:
+            content = content[:len(content) // 2]
+        if body.get("stream"):
+            return StreamingResponse(stream_chunks(content), media_type="text/event-stream", headers=headers)
+        data = {
+            "id": f"stub-{app.state.requests}",
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(raw) // 4, "completion_tokens": len(content.encode()) // 4},
+        }
+        return Response(orjson.dumps(data), media_type="application/json", headers=headers)
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--rate-limit", type=int, default=0, help="запросов за окно (0 — без лимита)")
+    parser.add_argument("--rate-window", type=float, default=1.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, rate_limit=args.rate_limit, rate_window=args.rate_window), host="127.0.0.1", port=args.port)
@@ -0,0 +1,25 @@
+"""Скользящий конспект сессии: chat_sessions.summary / summary_upto_id
+
+IF NOT EXISTS — колонки могли уже появиться в базах, созданных через create_all.
+
+Revision ID: 0002_session_summary
+Revises: 0001_initial
+Create Date: 2026-10-17
+"""
+from alembic import op
+
+
+revision = "0002_session_summary"
+down_revision = "0001_initial"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary TEXT")
+    op.execute("ALTER TABLE chat_sessions ADD COLUMN IF NOT EXISTS summary_upto_id INTEGER")
+
+
+def downgrade() -> None:
+    op.drop_column("chat_sessions", "summary_upto_id")
+    op.drop_column("chat_sessions", "summary")
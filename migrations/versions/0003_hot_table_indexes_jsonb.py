@@ -0,0 +1,61 @@
+"""Индексы горячих таблиц и JSONB
+
+- messages (session_id, created_at): загрузка истории сессии без seq scan;
+- chat_sessions (user_id, created_at): список/количество сессий ребёнка;
+- projects (session_id): каскадное удаление сессий без seq scan по projects;
+- meta/plan/data: JSON -> JSONB; GIN (jsonb_path_ops) только на projects.data —
+  по messages.meta никто не ищет, а GIN удорожал бы каждую запись хода.
+
+Индексы создаются CONCURRENTLY, чтобы не блокировать запись на живой базе.
+
+Revision ID: 0003_hot_table_indexes_jsonb
+Revises: 0002_session_summary
+Create Date: 2026-10-17
+"""
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+revision = "0003_hot_table_indexes_jsonb"
+down_revision = "0002_session_summary"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.alter_column("messages", "meta", type_=postgresql.JSONB(), postgresql_using="meta::jsonb")
+    op.alter_column("projects", "plan", type_=postgresql.JSONB(), postgresql_using="plan::jsonb")
+    op.alter_column("projects", "data", type_=postgresql.JSONB(), postgresql_using="data::jsonb")
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_messages_session_id_created_at", "messages", ["session_id", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_chat_sessions_user_id_created_at", "chat_sessions", ["user_id", "created_at"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_projects_session_id", "projects", ["session_id"],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            "ix_projects_data_gin", "projects", ["data"],
+            postgresql_using="gin", postgresql_ops={"data": "jsonb_path_ops"},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table in (
+            ("ix_projects_data_gin", "projects"),
+            ("ix_projects_session_id", "projects"),
+            ("ix_chat_sessions_user_id_created_at", "chat_sessions"),
+            ("ix_messages_session_id_created_at", "messages"),
+        ):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+    op.alter_column("projects", "data", type_=postgresql.JSON(), postgresql_using="data::json")
+    op.alter_column("projects", "plan", type_=postgresql.JSON(), postgresql_using="plan::json")
+    op.alter_column("messages", "meta", type_=postgresql.JSON(), postgresql_using="meta::json")
@@ -0,0 +1,117 @@
+"""messages: помесячные партиции по created_at и таблица архива
+
+Таблица пересоздаётся как PARTITION BY RANGE (created_at) и данные копируются
+в партиции — на большой базе это окно обслуживания (запись в messages
+блокируется до конца миграции). Первичный ключ становится (id, created_at):
+ключ партиции обязан входить в уникальные ограничения.
+
+Партиции создаются от месяца самого старого сообщения до текущего + MESSAGES_PARTITIONS_AHEAD;
+дальше их поддерживает фоновая задача (app/archive.py).
+
+Revision ID: 0004_partition_messages
+Revises: 0003_hot_table_indexes_jsonb
+Create Date: 2026-10-17
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import settings
+
+
+revision = "0004_partition_messages"
+down_revision = "0003_hot_table_indexes_jsonb"
+branch_labels = None
+depends_on = None
+
+
+def _month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    op.execute("ALTER TABLE messages RENAME TO messages_unpartitioned")
+    op.execute("ALTER INDEX messages_pkey RENAME TO messages_unpartitioned_pkey")
+    op.execute("ALTER INDEX ix_messages_session_id_created_at RENAME TO ix_messages_unpartitioned_session_id_created_at")
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq'),
+            session_id INTEGER NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            role VARCHAR(32) NOT NULL,
+            content TEXT NOT NULL,
+            meta JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+        """
+    )
+    op.execute("CREATE INDEX ix_messages_session_id_created_at ON messages (session_id, created_at)")
+
+    oldest = conn.execute(sa.text("SELECT min(created_at) FROM messages_unpartitioned")).scalar()
+    now = datetime.utcnow()
+    month = _month_start(min(oldest, now) if oldest else now)
+    last = _month_start(now)
+    for _ in range(settings.MESSAGES_PARTITIONS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        upper = _next_month(month)
+        op.execute(
+            f"CREATE TABLE messages_p{month:%Y%m} PARTITION OF messages "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        )
+        month = upper
+
+    op.execute(
+        "INSERT INTO messages (id, session_id, role, content, meta, created_at) "
+        "SELECT id, session_id, role, content, meta, created_at FROM messages_unpartitioned"
+    )
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("DROP TABLE messages_unpartitioned")
+
+    op.create_table(
+        "message_archives",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("partition", sa.String(64), nullable=False),
+        sa.Column("range_from", sa.DateTime(), nullable=False),
+        sa.Column("range_to", sa.DateTime(), nullable=False),
+        sa.Column("path", sa.String(512), nullable=False),
+        sa.Column("rows", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("partition", name="message_archives_partition_key"),
+    )
+    op.create_index("ix_message_archives_range_to", "message_archives", ["range_to"])
+
+
+def downgrade() -> None:
+    # архивированные месяцы остаются в файлах: обратно в базу возвращаются только живые партиции
+    op.drop_index("ix_message_archives_range_to", table_name="message_archives")
+    op.drop_table("message_archives")
+    op.execute("ALTER TABLE messages RENAME TO messages_partitioned")
+    op.execute("ALTER INDEX ix_messages_session_id_created_at RENAME TO ix_messages_partitioned_session_id_created_at")
+    op.execute("ALTER INDEX messages_pkey RENAME TO messages_partitioned_pkey")
+    op.execute(
+        """
+        CREATE TABLE messages (
+            id INTEGER NOT NULL DEFAULT nextval('messages_id_seq') PRIMARY KEY,
+            session_id INTEGER NOT NULL REFERENCES chat_sessions (id) ON DELETE CASCADE,
+            role VARCHAR(32) NOT NULL,
+            content TEXT NOT NULL,
+            meta JSONB,
+            created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL
+        )
+        """
+    )
+    op.execute(
+        "INSERT INTO messages (id, session_id, role, content, meta, created_at) "
+        "SELECT id, session_id, role, content, meta, created_at FROM messages_partitioned"
+    )
+    op.execute("CREATE INDEX ix_messages_session_id_created_at ON messages (session_id, created_at)")
+    op.execute("ALTER SEQUENCE messages_id_seq OWNED BY messages.id")
+    op.execute("DROP TABLE messages_partitioned")
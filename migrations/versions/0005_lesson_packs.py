@@ -0,0 +1,37 @@
+"""lesson_packs: заранее сгенерированные первые ходы урока по темам
+
+Версия пакета растёт в пределах темы; prompt_hash — хэш промптов app/prompts.py,
+с которыми пакет сгенерирован (см. app/lesson_packs.py).
+
+Revision ID: 0005_lesson_packs
+Revises: 0004_partition_messages
+Create Date: 2026-10-17
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import JSONB
+
+
+revision = "0005_lesson_packs"
+down_revision = "0004_partition_messages"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "lesson_packs",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("topic", sa.String(128), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("prompt_hash", sa.String(32), nullable=False),
+        sa.Column("turns", JSONB(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.UniqueConstraint("topic", "version", name="lesson_packs_topic_version_key"),
+    )
+    op.create_index("ix_lesson_packs_prompt_hash", "lesson_packs", ["prompt_hash"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_lesson_packs_prompt_hash", table_name="lesson_packs")
+    op.drop_table("lesson_packs")
@@ -9,6 +9,8 @@ import httpx
 import json
 
 BASE_URL = "http://localhost:8000/api/v1"
+# при APP_DEBUG токеном может быть сам uid
+AUTH = {"Authorization": "Bearer demo123"}
 
 async def test_health():
     """Тест health endpoint"""
@@ -28,11 +30,11 @@ async def test_auth():
 
 async def test_lesson():
     """Тест уроков"""
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(headers=AUTH) as client:
         # Создание сессии
         response = await client.post(
             f"{BASE_URL}/lesson/create-session",
-            json={"user_uid": "demo123", "topic": "Математика для малышей"}
+            json={"topic": "Математика для малышей"}
         )
         print(f"✅ Create session: {response.status_code} - {response.json()}")
         
@@ -44,7 +46,6 @@ async def test_lesson():
             turn_response = await client.post(
                 f"{BASE_URL}/lesson/turn",
                 json={
-                    "user_uid": "demo123",
                     "session_id": session_id,
                     "messages": [
                         {"role": "user", "content": "Почему 2+2=4?"}
@@ -60,11 +61,11 @@ async def test_lesson():
 
 async def test_project():
     """Тест проектов"""
-    async with httpx.AsyncClient() as client:
+    async with httpx.AsyncClient(headers=AUTH) as client:
         # Сначала создаем сессию
         session_response = await client.post(
             f"{BASE_URL}/lesson/create-session",
-            json={"user_uid": "demo123", "topic": "Проект"}
+            json={"topic": "Проект"}
         )
         
         if session_response.status_code == 200:
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Единая зависимость авторизации: подпись токена проверяется один раз,
+пользователь берётся из кэша процесса. База не нужна — вместо сессии счётчик запросов.
+Запуск: python -m pytest -q test_auth_cache.py
+"""
+
+import asyncio
+from datetime import timedelta
+
+import jwt
+import pytest
+from fastapi import HTTPException
+
+from app import deps
+from app.deps import create_access_token, get_current_user
+
+
+class CountingDB:
+    def __init__(self, row):
+        self.row = row
+        self.queries = 0
+
+    async def execute(self, q):
+        self.queries += 1
+        row = self.row
+
+        class Result:
+            def one_or_none(self):
+                return row
+        return Result()
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    deps.local_claims.clear()
+    deps.local_users.clear()
+    yield
+    deps.local_claims.clear()
+    deps.local_users.clear()
+
+
+def current_user(token: str, db) -> deps.CurrentUser:
+    return asyncio.run(get_current_user(authorization=f"Bearer {token}", db=db))
+
+
+def test_token_is_verified_once_and_user_loaded_once(monkeypatch):
+    decoded = []
+    real_decode = jwt.decode
+    monkeypatch.setattr(deps.jwt, "decode", lambda *a, **kw: decoded.append(1) or real_decode(*a, **kw))
+    db = CountingDB((7, None, "kid", "kid@example.com"))
+    token = create_access_token({"user_id": 7, "username": "kid"})
+
+    users = [current_user(token, db) for _ in range(5)]
+    assert users[0] == deps.CurrentUser(7, None, "kid", "kid@example.com")
+    assert len(decoded) == 1 and db.queries == 1
+
+    # новый токен того же пользователя: подпись проверяется, база — нет
+    current_user(create_access_token({"user_id": 7}, timedelta(hours=1)), db)
+    assert len(decoded) == 2 and db.queries == 1
+
+
+def test_google_uid_tokens_resolve_by_uid():
+    db = CountingDB((3, "google:42", "kid", "kid@example.com"))
+    assert current_user(create_access_token({"uid": "google:42"}), db).id == 3
+
+
+def test_rejected_tokens(monkeypatch):
+    monkeypatch.setattr(deps.settings, "APP_DEBUG", False)
+    db = CountingDB((7, None, "kid", "kid@example.com"))
+    for token in (
+        create_access_token({"user_id": 7}, timedelta(seconds=-1)),
+        create_access_token({"user_id": 7, "type": "refresh"}),
+        jwt.encode({"user_id": 7}, "другой секрет", algorithm="HS256"),
+        "не-jwt",
+    ):
+        with pytest.raises(HTTPException) as e:
+            current_user(token, db)
+        assert e.value.status_code == 401
+    assert db.queries == 0 and len(deps.local_claims) == 0
+
+    with pytest.raises(HTTPException):
+        current_user(create_access_token({"user_id": 8}), CountingDB(None))
+    assert len(deps.local_users) == 0
+
+
+def test_debug_accepts_raw_uid(monkeypatch):
+    monkeypatch.setattr(deps.settings, "APP_DEBUG", True)
+    db = CountingDB((5, "demo123", "demo", "demo@example.com"))
+    assert current_user("demo123", db).uid == "demo123"
+    with pytest.raises(HTTPException):
+        asyncio.run(get_current_user(authorization="Basic abc", db=db))
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Учёт пула Postgres (app/db.py, TimedQueuePool): таймаутом считается только
+TimeoutError пула, ошибка подключения пробрасывается без учёта, а время
+установки соединения не входит в ожидание.
+Тест с таймаутом нужен локальный Postgres (DB_*); без него — пропускается.
+Запуск: python -m pytest -q test_db_pool.py
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.db import DATABASE_URL, TimedQueuePool
+
+
+def pool_engine(url, **kwargs):
+    return create_async_engine(url, poolclass=TimedQueuePool, pool_size=1, max_overflow=0, **kwargs)
+
+
+def test_connection_error_is_not_a_timeout():
+    async def scenario():
+        # порт 1 никто не слушает: ошибка подключения, а не ожидание пула
+        engine = pool_engine(make_url(DATABASE_URL).set(port=1), pool_timeout=0.2)
+        try:
+            with pytest.raises(OSError):
+                async with engine.connect():
+                    pass
+            return engine.pool.stats()
+        finally:
+            await engine.dispose()
+
+    stats = asyncio.run(scenario())
+    assert stats["timeouts"] == 0 and stats["waits"] == 0
+
+
+def test_checkout_timeout_is_counted():
+    async def scenario():
+        engine = pool_engine(DATABASE_URL, pool_timeout=0.2)
+        try:
+            async with engine.connect() as held:
+                await held.execute(text("SELECT 1"))
+                connect_wait = engine.pool.stats()["wait_max_ms"]
+                with pytest.raises(exc.TimeoutError):
+                    async with engine.connect():
+                        pass
+            return connect_wait, engine.pool.stats()
+        finally:
+            await engine.dispose()
+
+    try:
+        connect_wait, stats = asyncio.run(scenario())
+    except OSError as e:
+        pytest.skip(f"локальный Postgres недоступен: {e}")
+    # первое соединение создавалось, но свободный слот был сразу — ожидания почти нет
+    assert connect_wait < 5
+    assert stats["timeouts"] == 1 and stats["waits"] == 2
+    assert stats["wait_max_ms"] >= 200
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Очередь писем (app/email_service.py) против локального SMTP-приёмника
+(benchmarks/smtp_sink.py): все письма доходят по EMAIL_WORKERS соединениям,
+воркер переподключается после обрыва, stop() дожидается очереди.
+Запуск: python -m pytest -q test_email_service.py
+"""
+
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.email_service import EmailService
+from benchmarks.smtp_sink import SMTPSink
+
+WORKERS = 3
+
+
+@pytest.fixture
+def smtp_settings(monkeypatch):
+    def configure(sink: SMTPSink) -> None:
+        monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+        monkeypatch.setattr(settings, "SMTP_PORT", sink.port)
+        monkeypatch.setattr(settings, "SMTP_TLS", False)
+        monkeypatch.setattr(settings, "SMTP_PASSWORD", "")
+        monkeypatch.setattr(settings, "SMTP_USER", "ayana@example.com")
+        monkeypatch.setattr(settings, "GOOGLE_REFRESH_TOKEN", None)
+        monkeypatch.setattr(settings, "EMAIL_WORKERS", WORKERS)
+    return configure
+
+
+def recipients(sink: SMTPSink) -> list[str]:
+    return sorted(m["rcpt"][0] for m in sink.messages)
+
+
+def addresses(start: int, stop: int) -> list[str]:
+    return sorted(f"kid{i}@example.com" for i in range(start, stop))
+
+
+def test_all_emails_over_bounded_connections(smtp_settings):
+    async def scenario():
+        async with SMTPSink(delay=0.005) as sink:
+            smtp_settings(sink)
+            service = EmailService()
+            assert all(service.send_verification_email(a, "1234567") for a in addresses(0, 40))
+            await service.join()
+            await service.stop()
+            return sink, service
+
+    sink, service = asyncio.run(scenario())
+    assert recipients(sink) == addresses(0, 40)
+    assert service.sent == 40 and service.failed == 0
+    assert sink.connections <= WORKERS and service.connections_opened == sink.connections
+
+
+def test_worker_reconnects_after_server_drops_connection(smtp_settings):
+    async def scenario():
+        async with SMTPSink() as sink:
+            smtp_settings(sink)
+            service = EmailService()
+            for a in addresses(0, 10):
+                service.send_password_reset_email(a, "1234567")
+            await service.join()
+            opened = sink.connections
+            # сервер закрыл соединения по простою: следующее письмо воркера упирается в обрыв
+            sink.drop_connections()
+            await asyncio.sleep(0.05)
+            for a in addresses(10, 20):
+                service.send_password_reset_email(a, "1234567")
+            await service.join()
+            await service.stop()
+            return sink, service, opened
+
+    sink, service, opened = asyncio.run(scenario())
+    assert recipients(sink) == addresses(0, 20)
+    assert service.sent == 20 and service.failed == 0
+    assert opened < sink.connections <= 2 * WORKERS
+
+
+def test_stop_drains_queue(smtp_settings):
+    async def scenario():
+        async with SMTPSink(delay=0.01) as sink:
+            smtp_settings(sink)
+            service = EmailService()
+            for a in addresses(0, 30):
+                service.send_verification_email(a, "1234567")
+            depth = service.queue_depth()
+            await service.stop()
+            return sink, service, depth
+
+    sink, service, depth = asyncio.run(scenario())
+    assert depth == 30
+    assert recipients(sink) == addresses(0, 30) and service.sent == 30
+    assert service.queue_depth() == 0 and not service._workers
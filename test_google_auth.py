@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Проверка Google ID token по закэшированным ключам (app/google_auth.py).
+Ключи отдаёт локальная заглушка JWKS — сеть и Google не нужны.
+Запуск: python -m pytest -q test_google_auth.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.google_auth import cache_ttl, google_keys, verify_google_id_token
+from app.http_clients import http_clients
+from benchmarks.common import serve
+from benchmarks.stub_google import GoogleStub
+
+CLIENT_ID = "ayana-test.apps.googleusercontent.com"
+
+
+@pytest.fixture(scope="module")
+def stub():
+    return GoogleStub(bits=1024, max_age=600)
+
+
+@pytest.fixture(autouse=True)
+def env(stub, monkeypatch):
+    monkeypatch.setattr(settings, "GOOGLE_CLIENT_ID", CLIENT_ID)
+    monkeypatch.setattr(settings, "GOOGLE_JWKS_URL", settings.GOOGLE_JWKS_URL)
+    google_keys.clear()
+    stub.requests = 0
+    yield
+    google_keys.clear()
+
+
+def run(stub, scenario):
+    async def wrapper():
+        async with serve(stub.create_app()) as url:
+            settings.GOOGLE_JWKS_URL = url + "/certs"
+            try:
+                return await scenario(url)
+            finally:
+                await google_keys.stop()
+                await http_clients.aclose()
+    return asyncio.run(wrapper())
+
+
+def test_keys_are_fetched_once_and_reused(stub):
+    async def scenario(url):
+        for i in range(5):
+            idinfo = await verify_google_id_token(stub.id_token(f"kid{i}", CLIENT_ID))
+            assert idinfo["sub"] == f"kid{i}"
+        assert stub.requests == 1
+        # срок из Cache-Control истёк — ключи перекачиваются
+        google_keys.expires_at = 0
+        await verify_google_id_token(stub.id_token("kid", CLIENT_ID))
+        assert stub.requests == 2
+
+    run(stub, scenario)
+
+
+def test_bad_tokens_are_rejected(stub):
+    async def scenario(url):
+        good = stub.id_token("kid", CLIENT_ID)
+        for token in (
+            stub.id_token("kid", "someone-else"),
+            stub.id_token("kid", CLIENT_ID, ttl=-3600),
+            stub.id_token("kid", CLIENT_ID, iss="https://evil.example.com"),
+            good[:-4] + ("AAAA" if not good.endswith("AAAA") else "BBBB"),
+        ):
+            with pytest.raises(ValueError):
+                await verify_google_id_token(token)
+
+    run(stub, scenario)
+
+
+def test_rotated_key_triggers_one_refresh(stub, monkeypatch):
+    async def scenario(url):
+        await verify_google_id_token(stub.id_token("kid", CLIENT_ID))
+        stub.rotate()
+        token = stub.id_token("kid", CLIENT_ID)
+        # внеочередное обновление не чаще GOOGLE_JWKS_MIN_REFRESH_SECONDS
+        with pytest.raises(ValueError):
+            await verify_google_id_token(token)
+        assert stub.requests == 1
+        monkeypatch.setattr(settings, "GOOGLE_JWKS_MIN_REFRESH_SECONDS", 0)
+        await asyncio.gather(*(verify_google_id_token(token) for _ in range(10)))
+        assert stub.requests == 2
+
+    run(stub, scenario)
+
+
+def test_previous_keys_survive_an_outage(stub):
+    token = stub.id_token("kid", CLIENT_ID)
+
+    async def warm(url):
+        await verify_google_id_token(token)
+    run(stub, warm)
+
+    async def outage():
+        settings.GOOGLE_JWKS_URL = "http://127.0.0.1:9/certs"
+        google_keys.expires_at = 0
+        try:
+            assert (await verify_google_id_token(token))["sub"] == "kid"
+        finally:
+            await google_keys.stop()
+            await http_clients.aclose()
+    asyncio.run(outage())
+
+
+def test_cache_ttl_from_headers():
+    assert cache_ttl(httpx.Headers({"Cache-Control": "public, max-age=21600, must-revalidate"})) == 21600
+    assert cache_ttl(httpx.Headers({"Cache-Control": "max-age=600", "Age": "100"})) == 500
+    assert cache_ttl(httpx.Headers({"Cache-Control": "no-store"})) == settings.GOOGLE_JWKS_DEFAULT_TTL_SECONDS
+    assert cache_ttl(httpx.Headers({})) == settings.GOOGLE_JWKS_DEFAULT_TTL_SECONDS
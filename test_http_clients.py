@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Общие исходящие HTTP-клиенты (app/http_clients.py) против локальных заглушек Google:
+переиспользование соединений, лимит на хост, повторы с jitter.
+Запуск: python -m pytest -q test_http_clients.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.http_clients import HTTPClients
+from benchmarks.common import free_port, serve
+from benchmarks.stub_google import GoogleStub
+
+
+@pytest.fixture(scope="module")
+def stub():
+    return GoogleStub(bits=1024)
+
+
+def run(stub, scenario, hosts: int = 1):
+    async def wrapper():
+        clients = HTTPClients()
+        urls = []
+        try:
+            async with serve(stub.create_app()) as first:
+                urls.append(first)
+                if hosts == 1:
+                    return await scenario(clients, urls)
+                # второй «хост» — та же заглушка на другом порту
+                async with serve(stub.create_app()) as second:
+                    urls.append(second)
+                    return await scenario(clients, urls)
+        finally:
+            await clients.aclose()
+    stub.fail_next = 0
+    stub.calls.clear()
+    return asyncio.run(wrapper())
+
+
+def test_connections_are_reused_per_host(stub):
+    async def scenario(clients, urls):
+        token_url, userinfo_url = urls[0] + "/token", urls[1] + "/userinfo"
+        for i in range(10):
+            # как google_callback: обмен кода и профиль — на разных хостах
+            token = (await clients.request("POST", token_url, data={"grant_type": "authorization_code", "code": f"kid-{i}"})).json()
+            resp = await clients.request("GET", userinfo_url, headers={"Authorization": f"Bearer {token['access_token']}"})
+            assert resp.json()["sub"] == f"kid-{i}"
+        stats = clients.stats()
+        assert [s["connections_opened"] for s in stats.values()] == [1, 1]
+        assert all(s["requests"] == 10 and s["reused"] == 9 for s in stats.values())
+
+    run(stub, scenario, hosts=2)
+
+
+def test_per_host_connection_limit(stub):
+    stub.latency = 0.05
+    try:
+        async def scenario(clients, urls):
+            clients.configure(urls[0], max_connections=2, max_keepalive_connections=2)
+            await asyncio.gather(*(
+                clients.request("POST", urls[0] + "/token", data={"grant_type": "authorization_code", "code": "kid"})
+                for _ in range(10)
+            ))
+            assert clients.stats()[urls[0]]["connections_opened"] == 2
+
+        run(stub, scenario)
+    finally:
+        stub.latency = 0.0
+
+
+def test_idempotent_requests_are_retried(stub):
+    async def scenario(clients, urls):
+        clients.configure(urls[0], retries=2, backoff=0.01)
+        stub.fail_next = 2
+        resp = await clients.request("GET", urls[0] + "/userinfo", headers={"Authorization": "Bearer ya29.kid"})
+        assert resp.status_code == 200 and clients.stats()[urls[0]]["retries"] == 2
+
+        # одноразовый код не отправляется повторно после ответа сервера
+        stub.fail_next = 1
+        resp = await clients.request("POST", urls[0] + "/token", data={"grant_type": "authorization_code", "code": "kid"})
+        assert resp.status_code == 503 and clients.stats()[urls[0]]["retries"] == 2
+
+        # а обмен refresh_token — можно
+        stub.fail_next = 1
+        resp = await clients.request("POST", urls[0] + "/token", data={"grant_type": "refresh_token"}, idempotent=True)
+        assert resp.status_code == 200 and clients.stats()[urls[0]]["retries"] == 3
+
+    run(stub, scenario)
+
+
+def test_connect_errors_are_retried_then_raised():
+    async def scenario():
+        clients = HTTPClients()
+        url = f"http://127.0.0.1:{free_port()}/token"
+        clients.configure(url, retries=2, backoff=0.01)
+        try:
+            with pytest.raises(httpx.ConnectError):
+                await clients.request("POST", url, data={"grant_type": "authorization_code"})
+            stats = clients.stats()[clients.origin(url)]
+            assert stats["requests"] == 3 and stats["retries"] == 2 and stats["failures"] == 1
+        finally:
+            await clients.aclose()
+
+    asyncio.run(scenario())
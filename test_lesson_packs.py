@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Пакеты уроков (app/lesson_packs.py): первые ходы по теме генерируются заранее
+через orchestrate_turn (не больше LESSON_PACK_CONCURRENCY тем сразу), отдаются
+без LLM, пока диалог идёт по сценарию, и перестают отдаваться после правки промптов.
+
+Тесты с базой создают отдельную базу <DB_NAME>_packs и накатывают миграции;
+без Postgres — пропускаются.
+Запуск: python -m pytest -q test_lesson_packs.py
+"""
+
+import asyncio
+import os
+
+import orjson
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import ai, lesson_packs as lp, prompts
+from app.db import DATABASE_URL
+from app.lesson_packs import LessonPacks
+
+TURNS = [
+    {"user": "Давай изучим тему: космос", "reply": {"role": "ayya", "say": "Привет! Полетим к звёздам?", "animations": ["ракета"]}},
+    {"user": "Да!", "reply": {"role": "ayana", "say": "А звёзды горячие?"}},
+]
+
+
+def user(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+
+def assistant(role: str, say: str) -> dict:
+    return {"role": "assistant", "content": orjson.dumps({"role": role, "say": say}).decode()}
+
+
+def fake_llm(monkeypatch, delay: float = 0.0):
+    calls, state = [], {"active": 0, "peak": 0}
+
+    async def fake_completion(messages, flow=None):
+        state["active"] += 1
+        state["peak"] = max(state["peak"], state["active"])
+        await asyncio.sleep(delay)
+        state["active"] -= 1
+        calls.append(messages[-1]["content"])
+        return {"role": "ayya", "say": f"ответ {len(calls)} на: {messages[-1]['content']}"}
+
+    monkeypatch.setattr(ai, "chat_completion", fake_completion)
+    return calls, state
+
+
+def test_pack_serves_scripted_dialog_only(monkeypatch):
+    packs = LessonPacks()
+    packs.install([("космос", 1, TURNS)], "h")
+    monkeypatch.setattr(ai, "lesson_packs", packs)
+    calls, _ = fake_llm(monkeypatch)
+
+    async def scenario():
+        first = await ai.orchestrate_turn([user("давай изучим тему КОСМОС!")])
+        # ответ из истории приходит без animations — сравнивается только реплика
+        second = await ai.orchestrate_turn([user("Давай изучим тему: космос"), assistant("ayya", "Привет! Полетим к звёздам?"),
+                                            user("да")])
+        chunks = [c async for c in ai.orchestrate_turn_stream([user("Давай изучим тему: космос")])]
+        # ребёнок ответил иначе / ответ был сгенерирован вживую / есть конспект — в LLM
+        await ai.orchestrate_turn([user("Давай изучим тему: космос"), assistant("ayya", "Привет! Полетим к звёздам?"),
+                                   user("нет, про динозавров")])
+        await ai.orchestrate_turn([user("Давай изучим тему: космос"), assistant("ayya", "Здравствуй!"), user("Да!")])
+        await ai.orchestrate_turn([user("Давай изучим тему: космос")], summary="конспект")
+        return first, second, chunks
+
+    first, second, chunks = asyncio.run(scenario())
+    assert first == TURNS[0]["reply"] and second == TURNS[1]["reply"]
+    assert orjson.loads(chunks[0]) == TURNS[0]["reply"]
+    assert len(calls) == 3
+    assert packs.hits == 3 and packs.misses == 2
+
+
+def test_prompt_hash_follows_prompts(monkeypatch):
+    before = lp.prompt_hash()
+    monkeypatch.setattr(prompts, "ROLE_AYYA", prompts.ROLE_AYYA + " Говори стихами.")
+    assert lp.prompt_hash() != before
+
+
+@pytest.fixture(scope="module")
+def packs_db():
+    base_url = make_url(DATABASE_URL)
+    url = base_url.set(database=f"{base_url.database}_packs")
+
+    async def recreate() -> None:
+        admin = create_async_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+        try:
+            async with admin.connect() as conn:
+                await conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+                await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+        finally:
+            await admin.dispose()
+
+    try:
+        asyncio.run(recreate())
+    except Exception as e:
+        pytest.skip(f"локальный Postgres недоступен: {e}")
+
+    cfg = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    cfg.set_main_option("sqlalchemy.url", url.render_as_string(hide_password=False).replace("%", "%%"))
+    command.upgrade(cfg, "head")
+    yield url
+
+
+def run(coro_fn, url):
+    async def wrapper():
+        engine = create_async_engine(url)
+        try:
+            return await coro_fn(engine)
+        finally:
+            await engine.dispose()
+    return asyncio.run(wrapper())
+
+
+def test_generate_load_and_invalidate(packs_db, monkeypatch):
+    calls, state = fake_llm(monkeypatch, delay=0.02)
+    packs = LessonPacks()
+    monkeypatch.setattr(ai, "lesson_packs", packs)
+    topics = ["космос", "числа", "цвета", "животные"]
+
+    async def generate(engine):
+        async with engine.begin() as conn:
+            await conn.execute(text("TRUNCATE lesson_packs"))
+        versions = await lp.generate_packs(topics, engine, turns=3, concurrency=2)
+        await packs.load(engine)
+        served = await ai.orchestrate_turn([user("Давай изучим тему: числа")])
+        return versions, served
+
+    versions, served = run(generate, packs_db)
+    assert versions == {t: 1 for t in topics}
+    assert len(calls) == 12 and state["peak"] == 2  # ходы темы — по очереди, темы — по две сразу
+    assert packs.snapshot()["topics"] == 4 and packs.snapshot()["turns"] == 12
+    # отдан из пакета, без вызова LLM
+    assert served["say"].endswith("на: Давай изучим тему: числа") and len(calls) == 12
+
+    # правка промптов: старые пакеты больше не подходят и догенерируются новой версией
+    monkeypatch.setattr(prompts, "ROLE_AYANA", prompts.ROLE_AYANA + " Говори короче.")
+
+    async def after_prompt_change(engine):
+        await packs.load(engine)
+        stale = packs.snapshot()["topics"]
+        missing = await lp.missing_topics(engine, topics)
+        versions = await lp.ensure_packs(topics[:2], engine)
+        pruned = await lp.prune_packs(engine)
+        await packs.load(engine)
+        return stale, missing, versions, pruned
+
+    stale, missing, versions, pruned = run(after_prompt_change, packs_db)
+    assert stale == 0 and missing == topics
+    assert versions == {"космос": 2, "числа": 2}
+    assert pruned == 4 and packs.versions == {"космос": 2, "числа": 2}
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Потоковый ход урока: разбор JSON оркестратора по кускам (app/json_stream.py)
+и POST /lesson/turn/stream (порядок событий SSE, сохранённый ответ); тема
+сессии для семантического кэша на ходах /turn и /turn/stream; session_id
+в ответе /turn продолжает ту же сессию с её историей.
+
+LLM — заглушка benchmarks/stub_llm.py, Redis — FakeRedis. Тесты эндпоинта
+создают отдельную базу <DB_NAME>_stream и накатывают миграции;
+без Postgres — пропускаются.
+Запуск: python -m pytest -q test_lesson_stream.py
+"""
+
+import asyncio
+import os
+import uuid
+
+import httpx
+import orjson
+import pytest
+from alembic import command
+from alembic.config import Config
+from fastapi import HTTPException
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import ai, cache
+from app.db import DATABASE_URL
+from app.deps import CurrentUser, get_current_user
+from app.json_stream import TurnStreamParser
+from app.llm_pool import LLMPool
+from app.llm_scheduler import LLMScheduler
+from app.main import app
+from app.models import ChatSession, Message, User
+from app.routers import lesson
+from benchmarks import stub_llm
+from benchmarks.common import serve
+from benchmarks.fake_redis import FakeRedis
+
+# экранирования (\", \\, \n, \uXXXX и суррогатная пара 😀), вложенные значения со скобками в строках
+RAW_REPLY = (
+    '{"role": "ayana", "say": "Он сказал: \\"смотри!\\"\\nА это \\\\ \\u0420\\u0430\\u043a\\u0435\\u0442\\u0430 \\ud83d\\ude00!",'
+    ' "animations": ["ракета", "звёзды {мигают}", "\\"]\\""],'
+    ' "next_task": {"steps": ["нарисуй", {"что": "ракету ]}"}], "n": 2},'
+    ' "done": false, "score": 3}'
+)
+REPLY = {
+    "role": "ayya",
+    "say": 'Смотри: "ракета" 🚀\nЛетим к звёздам!',
+    "animations": ["ракета", "звёзды"],
+    "next_task": "Нарисуй ракету",
+}
+
+
+def parse(chunks: list[str]) -> tuple[TurnStreamParser, str, list[tuple]]:
+    parser = TurnStreamParser()
+    say, fields = [], []
+    for chunk in chunks:
+        for ev in parser.feed(chunk):
+            if ev[0] == "say":
+                say.append(ev[1])
+            else:
+                fields.append(ev[1:])
+    return parser, "".join(say), fields
+
+
+def test_parser_matches_orjson_for_every_split():
+    expected = orjson.loads(RAW_REPLY)
+    expected_fields = [(k, v) for k, v in expected.items() if k != "say"]
+    n = len(RAW_REPLY)
+    splits = [[RAW_REPLY], list(RAW_REPLY)]
+    splits += [[RAW_REPLY[:i], RAW_REPLY[i:]] for i in range(1, n)]
+    splits += [[RAW_REPLY[:i], RAW_REPLY[i:j], RAW_REPLY[j:]] for i in range(1, n) for j in range(i + 1, n)]
+    for chunks in splits:
+        parser, say, fields = parse(chunks)
+        assert parser.done, chunks
+        assert parser.fields == expected, chunks
+        assert say == expected["say"], chunks
+        assert fields == expected_fields, chunks
+
+
+def test_parser_on_truncated_stream():
+    full = orjson.loads(RAW_REPLY)["say"]
+    for i in range(len(RAW_REPLY)):
+        parser, say, _ = parse([RAW_REPLY[:i]])
+        # не дочитан до конца: вызывающий берёт orjson.loads от всего текста, и тот не разбирается
+        assert not parser.done
+        assert full.startswith(say)
+        with pytest.raises(orjson.JSONDecodeError):
+            orjson.loads(RAW_REPLY[:i])
+
+
+@pytest.fixture(scope="module")
+def stream_db():
+    base_url = make_url(DATABASE_URL)
+    url = base_url.set(database=f"{base_url.database}_stream")
+
+    async def recreate() -> None:
+        admin = create_async_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+        try:
+            async with admin.connect() as conn:
+                await conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+                await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+        finally:
+            await admin.dispose()
+
+    try:
+        asyncio.run(recreate())
+    except Exception as e:
+        pytest.skip(f"локальный Postgres недоступен: {e}")
+
+    cfg = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    cfg.set_main_option("sqlalchemy.url", url.render_as_string(hide_password=False).replace("%", "%%"))
+    command.upgrade(cfg, "head")
+    yield url
+
+
+def read_events(body: bytes) -> list[tuple[str, dict]]:
+    events = []
+    for block in body.split(b"\n\n"):
+        if block:
+            event, data = block.split(b"\n")
+            events.append((event.removeprefix(b"event: ").decode(), orjson.loads(data.removeprefix(b"data: "))))
+    return events
+
+
+def run_stream(url, monkeypatch, stub, scenario):
+    """scenario(client, scheduler, session_factory) на базе url; LLM — stub"""
+
+    async def wrapper():
+        engine = create_async_engine(url)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        uid = f"stream-{uuid.uuid4().hex[:12]}"
+        async with session_factory.begin() as db:
+            row = User(username=uid, email=f"{uid}@example.com", password_hash="-", uid=uid)
+            db.add(row)
+        user = CurrentUser(row.id, uid, row.username, row.email)
+        monkeypatch.setattr(lesson, "SessionLocal", session_factory)
+        monkeypatch.setitem(app.dependency_overrides, get_current_user, lambda: user)
+        async with serve(stub) as stub_url:
+            scheduler = LLMScheduler(pool=LLMPool.from_urls([stub_url]))
+            monkeypatch.setattr(ai, "llm_scheduler", scheduler)
+            transport = httpx.ASGITransport(app=app)
+            try:
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await scenario(client, scheduler, session_factory)
+            finally:
+                await scheduler.pool.aclose()
+                await cache.close_redis()
+                await engine.dispose()
+
+    cache.local_completions.clear()
+    with FakeRedis() as fake:
+        fake.attach()
+        return asyncio.run(wrapper())
+
+
+async def stored_messages(session_factory, session_id: int) -> list[Message]:
+    async with session_factory() as db:
+        q = select(Message).where(Message.session_id == session_id).order_by(Message.id)
+        return list((await db.execute(q)).scalars())
+
+
+def test_turn_stream_events_and_stored_reply(stream_db, monkeypatch):
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY)
+
+    async def scenario(client, scheduler, session_factory):
+        resp = await client.post("/api/v1/lesson/turn/stream", json={"topic": "космос", "text": "Давай изучим космос"})
+        events = read_events(resp.content)
+        session_id = events[0][1]["session_id"]
+        return resp, events, await stored_messages(session_factory, session_id)
+
+    resp, events, stored = run_stream(stream_db, monkeypatch, stub, scenario)
+    assert resp.status_code == 200 and resp.headers["content-type"].startswith("text/event-stream")
+    names = [name for name, _ in events]
+    assert names[0] == "session" and names[-1] == "done"
+    assert set(names[1:-1]) == {"meta", "say"}
+    # meta — каждое поле один раз, как только значение закончилось; say — вся реплика по кускам
+    meta = {}
+    for name, data in events:
+        if name == "meta":
+            assert not set(data) & set(meta)
+            meta.update(data)
+    assert meta == {k: v for k, v in REPLY.items() if k != "say"}
+    assert "".join(data["text"] for name, data in events if name == "say") == REPLY["say"]
+    assert events[-1][1] == REPLY
+
+    # done — ровно то, что сохранено в базу
+    user_msg, reply_msg = stored
+    assert (user_msg.role, user_msg.content) == ("user", "Давай изучим космос")
+    done = events[-1][1]
+    assert (reply_msg.role, reply_msg.content) == (done["role"], done["say"])
+    assert reply_msg.meta == {"animations": done["animations"], "next_task": done["next_task"]}
+
+
+def test_turn_stream_truncated_reply_is_an_error(stream_db, monkeypatch):
+    # ответ LLM обрывается на середине JSON: парсер не дошёл до конца, orjson.loads не разбирает
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY, models={
+        ai.settings.OPENAI_MODEL: {"invalid_ratio": 1.0},
+    })
+
+    async def scenario(client, scheduler, session_factory):
+        resp = await client.post("/api/v1/lesson/turn/stream", json={"text": "привет"})
+        events = read_events(resp.content)
+        return events, await stored_messages(session_factory, events[0][1]["session_id"])
+
+    events, stored = run_stream(stream_db, monkeypatch, stub, scenario)
+    assert events[0][0] == "session" and events[-1] == ("error", {"detail": "LLM request failed"})
+    assert "done" not in [name for name, _ in events]
+    assert [m.role for m in stored] == ["user"]
+
+
+@pytest.mark.parametrize("bad_reply", [
+    {**REPLY, "role": "teacher"},  # роль вне TurnReply
+    ["ракета", "звёзды"],  # не JSON-объект
+])
+def test_turn_stream_invalid_reply_is_an_error(stream_db, monkeypatch, bad_reply):
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=bad_reply)
+
+    async def scenario(client, scheduler, session_factory):
+        resp = await client.post("/api/v1/lesson/turn/stream", json={"text": "привет"})
+        events = read_events(resp.content)
+        return events, await stored_messages(session_factory, events[0][1]["session_id"])
+
+    events, stored = run_stream(stream_db, monkeypatch, stub, scenario)
+    # meta/say могли уйти раньше, но поток заканчивается событием error, а не обрывом
+    assert events[0][0] == "session" and events[-1] == ("error", {"detail": "LLM request failed"})
+    assert [m.role for m in stored] == ["user"]
+
+
+def test_turn_stream_shed_by_scheduler(stream_db, monkeypatch):
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY)
+
+    async def scenario(client, scheduler, session_factory):
+        # единственный слот занят, очереди нет — ход сразу получает 503 от планировщика
+        scheduler.max_concurrency, scheduler.max_queue = 1, 0
+        slot = await scheduler.acquire()
+        try:
+            resp = await client.post("/api/v1/lesson/turn/stream", json={"text": "привет"})
+        finally:
+            scheduler.release(slot, None)
+        return read_events(resp.content), scheduler.stats.shed_queue_full
+
+    events, shed = run_stream(stream_db, monkeypatch, stub, scenario)
+    assert shed == 1
+    assert [name for name, _ in events] == ["session", "error"]
+    error = events[-1][1]
+    assert error["retry_after"] >= 1 and error["detail"].startswith("Слишком много запросов")
+
+
+def test_turn_stream_http_error_without_retry_after(stream_db, monkeypatch):
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY)
+
+    async def failing_stream(*args, **kwargs):
+        raise HTTPException(status_code=502, detail="upstream error")
+        yield  # делает функцию асинхронным генератором
+
+    monkeypatch.setattr(lesson, "orchestrate_turn_stream", failing_stream)
+
+    async def scenario(client, scheduler, session_factory):
+        resp = await client.post("/api/v1/lesson/turn/stream", json={"text": "привет"})
+        return read_events(resp.content)
+
+    events = run_stream(stream_db, monkeypatch, stub, scenario)
+    assert events[-1] == ("error", {"detail": "upstream error"})
+
+
+def test_turn_uses_topic_of_the_session(stream_db, monkeypatch):
+    # README: сессия создаётся с темой, дальше клиент шлёт только session_id и text
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY)
+    topics = []
+
+    async def fake_turn(dialog, summary=None, flow=None, topic=None):
+        topics.append(topic)
+        return REPLY
+
+    async def fake_stream(dialog, summary=None, flow=None, topic=None):
+        topics.append(topic)
+        yield orjson.dumps(REPLY).decode()
+
+    monkeypatch.setattr(lesson, "orchestrate_turn", fake_turn)
+    monkeypatch.setattr(lesson, "orchestrate_turn_stream", fake_stream)
+
+    async def scenario(client, scheduler, session_factory):
+        async with session_factory.begin() as db:
+            user_id = (await db.execute(select(User.id).order_by(User.id.desc()).limit(1))).scalar_one()
+            session = ChatSession(user_id=user_id, topic="космос")
+            db.add(session)
+        await client.post("/api/v1/lesson/turn", json={"session_id": session.id, "text": "почему звёзды светят?"})
+        await client.post("/api/v1/lesson/turn/stream", json={"session_id": session.id, "text": "а луна?"})
+        # без сообщений — тема всё равно из сессии
+        await client.post("/api/v1/lesson/turn", json={"session_id": session.id})
+        await client.post("/api/v1/lesson/turn", json={"topic": "цвета", "text": "какого цвета небо?"})
+
+    run_stream(stream_db, monkeypatch, stub, scenario)
+    assert topics == ["космос", "космос", "космос", "цвета"]
+
+
+def test_turn_returns_session_id_that_continues_history(stream_db, monkeypatch):
+    stub = stub_llm.create_app(latency=0.01, token_delay=0.0, reply=REPLY)
+    dialogs = []
+
+    async def fake_turn(dialog, summary=None, flow=None, topic=None):
+        dialogs.append(dialog)
+        return REPLY
+
+    monkeypatch.setattr(lesson, "orchestrate_turn", fake_turn)
+
+    async def scenario(client, scheduler, session_factory):
+        first = (await client.post("/api/v1/lesson/turn", json={"text": "Почему 2+2=4?"})).json()
+        second = (await client.post("/api/v1/lesson/turn", json={"session_id": first["session_id"], "text": "а 3+3?"})).json()
+        return first, second
+
+    first, second = run_stream(stream_db, monkeypatch, stub, scenario)
+    assert first == {**REPLY, "session_id": first["session_id"]}
+    assert second["session_id"] == first["session_id"]
+    # второй ход видит первый: реплику ребёнка и ответ
+    assert [m["role"] for m in dialogs[1]] == ["user", "assistant", "user"]
+    assert dialogs[1][0]["content"] == "Почему 2+2=4?" and dialogs[1][-1]["content"] == "а 3+3?"
+    assert orjson.loads(dialogs[1][1]["content"])["say"] == REPLY["say"]
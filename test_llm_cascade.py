@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Каскад моделей (app/llm_cascade.py): классификация ходов эвристиками, проверка
+ответа быстрой модели и эскалация на основную; имя модели у провайдера и
+стоимость по уровням. LLM — заглушка benchmarks/stub_llm.py, Redis — FakeRedis.
+Запуск: python -m pytest -q test_llm_cascade.py
+"""
+
+import asyncio
+
+import orjson
+import pytest
+
+from app import ai, cache
+from app.config import settings
+from app import llm_cascade
+from app.llm_cascade import CascadeStats, classify_turn, validate_reply
+from app.llm_pool import Endpoint, LLMPool
+from app.llm_scheduler import LLMScheduler
+from benchmarks import stub_llm
+from benchmarks.common import serve
+from benchmarks.fake_redis import FakeRedis
+
+FAST_REPLY = {"role": "ayana", "say": "А какого цвета яблоко?", "animations": []}
+STRONG_REPLY = {"role": "ayya", "say": "Почти! Давай посчитаем ещё раз.", "animations": ["яблоки"]}
+
+
+def user(text: str) -> dict:
+    return {"role": "user", "content": text}
+
+
+def assistant(say: str, role: str = "ayya") -> dict:
+    return {"role": "assistant", "content": orjson.dumps({"role": role, "say": say}).decode()}
+
+
+@pytest.mark.parametrize("dialog, expected", [
+    ([user("Давай изучим тему: яблоки")], ("strong", "opening")),
+    ([user("привет"), assistant("Яблоки бывают красные и зелёные. Понятно?"), user("Да!")], ("fast", "followup")),
+    ([user("привет"), assistant("Яблоки растут на деревьях."), user("ещё")], ("fast", "followup")),
+    ([user("привет"), assistant("Сколько яблок на картинке?"), user("пять")], ("strong", "answer")),
+    ([user("привет"), assistant("Сколько яблок на картинке?"), user("не знаю")], ("strong", "confused")),
+    ([user("привет"), assistant("Яблоки растут на деревьях."), user("а почему они падают")], ("strong", "confused")),
+    ([user("привет"), assistant("Давай составим план проекта!"), user("давай")], ("strong", "project")),
+    ([user("привет"), assistant("Яблоки растут на деревьях."), user("у бабушки есть яблоня")], ("fast", "remark")),
+    ([user("привет"), assistant("Яблоки растут на деревьях."), user("я " + "очень " * 20 + "люблю яблоки")], ("strong", "long")),
+])
+def test_classify_turn(dialog, expected):
+    assert classify_turn(dialog) == expected
+
+
+def test_word_lists_are_normalized_like_replies():
+    # реплика сравнивается после lower() и ё→е: слово словаря в другом виде не совпадёт никогда
+    for words in (llm_cascade.FOLLOWUP_WORDS, llm_cascade.CONFUSED_PHRASES, llm_cascade.QUESTION_WORDS,
+                  llm_cascade.PROJECT_WORDS):
+        assert all(w == llm_cascade._normalize(w) for w in words)
+
+
+def test_validate_reply():
+    assert validate_reply(FAST_REPLY) is None
+    assert validate_reply({"role": "teacher", "say": "привет"}) == "bad_role"
+    assert validate_reply({"role": "ayya", "say": "  "}) == "empty_say"
+    assert validate_reply({"role": "ayya", "say": "да", "animations": "шарик"}) == "bad_animations"
+    assert validate_reply({"role": "ayya", "say": "да", "next_task": {"x": 1}}) == "bad_next_task"
+    assert validate_reply(["ayya"]) == "not_object"
+
+
+def run_cascade(monkeypatch, fast_invalid_ratio: float, dialogs: list[list[dict]], stream: bool = False):
+    monkeypatch.setattr(settings, "LLM_CASCADE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_FAST_MODEL", "small")
+    monkeypatch.setattr(settings, "OPENAI_MODEL", "big")
+    monkeypatch.setattr(settings, "LLM_FAST_COST_PER_MTOKENS", 0.05)
+    monkeypatch.setattr(settings, "LLM_STRONG_COST_PER_MTOKENS", 0.6)
+    stats = CascadeStats()
+    monkeypatch.setattr(ai, "cascade_stats", stats)
+    stub = stub_llm.create_app(latency=0.01, reply=STRONG_REPLY, models={
+        "provider-small": {"reply": FAST_REPLY, "invalid_ratio": fast_invalid_ratio},
+    })
+
+    async def scenario():
+        async with serve(stub) as url:
+            # у провайдера быстрая модель называется по-своему
+            endpoint = Endpoint("stub", url, fast_model="provider-small")
+            monkeypatch.setattr(ai, "llm_scheduler", LLMScheduler(pool=LLMPool([endpoint])))
+            try:
+                if stream:
+                    return ["".join([c async for c in ai.orchestrate_turn_stream(d)]) for d in dialogs]
+                return [await ai.orchestrate_turn(d) for d in dialogs]
+            finally:
+                await endpoint.client.aclose()
+                await cache.close_redis()
+
+    cache.local_completions.clear()
+    with FakeRedis() as fake:
+        fake.attach()
+        return asyncio.run(scenario()), stub, stats
+
+
+def test_simple_turn_goes_to_fast_model_and_hard_turn_to_strong(monkeypatch):
+    dialogs = [
+        [user("привет"), assistant("Яблоки растут на деревьях. Понятно?"), user("да")],
+        [user("привет"), assistant("Сколько яблок на картинке?"), user("три")],
+    ]
+    replies, stub, stats = run_cascade(monkeypatch, 0.0, dialogs)
+    assert replies == [FAST_REPLY, STRONG_REPLY]
+    assert stub.state.model_requests == {"provider-small": 1, "big": 1}
+    snapshot = stats.as_dict()
+    assert snapshot["turns"] == {"fast": 1, "strong": 1} and snapshot["escalations"] == {}
+    assert snapshot["tokens"]["fast"] > 0 and snapshot["tokens"]["strong"] > 0
+    assert 0 < snapshot["cost_usd"]["fast"] < snapshot["cost_usd"]["strong"]
+
+
+def test_invalid_fast_output_escalates_to_strong_model(monkeypatch):
+    dialogs = [[user("привет"), assistant("Яблоки растут на деревьях."), user("ага")]]
+    replies, stub, stats = run_cascade(monkeypatch, 1.0, dialogs)
+    assert replies == [STRONG_REPLY]
+    assert stub.state.model_requests == {"provider-small": 1, "big": 1}
+    assert stats.as_dict()["escalations"] == {"invalid_json": 1}
+
+    # поток: ответ быстрой модели проверяется до отправки, клиент получает только основной
+    chunks, stub, stats = run_cascade(monkeypatch, 1.0, dialogs, stream=True)
+    assert [orjson.loads(c) for c in chunks] == [STRONG_REPLY]
+    assert stats.as_dict()["escalation_rate"] == 1.0
+
+
+def test_repeated_escalated_turn_is_not_escalated_again(monkeypatch):
+    # невалидный ответ быстрой модели не кэшируется; повтор хода берёт из кэша принятый ответ основной
+    dialog = [user("привет"), assistant("Яблоки растут на деревьях."), user("ага")]
+    for stream in (False, True):
+        replies, stub, stats = run_cascade(monkeypatch, 1.0, [dialog, dialog], stream=stream)
+        if stream:
+            replies = [orjson.loads(r) for r in replies]
+        assert replies == [STRONG_REPLY, STRONG_REPLY]
+        assert stub.state.model_requests == {"provider-small": 1, "big": 1}
+        assert stats.as_dict()["escalations"] == {"invalid_json": 1}
+
+
+def test_cascade_disabled_uses_single_model(monkeypatch):
+    dialogs = [[user("привет"), assistant("Яблоки растут на деревьях."), user("да")]]
+    monkeypatch.setattr(settings, "LLM_CASCADE_ENABLED", False)
+    stub = stub_llm.create_app(latency=0.0, reply=STRONG_REPLY)
+
+    async def scenario():
+        async with serve(stub) as url:
+            monkeypatch.setattr(ai, "llm_scheduler", LLMScheduler(pool=LLMPool.from_urls([url])))
+            try:
+                return await ai.orchestrate_turn(dialogs[0])
+            finally:
+                await ai.llm_scheduler.pool.aclose()
+                await cache.close_redis()
+
+    cache.local_completions.clear()
+    with FakeRedis() as fake:
+        fake.attach()
+        assert asyncio.run(scenario()) == STRONG_REPLY
+    assert stub.state.model_requests == {settings.OPENAI_MODEL: 1}
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Пул эндпоинтов LLM (app/llm_pool.py) против двух локальных заглушек
+(benchmarks/stub_llm.py): выбор по задержке и квоте, дублирующий запрос
+после p95, перечитывание файла эндпоинтов со сменой ключа.
+Запуск: python -m pytest -q test_llm_pool.py
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import AsyncExitStack
+
+from app import ai
+from app.config import settings
+from app.llm_pool import LLMPool
+from app.llm_scheduler import LLMScheduler
+from benchmarks import stub_llm
+from benchmarks.common import serve
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "2+2?"}]}
+
+
+def run(stubs, scenario, max_concurrency=10):
+    async def wrapper():
+        async with AsyncExitStack() as stack:
+            urls = [await stack.enter_async_context(serve(stub)) for stub in stubs]
+            scheduler = LLMScheduler(max_concurrency=max_concurrency, pool=LLMPool.from_urls(urls))
+            ai.llm_scheduler = scheduler
+            try:
+                return await scenario(scheduler)
+            finally:
+                await scheduler.pool.aclose()
+
+    original = ai.llm_scheduler
+    try:
+        return asyncio.run(wrapper())
+    finally:
+        ai.llm_scheduler = original
+
+
+def test_faster_endpoint_gets_most_requests():
+    fast, slow = stub_llm.create_app(latency=0.01), stub_llm.create_app(latency=0.08)
+
+    async def scenario(scheduler):
+        for _ in range(5):
+            await asyncio.gather(*(ai.request_completion(PAYLOAD, flow=f"kid-{i}") for i in range(4)))
+
+    run([fast, slow], scenario)
+    assert fast.state.requests + slow.state.requests == 20
+    assert fast.state.requests >= 14
+
+
+def test_exhausted_quota_moves_traffic_to_the_other_key():
+    # первый запрос к ключу идёт с установкой соединения: второй ключ заметно медленнее, чтобы это не решало выбор
+    limited, spare = stub_llm.create_app(latency=0.005, rate_limit=3, rate_window=5.0), stub_llm.create_app(latency=0.15)
+
+    async def scenario(scheduler):
+        for i in range(10):
+            await ai.request_completion(PAYLOAD, flow=f"kid-{i}")
+
+    run([limited, spare], scenario)
+    # быстрый ключ израсходован за окно — остальное уходит на второй, без 429
+    assert limited.state.rejected == 0 and limited.state.requests == 3
+    assert spare.state.requests == 7
+
+
+def test_hedged_request_cuts_the_tail(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 10)
+    flaky = stub_llm.create_app(latency=0.005, tail_latency=1.0, tail_ratio=0.15)
+    steady = stub_llm.create_app(latency=0.03)
+    hedges_won = ai.llm_hedges.values.get(("won",), 0)
+
+    async def scenario(scheduler):
+        for ep in scheduler.pool.endpoints:
+            for _ in range(10):
+                ep.record_latency(0.005 if ep.name == "llm-0" else 0.03)
+        latencies = []
+        for i in range(30):
+            started = time.perf_counter()
+            await ai.request_completion(PAYLOAD, flow=f"kid-{i}")
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    latencies = run([flaky, steady], scenario)
+    assert ai.llm_hedges.values.get(("won",), 0) > hedges_won
+    assert max(latencies) < 0.5
+
+
+def test_endpoints_file_is_reloaded_with_new_key(tmp_path, monkeypatch):
+    path = tmp_path / "endpoints.json"
+    monkeypatch.setattr(settings, "LLM_ENDPOINTS_FILE", str(path))
+    monkeypatch.setattr(settings, "LLM_ENDPOINTS_RELOAD_SECONDS", 0)
+    a, b = stub_llm.create_app(latency=0.001), stub_llm.create_app(latency=0.001)
+
+    def write(entries, mtime):
+        path.write_text(json.dumps(entries))
+        os.utime(path, (mtime, mtime))
+
+    async def scenario():
+        async with serve(a) as url_a, serve(b) as url_b:
+            write([{"name": "a", "base_url": url_a, "api_key": "old"}, {"name": "b", "base_url": url_b, "api_key": "b"}], 1)
+            pool = LLMPool()
+            scheduler = LLMScheduler(pool=pool)
+            ai.llm_scheduler = scheduler
+            try:
+                first = pool.endpoints[0]
+                first.record_latency(0.001)
+                await ai.request_completion(PAYLOAD)
+                assert a.state.authorization == "Bearer old"
+                write([{"name": "a", "base_url": url_a, "api_key": "new"}], 2)
+                await ai.request_completion(PAYLOAD)
+                assert a.state.authorization == "Bearer new"
+                # тот же эндпоинт: статистика и соединения сохранились
+                assert pool.endpoints == [first] and first.requests == 2 and pool.reloads == 1
+            finally:
+                await pool.aclose()
+
+    original = ai.llm_scheduler
+    try:
+        asyncio.run(scenario())
+    finally:
+        ai.llm_scheduler = original
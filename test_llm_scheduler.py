@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Планировщик вызовов LLM (app/llm_scheduler.py) против локальной заглушки
+с лимитом запросов (benchmarks/stub_llm.py): общий лимит одновременных
+вызовов, очередь по потокам, ранний отказ по сроку, заголовки x-ratelimit-*.
+Запуск: python -m pytest -q test_llm_scheduler.py
+"""
+
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app import ai
+from app.config import settings
+from app.llm_pool import LLMPool, parse_duration
+from app.llm_scheduler import LLMScheduler
+from benchmarks import stub_llm
+from benchmarks.common import serve
+
+PAYLOAD = {"model": "stub", "messages": [{"role": "user", "content": "2+2?"}]}
+
+
+def run(stub, scheduler, scenario):
+    async def wrapper():
+        async with serve(stub) as url:
+            scheduler.pool = LLMPool.from_urls([url])
+            try:
+                return await scenario()
+            finally:
+                await scheduler.pool.aclose()
+
+    original = ai.llm_scheduler
+    ai.llm_scheduler = scheduler
+    try:
+        return asyncio.run(wrapper())
+    finally:
+        ai.llm_scheduler = original
+
+
+def test_parse_duration():
+    assert parse_duration("2m59.56s") == pytest.approx(179.56)
+    assert parse_duration("150ms") == pytest.approx(0.15)
+    assert parse_duration("7") == 7.0
+    assert parse_duration("soon") is None
+
+
+def test_concurrency_cap_and_fair_queuing():
+    stub = stub_llm.create_app(latency=0.03)
+    scheduler = LLMScheduler(max_concurrency=2)
+    done: list[str] = []
+
+    async def call(flow):
+        await ai.request_completion(PAYLOAD, flow=flow)
+        done.append(flow)
+
+    async def scenario():
+        busy = [asyncio.create_task(call("busy")) for _ in range(20)]
+        await asyncio.sleep(0.01)
+        quiet = [asyncio.create_task(call("quiet")) for _ in range(2)]
+        await asyncio.gather(*busy, *quiet)
+
+    run(stub, scheduler, scenario)
+    assert stub.state.max_inflight <= 2
+    # без очереди по потокам оба хода "quiet" ждали бы все 20 ходов "busy"
+    assert max(i for i, flow in enumerate(done) if flow == "quiet") < 8
+
+
+def test_requests_that_cannot_make_the_deadline_are_shed_early(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT", 0.35)
+    stub = stub_llm.create_app(latency=0.1)
+    scheduler = LLMScheduler(max_concurrency=1)
+
+    async def call(flow):
+        started = time.perf_counter()
+        try:
+            await ai.request_completion(PAYLOAD, flow=flow)
+            return "ok", time.perf_counter() - started
+        except HTTPException as e:
+            assert e.status_code == 503 and int(e.headers["Retry-After"]) >= 1
+            return "shed", time.perf_counter() - started
+
+    async def scenario():
+        await call("warmup")  # планировщик узнаёт время вызова
+        return await asyncio.gather(*(call(f"kid-{i}") for i in range(10)))
+
+    results = run(stub, scheduler, scenario)
+    served = [t for outcome, t in results if outcome == "ok"]
+    shed = [t for outcome, t in results if outcome == "shed"]
+    assert 2 <= len(served) <= 4 and len(shed) >= 6
+    assert scheduler.stats.shed_deadline >= 5
+    # отказ по оценке — сразу, а не после LLM_QUEUE_TIMEOUT в очереди
+    assert sorted(shed)[len(shed) // 2] < 0.05
+
+
+def test_provider_rate_limits_are_honoured(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RATELIMIT_RETRIES", 3)
+    monkeypatch.setattr(settings, "LLM_QUEUE_TIMEOUT", 10)
+    stub = stub_llm.create_app(latency=0.01, rate_limit=5, rate_window=1.0)
+    scheduler = LLMScheduler(max_concurrency=10)
+
+    async def scenario():
+        started = time.perf_counter()
+        await asyncio.gather(*(ai.request_completion(PAYLOAD, flow=f"kid-{i}") for i in range(15)))
+        return time.perf_counter() - started
+
+    elapsed = run(stub, scheduler, scenario)
+    # все 15 ходов прошли; 429 — только в первой пачке, пока лимит провайдера не известен
+    assert stub.state.rejected <= 5
+    assert scheduler.stats.rate_limited == stub.state.rejected
+    assert elapsed >= 1.9  # 15 запросов при 5 в секунду — три окна
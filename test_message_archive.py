@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Партиции messages и архив старых месяцев на локальном Postgres.
+
+Нужен Postgres из DB_* (например, docker compose up -d postgres); тесты создают
+отдельную базу <DB_NAME>_archive и накатывают миграции. Без Postgres — пропускаются.
+Запуск: python -m pytest -q test_message_archive.py
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import archive
+from app.config import settings
+from app.db import DATABASE_URL
+from app.history import load_history
+from app.models import ChatSession, Message, MessageArchive, User
+from benchmarks.fake_redis import FakeRedis
+
+NOW = datetime.utcnow()
+
+
+@pytest.fixture(scope="module")
+def archive_db():
+    base_url = make_url(DATABASE_URL)
+    url = base_url.set(database=f"{base_url.database}_archive")
+
+    async def recreate() -> None:
+        admin = create_async_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+        try:
+            async with admin.connect() as conn:
+                await conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+                await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+        finally:
+            await admin.dispose()
+
+    try:
+        asyncio.run(recreate())
+    except Exception as e:
+        pytest.skip(f"локальный Postgres недоступен: {e}")
+
+    cfg = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    cfg.set_main_option("sqlalchemy.url", url.render_as_string(hide_password=False).replace("%", "%%"))
+    command.upgrade(cfg, "head")
+    yield url
+
+
+@pytest.fixture()
+def env(archive_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "ARCHIVE_DIR", str(tmp_path))
+    archive._load_index.cache_clear()
+    with FakeRedis() as fake:
+        fake.attach()
+        yield archive_db
+
+
+def run(coro_fn, url):
+    async def wrapper():
+        engine = create_async_engine(url)
+        try:
+            return await coro_fn(engine, async_sessionmaker(engine, expire_on_commit=False))
+        finally:
+            from app import cache
+            await cache.close_redis()
+            await engine.dispose()
+    return asyncio.run(wrapper())
+
+
+async def seed_session(Session, uid: str, created_at: datetime, messages: list[tuple[datetime, str]]) -> int:
+    async with Session.begin() as db:
+        user = User(username=uid, email=f"{uid}@example.com", password_hash="-", uid=uid)
+        db.add(user)
+        await db.flush()
+        cs = ChatSession(user_id=user.id, topic="Числа", created_at=created_at)
+        db.add(cs)
+        await db.flush()
+        for at, content in messages:
+            db.add(Message(session_id=cs.id, role="user", content=content, meta={"animations": ["a"]}, created_at=at))
+        return cs.id
+
+
+def test_old_months_are_archived_and_read_back(env):
+    async def scenario(engine, Session):
+        old = archive.add_months(archive.month_start(NOW), -8)
+        await archive.ensure_partitions(engine, start=old, months=12)
+        messages = [(old + timedelta(days=1, minutes=i), f"старое {i}") for i in range(5)]
+        messages += [(archive.add_months(old, 1) + timedelta(minutes=i), f"потом {i}") for i in range(5)]
+        messages += [(NOW - timedelta(seconds=10 - i), f"сейчас {i}") for i in range(3)]
+        sid = await seed_session(Session, "kid-archive", old + timedelta(days=1), messages)
+        live_sid = await seed_session(Session, "kid-live", NOW, [(NOW, "живое")])
+
+        archived = await archive.archive_old_partitions(engine, keep_months=6)
+        assert archive.partition_name(old) in archived
+        assert archive.partition_name(archive.add_months(old, 1)) in archived
+        assert archive.partition_name(archive.month_start(NOW)) not in archived
+
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT to_regclass(:n)"), {"n": archive.partition_name(old)})).scalar() is None
+        async with Session() as db:
+            assert await db.scalar(select(func.count()).select_from(Message).where(Message.session_id == sid)) == 3
+            rows = (await db.execute(select(MessageArchive.partition, MessageArchive.rows).order_by(MessageArchive.range_from))).all()
+            assert sum(r.rows for r in rows) == 10
+            for r in rows:
+                assert os.path.exists(os.path.join(settings.ARCHIVE_DIR, r.partition + ".jsonl.gz"))
+
+            cold = await archive.load_archived_messages(db, sid)
+            assert [m["content"] for m in cold] == [c for _, c in messages[:10]]
+            assert cold[0]["meta"] == {"animations": ["a"]}
+            assert await archive.load_archived_messages(db, live_sid) == []
+
+            history = await load_history(db, sid, limit=40)
+            assert [h["content"] for h in history] == [c for _, c in messages]
+            after = await load_history(db, sid, after_id=cold[6]["id"], limit=40)
+            assert [h["content"] for h in after] == [c for _, c in messages[7:]]
+
+    run(scenario, env)
+
+
+def test_interrupted_run_is_resumed(env):
+    async def scenario(engine, Session):
+        month = archive.add_months(archive.month_start(NOW), -10)
+        await archive.ensure_partitions(engine, start=month, months=1)
+        sid = await seed_session(Session, "kid-resume", month, [(month + timedelta(hours=i), f"реплика {i}") for i in range(4)])
+        name = archive.partition_name(month)
+        # прошлый запуск успел только отсоединить партицию
+        async with engine.begin() as conn:
+            await conn.execute(text(f"ALTER TABLE messages DETACH PARTITION {name}"))
+
+        assert name in await archive.archive_old_partitions(engine, keep_months=6)
+        async with Session() as db:
+            assert len(await archive.load_archived_messages(db, sid)) == 4
+
+    run(scenario, env)
+
+
+def test_new_turns_land_in_current_partition(env):
+    async def scenario(engine, Session):
+        await archive.ensure_partitions(engine)
+        assert await archive.ensure_partitions(engine) == []
+        sid = await seed_session(Session, "kid-now", NOW, [(NOW, "привет")])
+        async with engine.connect() as conn:
+            where = (await conn.execute(
+                text("SELECT tableoid::regclass::text FROM messages WHERE session_id = :sid"), {"sid": sid}
+            )).scalar()
+        assert where == archive.partition_name(NOW)
+
+    run(scenario, env)
+
+
+def test_message_pages_span_archive_and_live(env):
+    import httpx
+    from app.db import get_db
+    from app.deps import create_access_token
+    from app.main import app
+
+    async def scenario(engine, Session):
+        old = archive.add_months(archive.month_start(NOW), -9)
+        await archive.ensure_partitions(engine, start=old, months=1)
+        messages = [(old + timedelta(minutes=i), f"архив {i}") for i in range(5)]
+        messages += [(NOW - timedelta(seconds=10 - i), f"живое {i}") for i in range(4)]
+        sid = await seed_session(Session, "kid-pages", old, messages)
+        await seed_session(Session, "kid-other", NOW, [])
+        other = create_access_token({"uid": "kid-other"})
+        await archive.archive_old_partitions(engine, keep_months=6)
+
+        async def override_db():
+            async with Session() as db:
+                yield db
+
+        app.dependency_overrides[get_db] = override_db
+        try:
+            transport = httpx.ASGITransport(app=app)
+            kid = {"Authorization": f"Bearer {create_access_token({'uid': 'kid-pages'})}"}
+            async with httpx.AsyncClient(transport=transport, base_url="http://app", headers=kid) as client:
+                seen, cursor = [], None
+                while True:
+                    params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+                    page = (await client.get(f"/api/v1/lesson/sessions/{sid}/messages", params=params)).json()
+                    seen += [m["content"] for m in page["items"]]
+                    cursor = page["next_cursor"]
+                    if cursor is None:
+                        break
+                assert seen == [c for _, c in messages]
+
+                resp = await client.get(f"/api/v1/lesson/sessions/{sid}/messages", headers={"Authorization": f"Bearer {other}"})
+                assert resp.status_code == 404
+                resp = await client.get(f"/api/v1/lesson/sessions/{sid}/messages", params={"cursor": "мусор"})
+                assert resp.status_code == 400
+
+                sessions = (await client.get("/api/v1/lesson/sessions")).json()
+                assert [s["id"] for s in sessions["items"]] == [sid] and sessions["next_cursor"] is None
+        finally:
+            app.dependency_overrides.pop(get_db, None)
+
+    run(scenario, env)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Метрики app/metrics.py: гистограммы по шаблону маршрута, сложение снимков
+нескольких воркеров (METRICS_DIR), текстовый формат /metrics, токены LLM.
+Запуск: python -m pytest -q test_metrics.py
+"""
+
+import asyncio
+import time
+
+import httpx
+import orjson
+from fastapi import FastAPI
+
+from app import ai
+from app.config import settings
+from app.llm_pool import Endpoint, LLMPool
+from app.llm_scheduler import LLMScheduler
+from app.metrics import MetricsMiddleware, Registry, merge, read_snapshots, render, write_snapshot, http_request_duration
+
+
+def test_route_template_is_the_label():
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://app") as client:
+            for i in range(5):
+                assert (await client.get(f"/items/{i}")).status_code == 200
+            await client.get("/items/not-a-number")
+            await client.get("/missing")
+
+    asyncio.run(scenario())
+    samples = http_request_duration.values
+    assert sum(samples[("GET", "/items/{item_id}", "200")][0]) == 5
+    assert sum(samples[("GET", "/items/{item_id}", "422")][0]) == 1
+    assert sum(samples[("GET", "unmatched", "404")][0]) == 1
+
+
+def worker_snapshot(pid: int, requests: int, depth: int, written_at: float) -> dict:
+    registry = Registry()
+    counter = registry.counter("turns_total", "ходы", ("mode",))
+    hist = registry.histogram("latency_seconds", "задержка", buckets=(0.1, 1.0))
+    gauge = registry.gauge("queue_depth", "очередь")
+    counter.inc("sync", amount=requests)
+    for _ in range(requests):
+        hist.observe(0.5)
+    gauge.set(depth)
+    return {**registry.snapshot(), "pid": pid, "written_at": written_at}
+
+
+def test_worker_snapshots_are_summed(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "METRICS_STALE_SECONDS", 30)
+    now = time.time()
+    own = worker_snapshot(1, requests=3, depth=2, written_at=now)
+    write_snapshot(worker_snapshot(2, requests=4, depth=5, written_at=now))
+    # воркер завершился минуту назад: его счётчики остаются, gauge — нет
+    write_snapshot(worker_snapshot(3, requests=10, depth=100, written_at=now - 60))
+    write_snapshot(own)
+
+    merged = merge(read_snapshots(own), now)
+    assert merged["turns_total"]["samples"] == {("sync",): 17}
+    assert merged["latency_seconds"]["samples"][()] == [[0, 17, 0], 8.5]
+    assert merged["queue_depth"]["samples"] == {(): 7}
+
+
+def test_exposition_format():
+    registry = Registry()
+    registry.counter("x_total", "счётчик", ("path",)).inc('a"b\\c')
+    hist = registry.histogram("y_seconds", "гистограмма", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value)
+    text = render(merge([registry.snapshot()]))
+    assert 'x_total{path="a\\"b\\\\c"} 1' in text
+    assert 'y_seconds_bucket{le="0.1"} 2' in text
+    assert 'y_seconds_bucket{le="1"} 3' in text
+    assert 'y_seconds_bucket{le="+Inf"} 4' in text
+    assert "y_seconds_count 4" in text and "y_seconds_sum 3.65" in text
+    assert "# TYPE y_seconds histogram" in text
+
+
+def test_llm_latency_and_tokens():
+    def handler(request):
+        return httpx.Response(200, content=orjson.dumps({
+            "choices": [{"message": {"content": "{}"}}],
+            "usage": {"prompt_tokens": 120, "completion_tokens": 30},
+        }))
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler), base_url="http://llm") as client:
+            ai.llm_scheduler = LLMScheduler(pool=LLMPool([Endpoint("mock", "http://llm", client=client)]))
+            for _ in range(2):
+                await ai.request_completion({"messages": []})
+
+    before_prompt = ai.llm_tokens.values.get(("prompt",), 0)
+    before_calls = sum(ai.llm_request_duration.values.get(("complete", "ok"), [[0]])[0])
+    original = ai.llm_scheduler
+    try:
+        asyncio.run(scenario())
+    finally:
+        ai.llm_scheduler = original
+    assert ai.llm_tokens.values[("prompt",)] - before_prompt == 240
+    assert sum(ai.llm_request_duration.values[("complete", "ok")][0]) - before_calls == 2
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Регрессия планов запросов на горячих таблицах (messages, chat_sessions).
+
+Создаёт отдельную базу <DB_NAME>_plans на локальном Postgres (DB_*), накатывает
+миграции, заливает ~200 тыс. сообщений и проверяет EXPLAIN: история сессии и
+сессии ребёнка читаются по индексам, без Seq Scan. Без Postgres тесты пропускаются.
+Запуск: python -m pytest -q test_query_plans.py
+"""
+
+import asyncio
+import os
+from datetime import datetime
+
+import orjson
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, select, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.archive import add_months, ensure_partitions
+from app.db import DATABASE_URL
+from app.history import history_query
+from app.models import ChatSession
+
+USERS = 500
+SESSIONS_PER_USER = 10
+MESSAGES_PER_SESSION = 40
+
+SEED_SQL = [
+    f"""INSERT INTO users (username, email, password_hash, is_verified, uid, created_at)
+        SELECT 'kid' || g, 'kid' || g || '@example.com', '-', true, 'uid-' || g, now()
+        FROM generate_series(1, {USERS}) g""",
+    f"""INSERT INTO chat_sessions (user_id, topic, created_at)
+        SELECT u, 'Числа', now() - (s || ' hours')::interval
+        FROM generate_series(1, {USERS}) u, generate_series(1, {SESSIONS_PER_USER}) s""",
+    f"""INSERT INTO messages (session_id, role, content, meta, created_at)
+        SELECT cs.id, CASE WHEN m % 2 = 0 THEN 'user' ELSE 'ayya' END, 'реплика ' || m,
+               '{{"animations": []}}'::jsonb, cs.created_at + (m || ' seconds')::interval
+        FROM chat_sessions cs, generate_series(1, {MESSAGES_PER_SESSION}) m""",
+]
+
+
+def _plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _plan_nodes(child)
+
+
+@pytest.fixture(scope="module")
+def plans_db():
+    base_url = make_url(DATABASE_URL)
+    url = base_url.set(database=f"{base_url.database}_plans")
+
+    async def recreate() -> None:
+        admin = create_async_engine(base_url.set(database="postgres"), isolation_level="AUTOCOMMIT")
+        try:
+            async with admin.connect() as conn:
+                await conn.execute(text(f'DROP DATABASE IF EXISTS "{url.database}"'))
+                await conn.execute(text(f'CREATE DATABASE "{url.database}"'))
+        finally:
+            await admin.dispose()
+
+    try:
+        asyncio.run(recreate())
+    except Exception as e:
+        pytest.skip(f"локальный Postgres недоступен: {e}")
+
+    cfg = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    cfg.set_main_option("sqlalchemy.url", url.render_as_string(hide_password=False).replace("%", "%%"))
+    command.upgrade(cfg, "head")
+
+    async def seed() -> None:
+        engine = create_async_engine(url)
+        # сессии засеваются «последними часами» — они могут попасть и в прошлый месяц
+        await ensure_partitions(engine, start=add_months(datetime.utcnow(), -1), months=2)
+        async with engine.begin() as conn:
+            for sql in SEED_SQL:
+                await conn.execute(text(sql))
+        async with engine.connect() as conn:
+            await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text("VACUUM ANALYZE"))
+        await engine.dispose()
+
+    asyncio.run(seed())
+    yield url
+
+
+def explain(url, stmt) -> list[dict]:
+    sql = str(stmt.compile(dialect=create_async_engine(url).dialect, compile_kwargs={"literal_binds": True}))
+
+    async def run() -> list[dict]:
+        engine = create_async_engine(url)
+        try:
+            async with engine.connect() as conn:
+                raw = (await conn.execute(text("EXPLAIN (FORMAT JSON) " + sql))).scalar_one()
+        finally:
+            await engine.dispose()
+        plan = orjson.loads(raw) if isinstance(raw, str) else raw
+        return list(_plan_nodes(plan[0]["Plan"]))
+
+    return asyncio.run(run())
+
+
+def index_family(url, index: str) -> set[str]:
+    """Индекс и его копии на партициях (у партиционированной messages план ссылается на них)"""
+    async def run() -> set[str]:
+        engine = create_async_engine(url)
+        try:
+            async with engine.connect() as conn:
+                q = await conn.execute(
+                    text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = CAST(:index AS regclass)"),
+                    {"index": index},
+                )
+                return {index, *q.scalars()}
+        finally:
+            await engine.dispose()
+
+    return asyncio.run(run())
+
+
+def assert_index_scan(url, nodes: list[dict], table: str, index: str) -> None:
+    # пустую партицию (стоимость 0) планировщик честно читает seq scan — это не регрессия
+    seq_scans = [
+        n for n in nodes
+        if n["Node Type"] == "Seq Scan" and n["Total Cost"] > 0
+        and (n.get("Relation Name") == table or n.get("Relation Name", "").startswith(table + "_p"))
+    ]
+    assert not seq_scans, f"Seq Scan по {table}: {nodes}"
+    names = index_family(url, index)
+    assert any(n.get("Index Name") in names for n in nodes), f"{index} не используется: {nodes}"
+
+
+def test_session_history_uses_index(plans_db):
+    nodes = explain(plans_db, history_query(session_id=1234, after_id=0, limit=40))
+    assert_index_scan(plans_db, nodes, "messages", "ix_messages_session_id_created_at")
+
+
+def test_history_after_summary_uses_index(plans_db):
+    nodes = explain(plans_db, history_query(session_id=1234, after_id=10_000, limit=40))
+    assert_index_scan(plans_db, nodes, "messages", "ix_messages_session_id_created_at")
+
+
+def test_user_sessions_count_uses_index(plans_db):
+    stmt = select(func.count()).select_from(ChatSession).where(ChatSession.user_id == 42)
+    nodes = explain(plans_db, stmt)
+    assert_index_scan(plans_db, nodes, "chat_sessions", "ix_chat_sessions_user_id_created_at")
+
+
+def test_user_recent_sessions_uses_index(plans_db):
+    stmt = (
+        select(ChatSession.id, ChatSession.topic, ChatSession.created_at)
+        .where(ChatSession.user_id == 42)
+        .order_by(ChatSession.created_at.desc())
+        .limit(20)
+    )
+    nodes = explain(plans_db, stmt)
+    assert_index_scan(plans_db, nodes, "chat_sessions", "ix_chat_sessions_user_id_created_at")
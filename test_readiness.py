@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+GET /health/ready и /health/live: параллельные пробы с таймаутом, кэш результата,
+503 при недоступной зависимости. Пробы подменяются — база и Redis не нужны.
+Запуск: python -m pytest -q test_readiness.py
+"""
+
+import asyncio
+import time
+
+import httpx
+
+from app.readiness import Readiness, readiness
+from app.main import app
+
+
+class Counting:
+    def __init__(self, delay: float = 0.0, error: Exception | None = None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+
+
+def test_probes_run_concurrently_with_timeout():
+    async def scenario():
+        checker = Readiness({"db": Counting(0.05), "redis": Counting(0.05), "llm": Counting(5)}, timeout=0.2, cache_seconds=0)
+        started = time.perf_counter()
+        result = await checker.check()
+        elapsed = time.perf_counter() - started
+        # зависшая проба ограничена таймаутом, остальные идут параллельно с ней
+        assert elapsed < 0.5
+        assert result["ready"] is False
+        assert result["checks"]["db"]["ok"] and result["checks"]["redis"]["ok"]
+        assert not result["checks"]["llm"]["ok"] and "timeout" in result["checks"]["llm"]["error"]
+        assert 40 <= result["checks"]["db"]["latency_ms"] < 200
+
+    asyncio.run(scenario())
+
+
+def test_result_is_cached_and_shared():
+    async def scenario():
+        db = Counting(0.05)
+        checker = Readiness({"db": db}, timeout=1, cache_seconds=0.3)
+        results = await asyncio.gather(*(checker.check() for _ in range(20)))
+        assert db.calls == 1 and all(r["ready"] for r in results)
+        cached = await checker.check()
+        assert cached["cached"] and db.calls == 1
+        await asyncio.sleep(0.35)
+        fresh = await checker.check()
+        assert not fresh["cached"] and db.calls == 2
+
+    asyncio.run(scenario())
+
+
+def test_ready_and_live_endpoints():
+    db = Counting(error=ConnectionRefusedError("db down"))
+    redis = Counting()
+    original = readiness._probes
+    readiness._probes = {"db": db, "redis": redis}
+    readiness.clear()
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+            resp = await client.get("/api/v1/health/ready")
+            assert resp.status_code == 503
+            body = resp.json()
+            assert body["checks"]["db"]["ok"] is False and "db down" in body["checks"]["db"]["error"]
+            assert body["checks"]["redis"]["ok"] is True
+
+            resp = await client.get("/api/v1/health/live")
+            assert resp.status_code == 200 and resp.json() == {"ok": True}
+            assert db.calls == 1 and redis.calls == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        readiness._probes = original
+        readiness.clear()
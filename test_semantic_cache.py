@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Семантический кэш ответов (app/semantic_cache.py): перефразированный вопрос
+получает сохранённый ответ, другой вопрос (и та же фраза в другой теме) — нет;
+вытеснение давно не использованных; IVF находит то же, что полный перебор.
+Запуск: python -m pytest -q test_semantic_cache.py
+"""
+
+import asyncio
+
+import numpy as np
+
+from app import ai, semantic_cache as sc
+from app.config import settings
+from app.semantic_cache import HashingEmbedder, SemanticCache, VectorIndex
+
+embedder = HashingEmbedder(256)
+
+
+def test_paraphrase_hits_and_other_questions_miss():
+    cache = SemanticCache(embedder)
+    cache.store("природа", embedder.embed("Почему небо голубое?"), {"say": "sky"})
+    cache.store("математика", embedder.embed("Сколько будет 2+2?"), {"say": "4"})
+
+    assert cache.lookup("природа", embedder.embed("а почему небо такое голубое")) == {"say": "sky"}
+    assert cache.lookup("природа", embedder.embed("ПОЧЕМУ небо голубое!!!")) == {"say": "sky"}
+    assert cache.lookup("природа", embedder.embed("почему трава зелёная?")) is None
+    assert cache.lookup("природа", embedder.embed("почему небо не голубое?")) is None
+    assert cache.lookup("математика", embedder.embed("сколько будет 2+3?")) is None
+    # другая тема — другое пространство имён
+    assert cache.lookup("математика", embedder.embed("почему небо голубое?")) is None
+    assert cache.stats.hits == 2 and cache.stats.misses == 4
+
+
+def test_least_recently_used_answer_is_evicted():
+    index = VectorIndex(dim=3, capacity=3)
+    vectors = np.eye(3, dtype=np.float32)
+    for i in range(3):
+        index.add(vectors[i], f"v{i}", now=i)
+    index.used_at[0] = 10  # v0 недавно отдавали
+    row = index.add(np.array([0.6, 0.8, 0], dtype=np.float32), "v3", now=11)
+    assert row == 1 and index.evictions == 1 and index.size == 3
+    assert index.values == ["v0", "v3", "v2"]
+    assert index.search(vectors[1])[0] == 1
+
+
+def test_ivf_finds_what_brute_force_finds():
+    rng = np.random.default_rng(1)
+    centers = rng.normal(size=(32, 64))
+    vectors = centers[rng.integers(0, 32, 4000)] + 0.3 * rng.normal(size=(4000, 64))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    brute, ivf = VectorIndex(64, 10000), VectorIndex(64, 10000, ivf_lists=16, ivf_probe=4)
+    for i, v in enumerate(vectors[:3000]):
+        brute.add(v, i, now=0)
+        ivf.add(v, i, now=0)
+    assert ivf.needs_training()
+    asyncio.run(ivf.train())
+    for i, v in enumerate(vectors[3000:], start=3000):  # добавленные после обучения тоже находятся
+        brute.add(v, i, now=0)
+        ivf.add(v, i, now=0)
+
+    queries = vectors[rng.integers(0, 4000, 300)] + 0.05 * rng.normal(size=(300, 64)).astype(np.float32)
+    same = sum(brute.search(q)[0] == ivf.search(q)[0] for q in queries)
+    assert ivf.centroids is not None and same >= 285
+
+
+def test_orchestrate_turn_reuses_answer_for_paraphrase(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    monkeypatch.setattr(sc, "semantic_cache", SemanticCache(embedder))
+    calls = []
+
+    async def fake_completion(messages, flow=None):
+        calls.append(messages[-1]["content"])
+        return {"role": "ayya", "say": f"ответ на: {messages[-1]['content']}"}
+
+    monkeypatch.setattr(ai, "chat_completion", fake_completion)
+
+    async def scenario():
+        first = await ai.orchestrate_turn([{"role": "user", "content": "Почему небо голубое?"}], topic="природа")
+        again = await ai.orchestrate_turn([{"role": "user", "content": "а почему небо такое голубое"}], topic="природа")
+        # середина урока: ответ зависит от предыдущих ходов — кэш не используется
+        dialog = [{"role": "user", "content": "привет"}, {"role": "assistant", "content": "{}"},
+                  {"role": "user", "content": "почему небо голубое"}]
+        await ai.orchestrate_turn(dialog, topic="природа")
+        chunks = [c async for c in ai.orchestrate_turn_stream([{"role": "user", "content": "Почему небо голубое"}], topic="природа")]
+        return first, again, chunks
+
+    first, again, chunks = asyncio.run(scenario())
+    assert again == first and len(calls) == 2
+    assert chunks == ['{"role":"ayya","say":"ответ на: Почему небо голубое?"}']
+
+
+def test_invalid_reply_is_not_cached(monkeypatch):
+    monkeypatch.setattr(settings, "SEMANTIC_CACHE_ENABLED", True)
+    cache = SemanticCache(embedder)
+    monkeypatch.setattr(sc, "semantic_cache", cache)
+    calls = []
+
+    async def fake_completion(messages, flow=None):
+        calls.append(messages[-1]["content"])
+        return {"role": "teacher", "say": "ответ"}  # роль вне TurnReply
+
+    async def fake_stream(dialog, summary, flow):
+        calls.append(dialog[-1]["content"])
+        yield '["не", "объект"]'
+
+    monkeypatch.setattr(ai, "chat_completion", fake_completion)
+    monkeypatch.setattr(ai, "_stream_completion", fake_stream)
+
+    async def scenario():
+        for question in ("Почему небо голубое?", "а почему небо такое голубое"):
+            await ai.orchestrate_turn([{"role": "user", "content": question}], topic="природа")
+        for question in ("Сколько лап у кошки?", "а сколько у кошки лап"):
+            [c async for c in ai.orchestrate_turn_stream([{"role": "user", "content": question}], topic="животные")]
+
+    asyncio.run(scenario())
+    # испорченный ответ не запомнен: пересказ снова идёт в LLM
+    assert len(calls) == 4 and cache.stats.hits == 0
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Single-flight вызовов LLM (app/ai.py, chat_completion/_fetch_completion):
+ведущий запрос отменён — ожидающие повторяют сами; ведущий упал — ожидающие
+получают его ошибку; воркер с блокировкой в Redis умер, не записав ответ, —
+ждущий после истечения блокировки спрашивает LLM сам.
+LLM — заглушка benchmarks/stub_llm.py, Redis — FakeRedis.
+Запуск: python -m pytest -q test_singleflight.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app import ai, cache
+from app.config import settings
+from app.llm_pool import LLMPool
+from app.llm_scheduler import LLMScheduler
+from benchmarks import stub_llm
+from benchmarks.common import serve
+from benchmarks.fake_redis import FakeRedis
+
+MESSAGES = [{"role": "user", "content": "Привет! Начнём урок про числа?"}]
+
+
+def run(monkeypatch, stub, scenario):
+    """scenario(fake) с заглушкой LLM и чистыми кэшами; вернёт (результат, статистика single-flight)"""
+    stats = ai.SingleFlightStats()
+    monkeypatch.setattr(ai, "singleflight_stats", stats)
+
+    async def wrapper(fake):
+        async with serve(stub) as url:
+            monkeypatch.setattr(ai, "llm_scheduler", LLMScheduler(pool=LLMPool.from_urls([url])))
+            try:
+                return await scenario(fake)
+            finally:
+                await ai.llm_scheduler.pool.aclose()
+                await cache.close_redis()
+
+    cache.local_completions.clear()
+    with FakeRedis() as fake:
+        fake.attach()
+        result = asyncio.run(wrapper(fake))
+    assert not ai._inflight
+    return result, stats
+
+
+def test_followers_retry_when_leader_is_cancelled(monkeypatch):
+    stub = stub_llm.create_app(latency=0.2)
+
+    async def scenario(fake):
+        leader = asyncio.create_task(ai.chat_completion(MESSAGES))
+        await asyncio.sleep(0.05)
+        followers = [asyncio.create_task(ai.chat_completion(MESSAGES)) for _ in range(3)]
+        await asyncio.sleep(0.02)
+        # клиент ведущего ушёл: его вызов LLM отменяется вместе с ним
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    replies, stats = run(monkeypatch, stub, scenario)
+    assert replies == [stub_llm.DEFAULT_REPLY] * 3
+    # один из ожидающих стал ведущим, остальные дождались его
+    assert stub.state.requests == 2
+    assert stats.upstream_calls == 2 and stats.coalesced_local == 5
+
+
+def test_followers_get_leader_error(monkeypatch):
+    stub = stub_llm.create_app(models={"broken": {"latency": 0.1, "status": 500}})
+
+    async def scenario(fake):
+        calls = [ai.chat_completion(MESSAGES, model="broken") for _ in range(4)]
+        results = await asyncio.gather(*calls, return_exceptions=True)
+        return results, dict(fake.data)
+
+    (results, stored), stats = run(monkeypatch, stub, scenario)
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert len({str(r) for r in results}) == 1
+    assert stub.state.requests == 1 and stats.upstream_calls == 1 and stats.coalesced_local == 3
+    # ошибка не кэшируется: следующий запрос снова идёт в LLM
+    assert not any(k.startswith("completion") for k in stored) and not cache.local_completions
+
+
+def test_remote_lock_holder_dies_without_reply(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_SINGLEFLIGHT_REDIS", True)
+    monkeypatch.setattr(settings, "LLM_SINGLEFLIGHT_POLL_SECONDS", 0.02)
+    stub = stub_llm.create_app(latency=0.01)
+
+    async def scenario(fake):
+        # другой воркер взял блокировку и умер: ответа в кэше не будет, блокировка истечёт по TTL
+        key = cache.completion_cache_key(MESSAGES)
+        assert await cache.acquire_inflight_lock(key, "dead-worker", 300)
+        started = time.perf_counter()
+        reply = await ai.chat_completion(MESSAGES)
+        return reply, time.perf_counter() - started, await cache.inflight_lock_exists(key)
+
+    (reply, elapsed, locked), stats = run(monkeypatch, stub, scenario)
+    assert reply == stub_llm.DEFAULT_REPLY
+    assert 0.3 <= elapsed < settings.OPENAI_TIMEOUT
+    assert stub.state.requests == 1 and stats.upstream_calls == 1 and stats.coalesced_remote == 0
+    # свою блокировку воркер снял
+    assert not locked
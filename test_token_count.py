@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Подсчёт токенов для бюджета контекста (app/ai.py): без tiktoken — оценка
+сверху (кириллица — токен на символ), неверный LLM_TOKENIZER — ошибка, а не
+молчаливая оценка.
+Запуск: python -m pytest -q test_token_count.py
+"""
+
+import builtins
+import sys
+import types
+
+import pytest
+
+from app import ai
+from app.config import settings
+
+
+@pytest.fixture
+def encoding_cache():
+    ai._get_encoding.cache_clear()
+    yield
+    ai._get_encoding.cache_clear()
+
+
+def without_tiktoken(monkeypatch):
+    real_import = builtins.__import__
+
+    def fake_import(name, *args, **kwargs):
+        if name == "tiktoken":
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.delitem(sys.modules, "tiktoken", raising=False)
+    monkeypatch.setattr(builtins, "__import__", fake_import)
+
+
+def test_fallback_does_not_undercount_cyrillic(monkeypatch, encoding_cache, caplog):
+    without_tiktoken(monkeypatch)
+    text = "Давай посчитаем яблоки вместе!"
+    assert ai.count_tokens(text) >= len(text.replace(" ", "").replace("!", ""))
+    assert ai.count_tokens("let us count apples together") == 7
+    ai.count_tokens("ещё раз")
+    # о приблизительном подсчёте пишется в лог один раз
+    assert sum("tiktoken is not installed" in r.message for r in caplog.records) == 1
+
+
+def test_misconfigured_tokenizer_fails_loudly(monkeypatch, encoding_cache):
+    def get_encoding(name):
+        raise ValueError(f"Unknown encoding {name}")
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(get_encoding=get_encoding))
+    monkeypatch.setattr(settings, "LLM_TOKENIZER", "cl100k_typo")
+    with pytest.raises(ValueError):
+        ai.count_tokens("привет")
+    # ошибка не закэширована: после исправления настройки считает tiktoken
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(
+        get_encoding=lambda name: types.SimpleNamespace(encode=lambda text: text.split()),
+    ))
+    assert ai.count_tokens("привет мир") == 2